@@ -0,0 +1,152 @@
+"""
+Append-only analytics store: one event log and one snapshot per user.
+
+    python analytics_log.py                  # compact every user in analytics/
+    python analytics_log.py --directory DIR  # ... in another directory
+
+Every flush of the AnalyticsWriter appends one JSON line per user to <user>.log: the
+changed counters and the new chat messages, with a sequence number. Each log touched by a
+flush is fsynced once, so the cost of an interaction does not depend on how long the user's
+history is. The log is folded into <user>.snapshot.json once it outgrows the snapshot, which
+keeps the rewrites amortized constant as well. The snapshot records the last sequence it
+contains; a crash between writing it and emptying the log therefore never applies an event
+twice. Reading a user is the snapshot plus the tail of the log. A <user>.json of the old
+format seeds the snapshot.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from analytics_writer import merge_counts
+
+COMPACT_BYTES = 64 * 1024
+
+
+def apply_event(document: dict, event: dict) -> dict:
+    merge_counts(document, event.get("counts", {}))
+    chat = document.setdefault("chat", {})
+    for session, messages in event.get("chat", {}).items():
+        chat.setdefault(session, []).extend(messages)
+    return document
+
+
+def _fsync_directory(directory: Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AnalyticsLog:
+    """An AnalyticsWriter backend; `fsync=False` trades durability for speed in tests."""
+
+    def __init__(self, directory: str | Path = "analytics", compact_bytes: int = COMPACT_BYTES, fsync: bool = True):
+        self.directory = Path(directory)
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._last_seq: dict[str, int] = {}
+
+    def log_path(self, user: str) -> Path:
+        return self.directory / f"{user}.log"
+
+    def snapshot_path(self, user: str) -> Path:
+        return self.directory / f"{user}.snapshot.json"
+
+    def _lock(self, user: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(user, threading.Lock())
+
+    def _load(self, user: str) -> tuple[dict | None, int]:
+        """Snapshot plus tail, and the last sequence number; cuts off a line torn by a crash."""
+        document, seq = None, 0
+        try:
+            snapshot = json.loads(self.snapshot_path(user).read_text())
+            document, seq = snapshot["document"], snapshot["seq"]
+        except FileNotFoundError:
+            legacy_path = self.directory / f"{user}.json"
+            if legacy_path.exists():
+                document = json.loads(legacy_path.read_text())
+        try:
+            with self.log_path(user).open("rb+") as log:
+                valid = 0
+                for line in log:
+                    if not line.endswith(b"\n"):
+                        break
+                    valid += len(line)
+                    event = json.loads(line)
+                    if event["seq"] > seq:
+                        document = apply_event(document or {}, event)
+                        seq = event["seq"]
+                log.truncate(valid)
+        except FileNotFoundError:
+            pass
+        return document, seq
+
+    def read(self, user: str) -> dict | None:
+        with self._lock(user):
+            document, self._last_seq[user] = self._load(user)
+        return document
+
+    def write(self, updates: dict[str, dict]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for user, update in list(updates.items()):
+            with self._lock(user):
+                if user not in self._last_seq:
+                    self._last_seq[user] = self._load(user)[1]
+                self._last_seq[user] += 1
+                event = {"seq": self._last_seq[user], "at": time.time(), **update}
+                with self.log_path(user).open("ab") as log:
+                    log.write(json.dumps(event).encode() + b"\n")
+                    log.flush()
+                    if self.fsync:
+                        os.fsync(log.fileno())
+                    size = log.tell()
+                try:
+                    snapshot_size = self.snapshot_path(user).stat().st_size
+                except FileNotFoundError:
+                    snapshot_size = 0
+                # Written: a retry of a failed batch must not append this user's event again.
+                del updates[user]
+                if size > max(self.compact_bytes, snapshot_size):
+                    self._compact(user)
+
+    def compact(self, user: str):
+        with self._lock(user):
+            self._compact(user)
+
+    def _compact(self, user: str):
+        document, seq = self._load(user)
+        if document is None:
+            return
+        tmp_path = self.snapshot_path(user).with_suffix(".tmp")
+        with tmp_path.open("w") as snapshot:
+            json.dump({"seq": seq, "document": document}, snapshot)
+            snapshot.flush()
+            if self.fsync:
+                os.fsync(snapshot.fileno())
+        tmp_path.replace(self.snapshot_path(user))
+        if self.fsync:
+            _fsync_directory(self.directory)
+        # Everything up to `seq` is in the snapshot now; from here on the log starts empty.
+        with self.log_path(user).open("wb"):
+            pass
+        self._last_seq[user] = seq
+
+    def users(self) -> list[str]:
+        return sorted({path.name.removesuffix(".log") for path in self.directory.glob("*.log")})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--directory", default="analytics", help="map met de logs en snapshots")
+    args = parser.parse_args()
+    store = AnalyticsLog(args.directory)
+    for user in store.users():
+        store.compact(user)
+        print("compacted", user)
@@ -0,0 +1,219 @@
+"""
+Buffered analytics: per-user streamlit_analytics2 counts and chat messages, written in the
+background instead of at the end of every rerun.
+
+streamlit_analytics2 keeps its counts in one module-level dict. `start_user_tracking` swaps
+the user's counts into it (kept in memory, read from the backend only the first time; the
+backend is the source of truth, a local JSON file only seeds users it does not know).
+`stop_user_tracking` diffs them against what was already queued. Only the changed
+counters and the chat messages added since the last rerun go to the AnalyticsWriter. The
+writer merges everything queued for the same user into one pending update and flushes
+every `interval` seconds or when `max_pending` users are waiting. A backend writes a whole
+batch at once: FirestoreBackend in one Firestore batch, analytics_log.AnalyticsLog to
+append-only files on disk for development and tests.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+import streamlit as st
+import streamlit_analytics2
+
+logger = logging.getLogger(__name__)
+
+
+def diff_counts(new: dict, old: dict) -> dict:
+    """The leaves of `new` that differ from `old`, nested like `new`; lists count as leaves."""
+    changed = {}
+    for key, value in new.items():
+        before = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict):
+            nested = diff_counts(value, before if isinstance(before, dict) else {})
+            if nested:
+                changed[key] = nested
+        elif value != before:
+            changed[key] = copy.deepcopy(value)
+    return changed
+
+
+def merge_counts(target: dict, delta: dict) -> dict:
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_counts(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+# Documents converted by migrate_analytics.py carry this; older ones hold the DataFrame shape.
+COUNTS_FORMAT = 2
+# The streamlit_analytics2 counters that are dicts; all others are scalars.
+_DICT_COUNTS = ("per_day", "widgets")
+
+
+def counts_from_legacy(document: dict) -> dict:
+    """
+    The counts of a document written as `pd.read_json(<counts>.json).to_dict()`.
+
+    Every top-level counter became a column of one frame: scalars are repeated once per row
+    and the dicts are padded with NaN for the keys of the others. start_time became a
+    timestamp. Counts that are already in the native shape come through unchanged.
+    """
+    counts = {}
+    for key, value in document.items():
+        if key in ("chat", "counts_format"):
+            continue
+        if key in _DICT_COUNTS:
+            if isinstance(value, dict):
+                counts[key] = {k: v for k, v in value.items() if v is not None and v == v}
+            continue
+        if isinstance(value, dict):
+            present = [v for v in value.values() if v is not None and v == v]
+            if not present:
+                continue
+            value = present[0]
+        if isinstance(value, datetime.datetime):
+            value = value.strftime("%d %b %Y, %H:%M:%S")
+        counts[key] = value
+    return counts
+
+
+class FirestoreBackend:
+    """
+    Merges the updates into <collection>/<user>; new messages are appended with ArrayUnion.
+
+    The document is also where the counts are read back from after a restart. A document in
+    the old DataFrame shape is converted while reading but left as it is; migrate_analytics.py
+    rewrites those documents once.
+    """
+
+    def __init__(self, client, collection: str = "new_users"):
+        self.client = client
+        self.collection = collection
+
+    def read(self, user: str) -> dict | None:
+        snapshot = self.client.collection(self.collection).document(user).get()
+        if not snapshot.exists:
+            return None
+        return counts_from_legacy(snapshot.to_dict())
+
+    def write(self, updates: dict[str, dict]):
+        from google.cloud import firestore
+
+        batch = self.client.batch()
+        for user, update in updates.items():
+            document = copy.deepcopy(update["counts"])
+            if update["chat"]:
+                # Every message carries its position, so ArrayUnion never drops a repeated "ok".
+                document["chat"] = {session: firestore.ArrayUnion(messages) for session, messages in update["chat"].items()}
+            batch.set(self.client.collection(self.collection).document(user), document, merge=True)
+        batch.commit()
+
+
+class AnalyticsWriter:
+    def __init__(self, backend, interval: float = 10, max_pending: int = 50):
+        self.backend = backend
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: dict[str, dict] = {}
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, user: str, counts: dict, messages: dict[str, list] | None = None):
+        """Queues changed `counts` and new chat `messages` (per session id) for `user`."""
+        if not counts and not any((messages or {}).values()):
+            return
+        with self._condition:
+            update = self._pending.setdefault(user, {"counts": {}, "chat": {}})
+            merge_counts(update["counts"], counts)
+            for session, new in (messages or {}).items():
+                update["chat"].setdefault(session, []).extend(new)
+            if len(self._pending) >= self.max_pending:
+                self._condition.notify()
+
+    def flush(self):
+        with self._condition:
+            updates, self._pending = self._pending, {}
+        if not updates:
+            return
+        try:
+            self.backend.write(updates)
+        except Exception:
+            logger.warning("Could not write analytics for %d users, retrying later", len(updates), exc_info=True)
+            with self._condition:
+                # Newer updates queued meanwhile go on top of the ones that failed.
+                for user, update in self._pending.items():
+                    failed = updates.setdefault(user, {"counts": {}, "chat": {}})
+                    merge_counts(failed["counts"], update["counts"])
+                    for session, messages in update["chat"].items():
+                        failed["chat"].setdefault(session, []).extend(messages)
+                self._pending = updates
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.interval
+            with self._condition:
+                while len(self._pending) < self.max_pending and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+            self.flush()
+
+
+class _UserCounts:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: dict[str, dict] = {}
+        self.queued: dict[str, dict] = {}
+
+
+@st.cache_resource
+def _user_counts() -> _UserCounts:
+    return _UserCounts()
+
+
+def start_user_tracking(writer: AnalyticsWriter, user: str, load_from_json: str | Path | None = None):
+    state = _user_counts()
+    counts = streamlit_analytics2.main.counts
+    with state.lock:
+        if user not in state.counts:
+            streamlit_analytics2.main.reset_counts()
+            try:
+                stored = writer.backend.read(user)
+            except Exception:
+                # Counting from zero would overwrite the stored totals; this rerun is not
+                # counted for the user and the next one reads again.
+                logger.warning("Could not read the analytics of %s", user, exc_info=True)
+                streamlit_analytics2.start_tracking()
+                return
+            if stored is None and load_from_json is not None and Path(load_from_json).exists():
+                stored = json.loads(Path(load_from_json).read_text())
+            stored = stored or {}
+            counts.update({key: stored[key] for key in stored if key in counts})
+            state.counts[user] = copy.deepcopy(counts)
+            state.queued[user] = copy.deepcopy(counts)
+        counts.clear()
+        counts.update(copy.deepcopy(state.counts[user]))
+    streamlit_analytics2.start_tracking()
+
+
+def stop_user_tracking(writer: AnalyticsWriter, user: str, session: str, messages: list | None, unsafe_password=None):
+    streamlit_analytics2.stop_tracking(unsafe_password=unsafe_password)
+    state = _user_counts()
+    with state.lock:
+        if user not in state.queued:
+            return
+        current = copy.deepcopy(streamlit_analytics2.main.counts)
+        state.counts[user] = current
+        changed = diff_counts(current, state.queued[user])
+        state.queued[user] = copy.deepcopy(current)
+    messages = messages or []
+    sent = st.session_state.get("analytics_messages_sent", 0)
+    new = [{**message, "index": index} for index, message in enumerate(messages[sent:], start=sent)]
+    st.session_state["analytics_messages_sent"] = len(messages)
+    writer.submit(user, changed, {session: new} if new else None)
@@ -0,0 +1,110 @@
+"""
+Semantic cache of chat answers to general-knowledge questions.
+
+An answer is stored with the embedding of its question, the tools the agent used and the
+version of the knowledge base it came from. A later question whose embedding has a cosine
+similarity of at least `threshold` with a stored one gets the stored answer, so the
+gpt-4o + tool loop is skipped for the many users asking the same thing. Only answers
+built purely from `CACHEABLE_TOOLS` are stored: anything that touched a company, a date
+or a calculation is specific to its question. Entries are evicted least recently used
+first and expire after `ttl` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+THRESHOLD = 0.95
+MAX_SIZE = 500
+TTL = 6 * 3600
+CACHEABLE_TOOLS = frozenset({"Financiele_informatie"})
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    tools: tuple[str, ...]
+    data_version: str
+    expires_at: float
+    hits: int = 0
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = THRESHOLD, maxsize: int = MAX_SIZE, ttl: float = TTL, clock=time.monotonic):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        self._vectors: dict[int, np.ndarray] = {}
+        self._matrix = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cacheable(tools) -> bool:
+        return bool(tools) and set(tools) <= CACHEABLE_TOOLS
+
+    def _remove(self, entry_id: int):
+        del self._entries[entry_id]
+        del self._vectors[entry_id]
+        self._matrix = None
+
+    def lookup(self, vector, data_version: str) -> CachedAnswer | None:
+        with self._lock:
+            now = self._clock()
+            for entry_id in [entry_id for entry_id, entry in self._entries.items() if entry.expires_at <= now]:
+                self._remove(entry_id)
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                ids = list(self._vectors)
+                self._matrix = (ids, np.stack([self._vectors[entry_id] for entry_id in ids]))
+            ids, matrix = self._matrix
+            similarities = matrix @ _unit(vector)
+            for position in np.argsort(-similarities):
+                if similarities[position] < self.threshold:
+                    break
+                entry = self._entries[ids[position]]
+                if entry.data_version == data_version:
+                    self._entries.move_to_end(ids[position])
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, question: str, vector, answer: str, tools, data_version: str) -> bool:
+        """Stores the answer if it only used cacheable tools; returns whether it did."""
+        tools = tuple(dict.fromkeys(tools))
+        if not answer or not self.cacheable(tools):
+            return False
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CachedAnswer(question, answer, tools, data_version, self._clock() + self.ttl)
+            self._vectors[entry_id] = _unit(vector)
+            self._matrix = None
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,157 @@
+"""
+Benchmark suite for the calculator, the rankings and voorafbetaling on synthetic data.
+
+    python -m benchmarks.calculator_suite --dsn postgresql://localhost/bench --companies 1000
+    python -m benchmarks.calculator_suite --dsn ... --companies 1000 --save-baseline
+    python -m benchmarks.calculator_suite --dsn ... --companies 50000 --reuse --filter ranking/
+
+The data is generated deterministically (see generator.py) into its own schema (default:
+bench_calculator) that is dropped and recreated, so point it at a scratch database;
+--reuse skips the load when the schema already holds the same scale. Every case runs one
+warm-up and --rounds timed executions. The fastest round, the least noisy statistic on a
+shared machine, is compared with the baseline in benchmarks/baselines/calculator_<scale>.json
+and the run exits with status 1 when a case got more than --tolerance slower (and by more
+than --min-delta-ms, to ignore noise on sub-millisecond queries). --save-baseline records
+the current run as the new baseline; baselines are per machine, so record one before
+comparing. Before timing, the KPI aggregate is run on account_details and on the rollup
+for every period of the sample companies (parity.py); any difference also exits with 1.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import psycopg2
+
+from .cases import build_cases
+from .generator import Scale
+from .loader import fingerprint, load
+from .parity import kpi_mismatches
+
+BASELINES = Path(__file__).parent.parent / "baselines"
+
+
+def baseline_path(scale: Scale) -> Path:
+    return BASELINES / f"calculator_{scale.name}.json"
+
+
+def time_case(cursor, case, rounds: int) -> dict:
+    sql, params = case.statement(0)
+    cursor.execute(sql, params)
+    cursor.fetchall()
+    timings = []
+    for number in range(rounds):
+        sql, params = case.statement(number)
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "stddev_ms": round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+        "rounds": rounds,
+        "rows": len(rows),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            continue
+        delta = result["min_ms"] - before["min_ms"]
+        if delta > min_delta_ms and result["min_ms"] > before["min_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: {before['min_ms']:.2f} ms -> {result['min_ms']:.2f} ms")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--schema", default="bench_calculator")
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--filter", default="", help="alleen cases waarvan de naam dit bevat")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    parser.add_argument("--reuse", action="store_true", help="laad niet opnieuw als het schema al klopt")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="laat het schema staan na afloop")
+    args = parser.parse_args()
+
+    scale = Scale(companies=args.companies, years=args.years, seed=args.seed)
+    conn = psycopg2.connect(args.dsn)
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (args.schema,))
+        loaded = cursor.fetchone() is not None
+        if loaded:
+            cursor.execute(f"SET search_path TO {args.schema}")
+            cursor.execute("SELECT count(*) FROM companies")
+            loaded = cursor.fetchone()[0] == scale.companies
+        conn.rollback()
+    if not (args.reuse and loaded):
+        print(f"Generating {scale.name} into schema {args.schema} ...")
+        load(conn, args.schema, scale)
+    conn.autocommit = True
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {args.schema}")
+        dataset = fingerprint(cursor)
+        cursor.execute("SHOW server_version")
+        (server_version,) = cursor.fetchone()
+        mismatches = kpi_mismatches(cursor, scale)
+        for line in mismatches:
+            print("KPI MISMATCH", line)
+        results = {}
+        for case in build_cases(cursor, scale):
+            if args.filter in case.name:
+                results[case.name] = time_case(cursor, case, args.rounds)
+                result = results[case.name]
+                print(f"{case.name:50} median {result['median_ms']:9.2f} ms   min {result['min_ms']:9.2f} ms   rows {result['rows']}")
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA {args.schema} CASCADE")
+    conn.close()
+
+    path = baseline_path(scale)
+    status = 0
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        previous = json.loads(path.read_text())["cases"] if path.exists() else {}
+        path.write_text(
+            json.dumps(
+                {
+                    "scale": asdict(scale),
+                    "dataset": dataset,
+                    "machine": {"python": platform.python_version(), "platform": platform.platform(), "postgres": server_version},
+                    "cases": {**previous, **results},
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"Baseline written to {path}")
+    elif path.exists():
+        baseline = json.loads(path.read_text())
+        if baseline["dataset"] != dataset:
+            print(f"{path} was recorded on different data ({baseline['dataset']}), not comparing.")
+        else:
+            regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+            for line in regressions:
+                print("REGRESSION", line)
+            print(f"{len(regressions)} regressions against {path}")
+            status = 1 if regressions else 0
+    else:
+        print(f"No baseline at {path}; run with --save-baseline to record one.")
+    if mismatches:
+        print(f"{len(mismatches)} periods where the rollup and account_details disagree")
+        status = 1
+    sys.exit(status)
@@ -0,0 +1,91 @@
+"""
+The benchmarked queries: every bereken_* statement, the shared KPI aggregate, the ranking
+of vergelijk_op_basis_van per metric, bereken_many, bereken_reeks, the period
+resolution and voorafbetaling, each on account_details and where it applies on the rollup.
+
+A case is a name and a function round number -> (sql, params); rounds cycle through a fixed
+sample of companies so one cached company does not make a query look cheap.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+from bot_queries.queries import voorafbetaling
+from calculator.calculator import calculations
+from calculator.kpi import KPI_SQL, ROLLUP_KPI_SQL
+from calculator.metrics import METRICS, compile_portfolio, compile_ranking, compile_series
+from utils import period_choice_sql, period_params, period_series_params
+
+from .generator import Scale
+
+SOURCES = ("account_details", "rollup")
+SAMPLE_SIZE = 20
+PORTFOLIO_SIZE = 40
+
+_RESOLVE_SQL = period_choice_sql("AND company_id = ANY(%(company_ids)s)")
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    statement: Callable[[int], tuple[str, dict | None]]
+
+
+def sample_companies(scale: Scale, size: int) -> list[int]:
+    step = max(scale.companies // size, 1)
+    return list(range(1, scale.companies + 1, step))[:size]
+
+
+def build_cases(cursor, scale: Scale) -> list[Case]:
+    year = scale.first_year + scale.years - 2
+    date = f"{year}-12-31"
+    sample = sample_companies(scale, SAMPLE_SIZE)
+    portfolio = sample_companies(scale, PORTFOLIO_SIZE)
+    cursor.execute(_RESOLVE_SQL, {**period_params(date), "company_ids": portfolio})
+    period_of = dict(cursor.fetchall())
+    sample = [company_id for company_id in sample if company_id in period_of]
+
+    def each_company(build):
+        return lambda number: build(sample[number % len(sample)])
+
+    cases = [
+        Case("period/resolve_1", each_company(lambda c: (_RESOLVE_SQL, {**period_params(date), "company_ids": [c]}))),
+        Case(
+            f"period/resolve_{PORTFOLIO_SIZE}",
+            lambda number: (_RESOLVE_SQL, {**period_params(date), "company_ids": portfolio}),
+        ),
+    ]
+    for what, fn in calculations.items():
+        cases.append(Case(f"bereken/{what}", each_company(lambda c, fn=fn: (fn.build(c, period_of[c]), None))))
+    for source, sql in zip(SOURCES, (KPI_SQL, ROLLUP_KPI_SQL)):
+        cases.append(
+            Case(f"kpi/{source}", each_company(lambda c, sql=sql: (sql, {"company_id": c, "period_id": period_of[c]})))
+        )
+
+    all_metrics = tuple(METRICS.values())
+    ranking_params = {**period_params(date), "limit": 10}
+    for source in SOURCES:
+        for spec in all_metrics:
+            sql = compile_ranking((spec,), "DESC", source)
+            cases.append(Case(f"ranking/{spec.name}/{source}", lambda number, sql=sql: (sql, ranking_params)))
+        sql = compile_ranking(all_metrics, "DESC", source)
+        cases.append(Case(f"ranking/all/{source}", lambda number, sql=sql: (sql, ranking_params)))
+
+        sql = compile_portfolio(all_metrics, source)
+        portfolio_params = {
+            "company_ids": list(period_of),
+            "period_ids": list(period_of.values()),
+            "requested_ids": portfolio,
+        }
+        cases.append(Case(f"bereken_many/{PORTFOLIO_SIZE}/{source}", lambda number, sql=sql: (sql, portfolio_params)))
+
+        sql = compile_series(all_metrics, source)
+        series_params = period_series_params(f"{scale.first_year}-01-01", date)
+        cases.append(
+            Case(f"bereken_reeks/{source}", each_company(lambda c, sql=sql: (sql, {**series_params, "company_id": c})))
+        )
+
+    for term in (0, 1):
+        # voorafbetaling names its tables with the public schema; here they live in the bench schema.
+        sql = voorafbetaling(term, year).replace("public.", "")
+        cases.append(Case(f"voorafbetaling/term{term}", lambda number, sql=sql: (sql, None)))
+    return cases
@@ -0,0 +1,252 @@
+"""
+Deterministic synthetic Silverfin data: companies, periods, account_details,
+reconciliation_results and reconciliations with the columns of the production tables.
+
+Every table is produced in chunks of companies as DataFrames, so 50k companies never sit
+in memory at once. The same seed and scale always give the same rows, which is what
+makes timings comparable with a stored baseline.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from enums.account_type import AccountType
+
+# A condensed Belgian minimum chart of accounts (MAR/PCMN): number, name, type and the
+# share of the company's size that the balance typically represents. Debit balances
+# (assets, expenses) are positive, credit balances (equity, debts, income) negative,
+# which is the sign convention the calculator relies on.
+CHART = [
+    ("100000", "Geplaatst kapitaal", AccountType.LIABILITY, -0.15),
+    ("130000", "Wettelijke reserve", AccountType.LIABILITY, -0.02),
+    ("133000", "Beschikbare reserves", AccountType.LIABILITY, -0.08),
+    ("140000", "Overgedragen winst", AccountType.LIABILITY, -0.10),
+    ("160000", "Voorzieningen voor pensioenen", AccountType.LIABILITY, -0.01),
+    ("163000", "Voorzieningen voor grote herstellingen", AccountType.LIABILITY, -0.01),
+    ("173000", "Kredietinstellingen op meer dan een jaar", AccountType.LIABILITY, -0.20),
+    ("174000", "Overige leningen op meer dan een jaar", AccountType.LIABILITY, -0.04),
+    # A bare class number, as some ledgers have; the rollup must count it like the raw rows.
+    ("2", "Vaste activa zonder detail", AccountType.ASSET, 0.005),
+    ("210000", "Immateriële vaste activa", AccountType.ASSET, 0.03),
+    ("220000", "Terreinen", AccountType.ASSET, 0.10),
+    ("221000", "Gebouwen", AccountType.ASSET, 0.20),
+    ("230000", "Installaties, machines en uitrusting", AccountType.ASSET, 0.12),
+    ("240000", "Meubilair", AccountType.ASSET, 0.03),
+    ("241000", "Rollend materieel", AccountType.ASSET, 0.05),
+    ("280000", "Deelnemingen", AccountType.ASSET, 0.02),
+    ("300000", "Grondstoffen", AccountType.ASSET, 0.04),
+    ("340000", "Handelsgoederen", AccountType.ASSET, 0.06),
+    ("400000", "Handelsdebiteuren", AccountType.ASSET, 0.12),
+    ("411000", "Terug te vorderen btw", AccountType.ASSET, 0.02),
+    ("416000", "Diverse vorderingen", AccountType.ASSET, 0.01),
+    ("420000", "Schulden op meer dan een jaar die binnen het jaar vervallen", AccountType.LIABILITY, -0.04),
+    ("430000", "Kredietinstellingen - kaskredieten", AccountType.LIABILITY, -0.03),
+    ("440000", "Leveranciers", AccountType.LIABILITY, -0.10),
+    ("450000", "Geraamd bedrag der belastingschulden", AccountType.LIABILITY, -0.02),
+    ("451000", "Te betalen btw", AccountType.LIABILITY, -0.02),
+    ("453000", "Ingehouden voorheffingen", AccountType.LIABILITY, -0.01),
+    ("455000", "Bezoldigingen", AccountType.LIABILITY, -0.02),
+    ("490000", "Over te dragen kosten", AccountType.ASSET, 0.005),
+    ("493000", "Over te dragen opbrengsten", AccountType.LIABILITY, -0.005),
+    ("510000", "Aandelen", AccountType.ASSET, 0.01),
+    ("550000", "Kredietinstellingen - rekening-courant", AccountType.ASSET, 0.08),
+    ("570000", "Kassen - contanten", AccountType.ASSET, 0.002),
+    ("580000", "Interne overboekingen", AccountType.ASSET, 0.0),
+    ("600000", "Aankopen van grondstoffen", AccountType.EXPENSE, 0.25),
+    ("604000", "Aankopen van handelsgoederen", AccountType.EXPENSE, 0.15),
+    ("609000", "Voorraadwijzigingen", AccountType.EXPENSE, 0.01),
+    ("610000", "Huur en huurlasten", AccountType.EXPENSE, 0.04),
+    ("612000", "Nutsvoorzieningen", AccountType.EXPENSE, 0.02),
+    ("613000", "Erelonen en vergoedingen", AccountType.EXPENSE, 0.03),
+    ("615000", "Voertuigkosten", AccountType.EXPENSE, 0.02),
+    ("620000", "Bezoldigingen en rechtstreekse sociale voordelen", AccountType.EXPENSE, 0.20),
+    ("621000", "Werkgeversbijdragen voor sociale verzekeringen", AccountType.EXPENSE, 0.05),
+    ("630000", "Afschrijvingen op oprichtingskosten en vaste activa", AccountType.EXPENSE, 0.05),
+    ("640000", "Bedrijfsbelastingen", AccountType.EXPENSE, 0.01),
+    ("650000", "Kosten van schulden", AccountType.EXPENSE, 0.01),
+    ("657000", "Bankkosten", AccountType.EXPENSE, 0.002),
+    ("670000", "Belastingen op het resultaat", AccountType.EXPENSE, 0.03),
+    ("700000", "Verkopen en dienstprestaties", AccountType.INCOME, -1.0),
+    ("708000", "Toegekende kortingen", AccountType.INCOME, 0.01),
+    ("740000", "Andere bedrijfsopbrengsten", AccountType.INCOME, -0.02),
+    ("750000", "Opbrengsten uit financiële vaste activa", AccountType.INCOME, -0.005),
+]
+# Customers and suppliers are kept per counterparty, with a suffix on the account number.
+COUNTERPARTY_ACCOUNTS = {"400000": "Klant", "440000": "Leverancier"}
+MAX_COUNTERPARTIES = 8
+
+_ACTIVITIES = [
+    "Bakkerij", "Garage", "Brouwerij", "Bouwbedrijf", "Transport", "Apotheek", "Immo",
+    "Consult", "Drukkerij", "Schrijnwerkerij", "Tuinaanleg", "Advocatenkantoor", "Slagerij",
+    "Elektro", "Boekhoudkantoor", "Kapsalon", "Dakwerken", "Logistiek", "Software", "Horeca",
+]
+_SURNAMES = [
+    "Janssens", "Peeters", "Maes", "Jacobs", "Mertens", "Willems", "Claes", "Goossens",
+    "Wouters", "De Smet", "Dubois", "Lambert", "Dupont", "Martens", "Hermans", "Van Damme",
+    "Declercq", "Vermeulen", "Michiels", "Desmet", "Lemmens", "Cools", "Aerts", "Verstraete",
+]
+_LEGAL_FORMS = ["BV", "NV", "CommV", "VOF", "CV"]
+RECONCILIATION_NAMES = [
+    "Vennootschapsbelasting", "Voorafbetalingen", "Btw-aansluiting", "Bezoldigingen",
+    "Vaste activa", "Overlopende rekeningen", "Handelsdebiteuren", "Leveranciers",
+]
+
+
+@dataclass(frozen=True)
+class Scale:
+    companies: int = 100
+    years: int = 10
+    first_year: int = 2015
+    seed: int = 42
+    chunk_companies: int = 500
+
+    @property
+    def name(self) -> str:
+        return f"{self.companies}x{self.years}"
+
+
+def _rng(scale: Scale, chunk_start: int, table: str) -> np.random.Generator:
+    # One stream per (table, chunk), so changing chunk_companies is the only thing that
+    # reshuffles the values and tables can be generated independently of each other.
+    return np.random.default_rng([scale.seed, chunk_start, sum(map(ord, table))])
+
+
+def companies(scale: Scale, start: int, stop: int) -> pd.DataFrame:
+    rng = _rng(scale, start, "companies")
+    count = stop - start
+    names = [
+        f"{activity} {surname} {form}"
+        for activity, surname, form in zip(
+            rng.choice(_ACTIVITIES, count), rng.choice(_SURNAMES, count), rng.choice(_LEGAL_FORMS, count)
+        )
+    ]
+    return pd.DataFrame({"company_id": np.arange(start + 1, stop + 1), "name": names})
+
+
+def _company_profile(scale: Scale, start: int, stop: int):
+    rng = _rng(scale, start, "profile")
+    count = stop - start
+    size = np.exp(rng.normal(13.0, 1.2, count))  # revenue, median around 440k euro
+    growth = rng.normal(0.03, 0.06, count)
+    # 15% keeps its books on a fiscal year ending 30 June, 20% also files half-year figures.
+    june_year_end = rng.random(count) < 0.15
+    interim = rng.random(count) < 0.20
+    counterparties = rng.integers(1, MAX_COUNTERPARTIES + 1, count)
+    return size, growth, june_year_end, interim, counterparties
+
+
+def periods(scale: Scale, start: int, stop: int) -> pd.DataFrame:
+    """Annual periods per company, plus a half-year period for some, with stable ids."""
+    _, _, june_year_end, interim, _ = _company_profile(scale, start, stop)
+    rows = []
+    for offset, company_id in enumerate(range(start + 1, stop + 1)):
+        for year_index in range(scale.years):
+            year = scale.first_year + year_index
+            base_id = (company_id * scale.years + year_index) * 2
+            if june_year_end[offset]:
+                year_start, year_end = date(year - 1, 7, 1), date(year, 6, 30)
+            else:
+                year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+            rows.append((base_id, company_id, year_start, year_end, year_end))
+            if interim[offset]:
+                half = date(year - 1, 12, 31) if june_year_end[offset] else date(year, 6, 30)
+                rows.append((base_id + 1, company_id, year_start, half, year_end))
+    return pd.DataFrame(rows, columns=["period_id", "company_id", "start_date", "end_date", "fiscal_year_end"])
+
+
+def _accounts(counterparties: int):
+    accounts = []
+    for number, name, account_type, share in CHART:
+        if number in COUNTERPARTY_ACCOUNTS:
+            for index in range(1, counterparties + 1):
+                accounts.append(
+                    (f"{number}.{index:03d}", number, f"{COUNTERPARTY_ACCOUNTS[number]} {index}", account_type, share / counterparties)
+                )
+        else:
+            accounts.append((number, number, name, account_type, share))
+    return accounts
+
+
+def account_details(scale: Scale, start: int, stop: int, period_frame: pd.DataFrame) -> pd.DataFrame:
+    size, growth, _, _, counterparties = _company_profile(scale, start, stop)
+    rng = _rng(scale, start, "account_details")
+    frames = []
+    for offset, (company_id, company_periods) in enumerate(period_frame.groupby("company_id", sort=True)):
+        accounts = _accounts(int(counterparties[offset]))
+        numbers, bare_numbers, names, types, shares = (np.array(column) for column in zip(*accounts))
+        end_dates = company_periods.end_date.to_numpy()
+        years_in = np.array([end_date.year - scale.first_year for end_date in end_dates])
+        # Half-year periods hold the running totals of the first six months.
+        fraction = np.where(end_dates == company_periods.fiscal_year_end.to_numpy(), 1.0, 0.5)
+        period_factor = (1 + growth[offset]) ** years_in * fraction
+        noise = rng.lognormal(0.0, 0.25, (len(end_dates), len(accounts)))
+        values = np.round(np.outer(period_factor, shares) * size[offset] * noise, 2)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "company_id": company_id,
+                    "period_id": np.repeat(company_periods.period_id.to_numpy(), len(accounts)),
+                    # An account keeps its id over the periods, like in Silverfin.
+                    "account_id": company_id * 100 + np.tile(np.arange(len(accounts)), len(end_dates)),
+                    "account_number": np.tile(numbers, len(end_dates)),
+                    "number_without_suffix": np.tile(bare_numbers, len(end_dates)),
+                    "account_name": np.tile(names, len(end_dates)),
+                    "original_name": np.tile(names, len(end_dates)),
+                    "original_number": np.tile(numbers, len(end_dates)),
+                    "account_type": np.tile(types, len(end_dates)),
+                    "value": values.ravel(),
+                }
+            )
+        )
+    frame = pd.concat(frames, ignore_index=True)
+    frame["reconciliation_template_id"] = np.where(rng.random(len(frame)) < 0.1, rng.integers(1, 50, len(frame)), None)
+    frame["starred"] = rng.random(len(frame)) < 0.02
+    return frame
+
+
+def reconciliation_results(scale: Scale, period_frame: pd.DataFrame, start: int) -> pd.DataFrame:
+    rng = _rng(scale, start, "reconciliation_results")
+    annual = period_frame[period_frame.end_date == period_frame.fiscal_year_end]
+    count = len(annual)
+    prepayments = np.round(rng.lognormal(8.0, 1.0, (count, 4)) * (rng.random((count, 4)) < 0.7), 2)
+    return pd.DataFrame(
+        {
+            "company_id": annual.company_id.to_numpy(),
+            "period_id": annual.period_id.to_numpy(),
+            "tax_percentage": np.where(rng.random(count) < 0.6, 20, 25),
+            "prep1_made": prepayments[:, 0],
+            "prep2_made": prepayments[:, 1],
+            "prep3_made": prepayments[:, 2],
+            "prep4_made": prepayments[:, 3],
+        }
+    )
+
+
+def reconciliations(scale: Scale, period_frame: pd.DataFrame, start: int) -> pd.DataFrame:
+    rng = _rng(scale, start, "reconciliations")
+    chosen = rng.random((len(period_frame), len(RECONCILIATION_NAMES))) < 0.6
+    period_index, name_index = np.nonzero(chosen)
+    return pd.DataFrame(
+        {
+            "reconciliation_id": period_frame.period_id.to_numpy()[period_index] * 10 + name_index,
+            "company_id": period_frame.company_id.to_numpy()[period_index],
+            "period_id": period_frame.period_id.to_numpy()[period_index],
+            "name": np.array(RECONCILIATION_NAMES)[name_index],
+        }
+    )
+
+
+def generate(scale: Scale):
+    """Yields per chunk of companies a dict table name -> DataFrame, in load order."""
+    for start in range(0, scale.companies, scale.chunk_companies):
+        stop = min(start + scale.chunk_companies, scale.companies)
+        period_frame = periods(scale, start, stop)
+        yield {
+            "companies": companies(scale, start, stop),
+            "periods": period_frame,
+            "account_details": account_details(scale, start, stop, period_frame),
+            "reconciliation_results": reconciliation_results(scale, period_frame, start),
+            "reconciliations": reconciliations(scale, period_frame, start),
+        }
@@ -0,0 +1,88 @@
+"""
+Loads the generated tables into their own schema of a local Postgres with COPY, then
+adds the indexes and the rollup of migrations/ exactly like production has them.
+"""
+import io
+import time
+from pathlib import Path
+
+from calculator.rollup import ROLLUP_TABLE, _AGGREGATE_SELECT
+
+from .generator import Scale, generate
+
+MIGRATIONS = Path(__file__).parent.parent.parent / "migrations"
+# The NOTIFY triggers (0002, 0004) only matter for a running app.
+SCHEMA_MIGRATIONS = [
+    "0001_account_prefix_rollup.sql",
+    "0003_account_number_prefix_indexes.sql",
+    "0005_account_prefix_rollup_short_numbers.sql",
+]
+
+TABLES = {
+    "companies": "company_id integer PRIMARY KEY, name text",
+    "periods": "period_id integer PRIMARY KEY, company_id integer, start_date date, end_date date, fiscal_year_end date",
+    "account_details": """company_id integer, period_id integer, account_id integer, account_name text,
+        account_number text, number_without_suffix text, original_name text, original_number text,
+        account_type text, reconciliation_template_id integer, value numeric, starred boolean""",
+    "reconciliation_results": """company_id integer, period_id integer, tax_percentage numeric,
+        prep1_made numeric, prep2_made numeric, prep3_made numeric, prep4_made numeric""",
+    "reconciliations": "reconciliation_id integer PRIMARY KEY, company_id integer, period_id integer, name text",
+}
+INDEXES = [
+    "CREATE INDEX ON account_details (company_id, period_id)",
+    "CREATE INDEX ON periods (company_id)",
+    "CREATE INDEX ON reconciliation_results (company_id, period_id)",
+    "CREATE INDEX ON reconciliations (company_id, period_id)",
+]
+
+
+def _copy(cursor, table: str, frame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def load(conn, schema: str, scale: Scale, log=print) -> dict:
+    """(Re)creates `schema` with the synthetic data of `scale`; returns the row counts."""
+    started = time.perf_counter()
+    counts = dict.fromkeys(TABLES, 0)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"SET search_path TO {schema}")
+        for table, columns in TABLES.items():
+            cursor.execute(f"CREATE TABLE {table} ({columns})")
+        for chunk in generate(scale):
+            for table, frame in chunk.items():
+                _copy(cursor, table, frame)
+                counts[table] += len(frame)
+            conn.commit()
+            log(f"  {counts['companies']:>7,} companies, {counts['account_details']:>11,} account_details rows")
+
+        # Migrations after the load: the rollup triggers would otherwise fire per COPY.
+        for statement in INDEXES:
+            cursor.execute(statement)
+        for name in SCHEMA_MIGRATIONS:
+            cursor.execute((MIGRATIONS / name).read_text())
+        # 0005 backfills part of the rollup; it is built here in full.
+        cursor.execute(f"TRUNCATE {ROLLUP_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {ROLLUP_TABLE} (company_id, period_id, prefix2, value, asset_value, row_count)"
+            + _AGGREGATE_SELECT.format(where="")
+        )
+        cursor.execute("ANALYZE")
+    conn.commit()
+    log(f"Loaded {scale.name} into {schema} in {time.perf_counter() - started:.1f} s")
+    return counts
+
+
+def fingerprint(cursor) -> dict:
+    """Row counts and the sum of all values; a baseline is only comparable on the same data."""
+    cursor.execute("SELECT count(*), COALESCE(sum(value), 0)::text FROM account_details")
+    rows, total = cursor.fetchone()
+    cursor.execute("SELECT count(*) FROM companies")
+    (companies,) = cursor.fetchone()
+    cursor.execute("SELECT count(*) FROM periods")
+    (periods,) = cursor.fetchone()
+    return {"companies": companies, "periods": periods, "account_details": rows, "value_sum": total}
@@ -0,0 +1,29 @@
+"""
+The KPI aggregate must give the same KPIResult on account_details and on the rollup; the
+suite checks that on every period of its sample companies before it times anything.
+"""
+from calculator.kpi import KPI_SQL, ROLLUP_KPI_SQL, KPIResult, totals_from_row
+
+from .cases import SAMPLE_SIZE, sample_companies
+from .generator import Scale
+
+
+def _kpi(cursor, sql: str, company_id: int, period_id: int) -> KPIResult:
+    cursor.execute(sql, {"company_id": company_id, "period_id": period_id})
+    return KPIResult.from_totals(company_id, period_id, totals_from_row(cursor.description, cursor.fetchone()))
+
+
+def kpi_mismatches(cursor, scale: Scale) -> list[str]:
+    """One line per (company, period) whose KPIResult differs between the two sources."""
+    cursor.execute(
+        "SELECT company_id, period_id FROM periods WHERE company_id = ANY(%s) ORDER BY 1, 2",
+        (sample_companies(scale, SAMPLE_SIZE),),
+    )
+    mismatches = []
+    for company_id, period_id in cursor.fetchall():
+        raw = _kpi(cursor, KPI_SQL, company_id, period_id)
+        rollup = _kpi(cursor, ROLLUP_KPI_SQL, company_id, period_id)
+        if raw != rollup:
+            fields = {name: (value, rollup.as_dict()[name]) for name, value in raw.as_dict().items() if value != rollup.as_dict()[name]}
+            mismatches.append(f"company {company_id} period {period_id}: {fields}")
+    return mismatches
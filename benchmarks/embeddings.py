@@ -0,0 +1,82 @@
+"""
+Compares one embeddings request per text (the old emb_text loop) with embeddings.Embedder
+against a local fake of the OpenAI embeddings endpoint, so no API key or network is used.
+
+    python -m benchmarks.embeddings --texts 5000 --latency 0.25
+
+The fake sleeps `latency` seconds per request plus a little per input and returns
+deterministic vectors derived from the text hash.
+"""
+import argparse
+import hashlib
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from embeddings import Embedder, EmbeddingCache
+
+
+class FakeEmbeddingsClient:
+    """Stands in for openai.OpenAI(): only `client.embeddings.create` is implemented."""
+
+    def __init__(self, latency: float = 0.25, per_input: float = 0.0002, dimensions: int = 1536):
+        self.latency = latency
+        self.per_input = per_input
+        self.default_dimensions = dimensions
+        self.requests = 0
+        self.inputs = 0
+        self.embeddings = self
+        self._lock = threading.Lock()
+
+    def vector(self, text: str, dimensions: int) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions, dtype=np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def create(self, input, model, dimensions=None):
+        texts = [input] if isinstance(input, str) else list(input)
+        with self._lock:
+            self.requests += 1
+            self.inputs += len(texts)
+        time.sleep(self.latency + self.per_input * len(texts))
+        dimensions = dimensions or self.default_dimensions
+        data = [SimpleNamespace(index=i, embedding=self.vector(text, dimensions)) for i, text in enumerate(texts)]
+        return SimpleNamespace(data=data, model=model)
+
+
+def corpus(size: int) -> list[str]:
+    return [f"Rekening {n % 700}: boeking {n} van dossier {n % 300} voor het boekjaar {2015 + n % 9}" for n in range(size)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.25, help="seconden per request")
+    parser.add_argument("--sequential", type=int, default=40, help="aantal teksten voor de oude lus")
+    args = parser.parse_args()
+
+    texts = corpus(args.texts)
+
+    client = FakeEmbeddingsClient(args.latency)
+    started = time.perf_counter()
+    for text in texts[: args.sequential]:
+        client.embeddings.create(input=text, model="text-embedding-3-small").data[0].embedding
+    per_text = (time.perf_counter() - started) / args.sequential
+    print(f"one request per text: {per_text * args.texts:8.1f} s for {args.texts:,} texts (extrapolated)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(Path(directory) / "embeddings.sqlite")
+        client = FakeEmbeddingsClient(args.latency)
+        embedder = Embedder(client, cache=cache, max_batch_size=512)
+        started = time.perf_counter()
+        embedder.embed(texts)
+        print(f"batched, cold cache:  {time.perf_counter() - started:8.1f} s in {client.requests} requests")
+
+        client.requests = 0
+        started = time.perf_counter()
+        embedder.embed(texts)
+        print(f"batched, warm cache:  {time.perf_counter() - started:8.1f} s in {client.requests} requests")
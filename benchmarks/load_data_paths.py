@@ -0,0 +1,106 @@
+"""
+Compares the two ways load_data can turn a query result into a DataFrame:
+
+- tuples: cursor.fetchall() + pd.DataFrame, one Python object per value (the old path)
+- copy:   query_results.copy_frame, COPY ... TO STDOUT decoded by Arrow into typed columns
+
+    python -m benchmarks.load_data_paths --dsn postgresql://localhost/bench --rows 10000 100000 1000000
+
+The data lives in its own schema (default: bench_load_data) that is dropped and
+recreated, so point it at a scratch database. Memory is the peak of Python allocations
+(tracemalloc) plus Arrow's own pool, measured in a separate run because tracing
+slows the tuples path down.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+
+from query_results import copy_frame
+
+
+def create_dataset(cursor, schema: str, rows: int):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    # Same column types as account_details joined with periods.
+    cursor.execute(
+        """CREATE TABLE account_details AS
+           SELECT (i %% 3000) + 1 AS company_id,
+                  i / 70 AS period_id,
+                  'Rekening ' || (i %% 997) AS account_name,
+                  (10 + i %% 70)::text || lpad((i %% 10000)::text, 4, '0') AS account_number,
+                  CASE WHEN i %% 2 = 0 THEN 'asset' ELSE 'income' END AS account_type,
+                  round((random() * 20000 - 10000)::numeric, 2) AS value,
+                  DATE '2015-12-31' + (i %% 3000) AS end_date
+           FROM generate_series(1, %s) i""",
+        (rows,),
+    )
+    cursor.execute("ANALYZE account_details")
+
+
+def tuples_path(cursor, sql: str) -> pd.DataFrame:
+    cursor.execute(sql)
+    frame = pd.DataFrame(cursor.fetchall())
+    frame.columns = [column[0] for column in cursor.description]
+    return frame
+
+
+def copy_path(cursor, sql: str) -> pd.DataFrame:
+    return copy_frame(cursor, sql)
+
+
+def timed(path, cursor, sql: str) -> float:
+    gc.collect()
+    started = time.perf_counter()
+    path(cursor, sql)
+    return time.perf_counter() - started
+
+
+def peak_memory(path, cursor, sql: str) -> tuple[float, float]:
+    """Peak MB while converting (traced separately, tracemalloc slows the tuples path down)."""
+    gc.collect()
+    tracemalloc.start()
+    arrow_before = pa.total_allocated_bytes()
+    frame = path(cursor, sql)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = max(pa.total_allocated_bytes() - arrow_before, 0)
+    return (python_peak + arrow) / 1024**2, frame.memory_usage(deep=True).sum() / 1024**2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--schema", default="bench_load_data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="laat het schema staan na afloop")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        print(f"Generating {max(args.rows):,} rows in schema {args.schema} ...")
+        create_dataset(cursor, args.schema, max(args.rows))
+        # Warm the table into shared buffers so both paths read from memory.
+        cursor.execute("SELECT count(*) FROM account_details")
+
+        print(f"{'rows':>10} {'path':>7} {'best time':>10} {'peak mem':>10} {'frame':>9}")
+        for rows in args.rows:
+            sql = f"SELECT * FROM account_details ORDER BY company_id, period_id LIMIT {rows}"
+            timings = {}
+            for name, path in [("tuples", tuples_path), ("copy", copy_path)]:
+                elapsed = min(timed(path, cursor, sql) for _ in range(args.repeat))
+                peak, frame_mb = peak_memory(path, cursor, sql)
+                timings[name] = elapsed
+                print(f"{rows:>10,} {name:>7} {elapsed * 1000:>8.0f}ms {peak:>8.0f}MB {frame_mb:>7.0f}MB")
+            print(f"{'':>10} speedup {timings['tuples'] / timings['copy']:.1f}x")
+
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA {args.schema} CASCADE")
+    conn.close()
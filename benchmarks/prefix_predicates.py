@@ -0,0 +1,131 @@
+"""
+Compares the query plans of the old `account_number SIMILAR TO '60%|61%|...'` filters with
+the range predicates from utils.prefix_predicate on a synthetic account_details table.
+
+    python -m benchmarks.prefix_predicates --dsn postgresql://localhost/bench --companies 3000
+
+The data lives in its own schema (default: bench_prefix) that is dropped and recreated,
+so point it at a scratch database. The "before" run only has an index on
+(company_id, period_id); the "after" run adds the indexes of
+migrations/0003_account_number_prefix_indexes.sql.
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+
+import psycopg2
+
+from utils import prefix_predicate
+
+MIGRATION = Path(__file__).parent.parent / "migrations" / "0003_account_number_prefix_indexes.sql"
+
+EBITDA_PREFIXES = [60, 61, 62, 64, 70, 71, 72, 73, 74]
+
+
+def similar_to(prefixes, column="account_number"):
+    return f"{column} SIMILAR TO '" + "|".join(f"{prefix}%" for prefix in prefixes) + "'"
+
+
+def create_dataset(cursor, schema: str, companies: int, years: int, accounts: int):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    cursor.execute(
+        """CREATE TABLE periods (
+               period_id integer PRIMARY KEY, company_id integer,
+               end_date date, fiscal_year_end date
+           )"""
+    )
+    cursor.execute(
+        """INSERT INTO periods
+           SELECT c * 100 + y, c, make_date(2010 + y, 12, 31), make_date(2010 + y, 12, 31)
+           FROM generate_series(1, %s) c, generate_series(1, %s) y""",
+        (companies, years),
+    )
+    cursor.execute(
+        """CREATE TABLE account_details (
+               company_id integer, period_id integer, account_number text,
+               account_type text, value numeric
+           )"""
+    )
+    # Account numbers spread over the whole chart (10..79) with a six-digit suffix, in
+    # random physical order like a table that has been synced over the years.
+    cursor.execute(
+        """INSERT INTO account_details
+           SELECT p.company_id, p.period_id,
+                  (10 + (a * 7919) %% 70)::text || lpad(((a * 104729) %% 1000000)::text, 6, '0'),
+                  CASE WHEN (10 + (a * 7919) %% 70) < 50 THEN 'asset' ELSE 'income' END,
+                  round((random() * 20000 - 10000)::numeric, 2)
+           FROM periods p, generate_series(1, %s) a
+           ORDER BY random()""",
+        (accounts,),
+    )
+    cursor.execute("CREATE INDEX ON account_details (company_id, period_id)")
+    cursor.execute("ANALYZE")
+
+
+def queries(predicate):
+    single = f"""SELECT sum(value) * -1 FROM account_details
+                 WHERE company_id = 42 AND period_id = 4205 AND {predicate(EBITDA_PREFIXES)}"""
+    ranking = f"""SELECT ad.company_id, sum(ad.value) AS total_value
+                  FROM periods p
+                  JOIN account_details ad ON ad.company_id = p.company_id AND ad.period_id = p.period_id
+                  WHERE p.end_date >= DATE '2015-01-01' AND p.end_date < DATE '2016-01-01'
+                    AND {predicate(EBITDA_PREFIXES, "ad.account_number")}
+                  GROUP BY ad.company_id
+                  ORDER BY total_value DESC
+                  LIMIT 10"""
+    portfolio = f"""SELECT sum(value) FROM account_details WHERE {predicate([70])}"""
+    return {"single company": single, "ranking": ranking, "revenue over all dossiers": portfolio}
+
+
+def explain(cursor, sql: str) -> tuple[str, float]:
+    started = time.perf_counter()
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql)
+    elapsed = time.perf_counter() - started
+    plan = "\n".join(row[0] for row in cursor.fetchall())
+    return plan, elapsed
+
+
+def run(cursor, label: str, predicate):
+    results = {}
+    for name, sql in queries(predicate).items():
+        explain(cursor, sql)  # warm the cache so both runs read from shared buffers
+        plan, elapsed = explain(cursor, sql)
+        execution = float(re.search(r"Execution Time: ([\d.]+) ms", plan).group(1))
+        results[name] = execution
+        print(f"--- {label}: {name} ({execution:.1f} ms, {elapsed * 1000:.1f} ms round trip)")
+        print(plan)
+        print()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--schema", default="bench_prefix")
+    parser.add_argument("--companies", type=int, default=3000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--accounts", type=int, default=70, help="rekeningen per periode")
+    parser.add_argument("--keep", action="store_true", help="laat het schema staan na afloop")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        rows = args.companies * args.years * args.accounts
+        print(f"Generating {rows:,} account_details rows in schema {args.schema} ...")
+        create_dataset(cursor, args.schema, args.companies, args.years, args.accounts)
+
+        before = run(cursor, "SIMILAR TO", similar_to)
+        cursor.execute(MIGRATION.read_text())
+        after = run(cursor, "prefix ranges", prefix_predicate)
+
+        print(f"{'query':30} {'SIMILAR TO':>12} {'ranges':>12} {'speedup':>8}")
+        for name in before:
+            print(f"{name:30} {before[name]:10.1f}ms {after[name]:10.1f}ms {before[name] / after[name]:7.1f}x")
+
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA {args.schema} CASCADE")
+    conn.close()
@@ -0,0 +1,119 @@
+"""
+Measures the startup of streamlit_test.py in fresh interpreters:
+
+- import: what each subsystem adds to the import time on top of streamlit itself
+- first paint: the first run of the app up to the login form (streamlit's AppTest), and
+  a rerun of the same session, with the agent-stack modules the login page had to import
+
+    python -m benchmarks.startup --runs 5
+
+The run exits with status 1 when the login page imported any of the agent stack
+(llama-index, OpenAI, the calculator), which is what the lazy startup is meant to avoid.
+Firestore is not part of that check: streamlit_analytics2 imports it on its own.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+SUBSYSTEMS = [
+    "streamlit_analytics2",
+    "pandas",
+    "google.cloud.firestore",
+    "llama_index.core",
+    "calculator.calculator",
+    "knowledge_agent",
+]
+AGENT_STACK = ("llama_index", "openai", "knowledge_agent", "calculator")
+
+_IMPORT = """
+import importlib, json, time
+import streamlit
+started = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps(time.perf_counter() - started))
+"""
+
+_FIRST_PAINT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+at = AppTest.from_file("streamlit_test.py", default_timeout=120)
+at.secrets["PROD"] = "True"
+at.run()
+first = time.perf_counter() - started
+started = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - started
+print(json.dumps({{
+    "first_paint": first,
+    "rerun": rerun,
+    "login_form": len(at.text_input) > 0,
+    "exceptions": [e.value for e in at.exception],
+    "agent_stack": sorted({{name.split(".")[0] for name in sys.modules if name.startswith({stack!r})}}),
+}}))
+"""
+
+
+def child(code: str):
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None, completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+    return json.loads(completed.stdout.strip().splitlines()[-1]), None
+
+
+def import_times(runs: int) -> dict:
+    results = {}
+    for module in SUBSYSTEMS:
+        timings, error = [], None
+        for _ in range(runs):
+            seconds, error = child(_IMPORT.format(module=module))
+            if error:
+                break
+            timings.append(seconds * 1000)
+        results[module] = {"median_ms": round(statistics.median(timings), 1)} if timings else {"error": error}
+    return results
+
+
+def first_paint(runs: int) -> dict:
+    paints, reruns, last = [], [], None
+    for _ in range(runs):
+        last, error = child(_FIRST_PAINT.format(stack=AGENT_STACK))
+        if error:
+            return {"error": error}
+        paints.append(last["first_paint"] * 1000)
+        reruns.append(last["rerun"] * 1000)
+    return {
+        "first_paint_median_ms": round(statistics.median(paints), 1),
+        "rerun_median_ms": round(statistics.median(reruns), 1),
+        "login_form": last["login_form"],
+        "exceptions": last["exceptions"],
+        "agent_stack": last["agent_stack"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="aantal verse interpreters per meting")
+    parser.add_argument("--json", action="store_true", help="schrijf het resultaat als JSON")
+    args = parser.parse_args()
+
+    results = {"import": import_times(args.runs), "login": first_paint(args.runs)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, result in results["import"].items():
+            print(f"import {module:28} " + (f"{result['median_ms']:9.1f} ms" if "median_ms" in result else result["error"]))
+        login = results["login"]
+        if "error" in login:
+            print(f"login page: {login['error']}")
+        else:
+            print(f"login first paint          {login['first_paint_median_ms']:9.1f} ms")
+            print(f"login rerun                {login['rerun_median_ms']:9.1f} ms")
+            print(f"login form rendered: {login['login_form']}, agent stack imported: {login['agent_stack'] or 'none'}")
+            for exception in login["exceptions"]:
+                print("exception:", exception)
+    sys.exit(1 if results["login"].get("agent_stack") else 0)
@@ -0,0 +1,76 @@
+"""
+Times a paginated account_api_call against a synthetic accounts.json: parsing the file
+on every call (the old tools) versus static_db's load-once index, cold and warm.
+
+    python -m benchmarks.static_db --companies 2000 --accounts 300
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from static_db import StaticTable
+
+
+def write_accounts(path: Path, companies: int, accounts: int):
+    data = {
+        str(company_id): [
+            {
+                "id": company_id * 100_000 + n,
+                "name": f"Rekening {n}",
+                "number": f"{10 + n % 70}{n:04d}",
+                "value": round(n * 1.37, 2),
+            }
+            for n in range(accounts)
+        ]
+        for company_id in range(1, companies + 1)
+    }
+    path.write_text(json.dumps(data))
+
+
+def parse_every_call(path: Path, company_id: str, page: int, page_size: int):
+    with open(path, "r") as file:
+        accounts = json.load(file)
+    start_index = (page - 1) * page_size
+    return accounts[company_id][start_index : start_index + page_size]
+
+
+def per_call(function, calls: int) -> float:
+    started = time.perf_counter()
+    for call in range(calls):
+        function(call)
+    return (time.perf_counter() - started) / calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=300, help="rekeningen per bedrijf")
+    parser.add_argument("--calls", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "accounts.json"
+        write_accounts(path, args.companies, args.accounts)
+        print(f"accounts.json: {path.stat().st_size / 1024**2:.0f} MB")
+
+        def company(call):
+            return str(call % args.companies + 1)
+
+        old = per_call(lambda call: parse_every_call(path, company(call), 2, 100), 5)
+
+        started = time.perf_counter()
+        StaticTable(path).page("1", 2, 100)
+        json_cold = time.perf_counter() - started
+        started = time.perf_counter()
+        table = StaticTable(path)
+        table.page("1", 2, 100)
+        sidecar_cold = time.perf_counter() - started
+
+        warm = per_call(lambda call: table.page(company(call), 2, 100), args.calls)
+
+        print(f"parse per call:        {old * 1000:10.1f} ms")
+        print(f"cold start, JSON:      {json_cold * 1000:10.1f} ms")
+        print(f"cold start, sidecar:   {sidecar_cold * 1000:10.1f} ms")
+        print(f"warm page:             {warm * 1e6:10.1f} µs")
@@ -0,0 +1,90 @@
+"""
+Recall@k and latency of local_vector_index in exact and HNSW mode, and optionally of a
+Milvus server, on the same synthetic corpus.
+
+    python -m benchmarks.vector_search --rows 20000
+    python -m benchmarks.vector_search --rows 20000 --milvus-uri http://localhost:19530
+
+The vectors are drawn around a few hundred random centroids, which is closer to real text
+embeddings than uniform noise (uniform noise is the worst case for any graph index). Exact
+search is the ground truth for recall. The Milvus run creates and drops its own collection.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from ingest import ingest
+from local_vector_index import LocalVectorClient
+
+COLLECTION = "bench_vector_search"
+
+
+def corpus(rows: int, dimension: int, clusters: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    assignment = rng.integers(0, clusters, rows)
+    vectors = centroids[assignment] + 0.6 * rng.standard_normal((rows, dimension), dtype=np.float32)
+    queries = centroids[rng.integers(0, clusters, 200)] + 0.6 * rng.standard_normal((200, dimension), dtype=np.float32)
+    return vectors, queries
+
+
+def run(client, queries, limit: int):
+    client.search(COLLECTION, data=[queries[0]], limit=limit)  # builds the HNSW graph, warms caches
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = client.search(COLLECTION, data=[query.tolist()], limit=limit, output_fields=["text"])
+        latencies.append(time.perf_counter() - started)
+        results.append([hit["entity"]["text"] for hit in hits[0]])
+    return results, latencies
+
+
+def report(name: str, results, latencies, truth):
+    recall = statistics.mean(len(set(got) & set(expected)) / len(expected) for got, expected in zip(results, truth))
+    latencies = sorted(latencies)
+    p50, p95 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+    print(f"{name:8} recall {recall:6.3f}   p50 {p50 * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dimension", type=int, default=756)
+    parser.add_argument("--clusters", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--ef", type=int, default=64)
+    parser.add_argument("--milvus-uri")
+    parser.add_argument("--milvus-token")
+    args = parser.parse_args()
+
+    vectors, queries = corpus(args.rows, args.dimension, args.clusters)
+    pairs = [(f"chunk {i}", vector.tolist()) for i, vector in enumerate(vectors)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        exact = LocalVectorClient(directory)
+        exact.create_collection(COLLECTION, dimension=args.dimension)
+        ingest(exact, pairs, COLLECTION, chunk_size=2000)
+        truth, latencies = run(exact, queries, args.limit)
+        report("exact", truth, latencies, truth)
+
+        started = time.perf_counter()
+        hnsw = LocalVectorClient(directory, mode="hnsw", ef=args.ef)
+        hnsw.search(COLLECTION, data=[queries[0]], limit=args.limit)
+        print(f"{'':8} HNSW graph built in {time.perf_counter() - started:.1f} s")
+        report("hnsw", *run(hnsw, queries, args.limit), truth)
+
+    if args.milvus_uri:
+        from pymilvus import MilvusClient
+
+        milvus = MilvusClient(uri=args.milvus_uri, token=args.milvus_token or "")
+        if milvus.has_collection(COLLECTION):
+            milvus.drop_collection(COLLECTION)
+        milvus.create_collection(COLLECTION, dimension=args.dimension, metric_type="COSINE", consistency_level="Strong")
+        try:
+            ingest(milvus, pairs, COLLECTION, chunk_size=2000)
+            report("milvus", *run(milvus, queries, args.limit), truth)
+        finally:
+            milvus.drop_collection(COLLECTION)
@@ -1,14 +1,42 @@
 from django.utils import timezone
 
+from db_async import run_sync
 from enums.account_type import AccountType
 from utils import (
+    aget_period_ids,
     get_acount_details_by_account_number,
-    get_db_connection,
-    get_period_ids,
+    prefix_predicate,
 )
 
 
-def bereken_EBITDA(company_id: int, date: str):
+def period_sql(build):
+    """
+    Turns `build(company_id, period_id) -> sql` into the tool `fn(company_id, date)`.
+
+    The period is resolved on the async pool; `fn.async_fn` is the coroutine version for
+    the agent and `fn` itself a blocking wrapper around it. Both return the Dutch error
+    message of get_period_ids instead of SQL when no period is found.
+    """
+
+    async def async_fn(company_id: int, date: str):
+        period_id = await aget_period_ids(company_id, date)
+        if isinstance(period_id, str):  # If the result is the error message
+            return period_id
+        return build(company_id, period_id)
+
+    def fn(company_id: int, date: str):
+        return run_sync(async_fn(company_id, date))
+
+    # Not functools.wraps: its __wrapped__ would make the tool schema ask for a period_id.
+    for wrapper in (fn, async_fn):
+        wrapper.__name__, wrapper.__qualname__, wrapper.__doc__ = build.__name__, build.__qualname__, build.__doc__
+    fn.async_fn = async_fn
+    fn.build = build
+    return fn
+
+
+@period_sql
+def bereken_EBITDA(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de ebitda te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -22,27 +50,23 @@ def bereken_EBITDA(company_id: int, date: str):
     EBITDA, short for earnings before interest, taxes, depreciation, and amortization, is an alternate measure of profitability to net income.
     It's used to assess a company's profitability and financial performance.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            sql = f"""SELECT sum(value)*-1 as EBITDA
-                    FROM account_details
-                    WHERE 
-                        company_id = {company_id} AND
-                        account_number SIMILAR TO '60%|61%|62%|64%|70%|71%|72%|73%|74%' AND
-                        period_id = {period_id};
-                    """
-            # cursor.execute(sql)
-            # records = cursor.fetchall()
-            # gain = sum([float(record[10]) for record in records])
-            # result = gain * -1
-            return sql
+    sql = f"""SELECT sum(value)*-1 as EBITDA
+            FROM account_details
+            WHERE 
+                company_id = {company_id} AND
+                {prefix_predicate([60, 61, 62, 64, 70, 71, 72, 73, 74])} AND
+                period_id = {period_id};
+            """
+    # cursor.execute(sql)
+    # records = cursor.fetchall()
+    # gain = sum([float(record[10]) for record in records])
+    # result = gain * -1
+    return sql
 
 
 
-def bereken_VERLIES(company_id: int, date: str):
+@period_sql
+def bereken_VERLIES(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om het verlies te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -57,26 +81,22 @@ def bereken_VERLIES(company_id: int, date: str):
         Wanneer de totale inkomsten lager liggen als de totale uitgaven, dan spreekt men van verlies.
     """
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            sql = f"""SELECT sum(value)*-1 as Verlies
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '60%|61%|62%|63%|64%|65%|66%|67%|68%|70%|71%|72%|73%|74%|75%|76%|77%|78%' AND
-                    period_id = {period_id};
-                """
-            # cursor.execute(sql)
-            # records = cursor.fetchall()
-            # gain = sum([float(record[10]) for record in records])
-            # result = gain * -1
-            return sql
+    sql = f"""SELECT sum(value)*-1 as Verlies
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([60, 61, 62, 63, 64, 65, 66, 67, 68, 70, 71, 72, 73, 74, 75, 76, 77, 78])} AND
+            period_id = {period_id};
+        """
+    # cursor.execute(sql)
+    # records = cursor.fetchall()
+    # gain = sum([float(record[10]) for record in records])
+    # result = gain * -1
+    return sql
 
 
-def bereken_balanstotaal(company_id: int, date: str):
+@period_sql
+def bereken_balanstotaal(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om het balanstotaal te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -90,25 +110,21 @@ def bereken_balanstotaal(company_id: int, date: str):
     Balanstotaal is het totaal van alle schulden en bezittingen, passiva en activa van een onderneming
     """
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            sql = f"""SELECT sum(value)*-1 as Balanstotaal
-                    FROM account_details
-                    WHERE 
-                        company_id = {company_id} AND
-                        account_type = '{AccountType.ASSET}' AND
-                        period_id = {period_id};
-                    """
-            # cursor.execute(sql)
-            # records = cursor.fetchall()
-            # result = sum([float(record[0]) for record in records])
-            return sql
+    sql = f"""SELECT sum(value)*-1 as Balanstotaal
+            FROM account_details
+            WHERE 
+                company_id = {company_id} AND
+                account_type = '{AccountType.ASSET}' AND
+                period_id = {period_id};
+            """
+    # cursor.execute(sql)
+    # records = cursor.fetchall()
+    # result = sum([float(record[0]) for record in records])
+    return sql
 
 
-def bereken_eigen_vermogen(company_id: int, date: str):
+@period_sql
+def bereken_eigen_vermogen(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om het eigen vermogen te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -121,26 +137,22 @@ def bereken_eigen_vermogen(company_id: int, date: str):
     Details:
     Het eigen vermogen is het saldo van de bezittingen ('activa') en schulden ('passiva') van een onderneming of organisatie
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            sql = f"""SELECT sum(value)*-1 as Eigen_vermogen
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '10%|11%|12%|13%|14%|15%' AND
-                    period_id = {period_id};
-                """
-            # records = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [10, 11, 12, 13, 14, 15]
-            # )
-            # result = sum([float(record[0]) for record in records])
-            return sql
+    sql = f"""SELECT sum(value)*-1 as Eigen_vermogen
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([10, 11, 12, 13, 14, 15])} AND
+            period_id = {period_id};
+        """
+    # records = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [10, 11, 12, 13, 14, 15]
+    # )
+    # result = sum([float(record[0]) for record in records])
+    return sql
 
 
-def bereken_voorzieningen(company_id: int, date: str):
+@period_sql
+def bereken_voorzieningen(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de voorzieningen te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -154,27 +166,23 @@ def bereken_voorzieningen(company_id: int, date: str):
     Details:
     De voorzieningen
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [16]
-            # )
-
-            # result = sum([float(record[0]) for record in additives])
-            sql = f"""SELECT sum(value)*-1 as Voorzieningen
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '16%' AND
-                    period_id = {period_id};
-                """
-            return sql
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [16]
+    # )
+
+    # result = sum([float(record[0]) for record in additives])
+    sql = f"""SELECT sum(value)*-1 as Voorzieningen
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([16])} AND
+            period_id = {period_id};
+        """
+    return sql
 
 
-def bereken_handelswerkkapitaal(company_id: int, date: str):
+@period_sql
+def bereken_handelswerkkapitaal(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de handelswerkkapitaal te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -187,40 +195,36 @@ def bereken_handelswerkkapitaal(company_id: int, date: str):
     Details:
     Het handelswerkkapitaal omvat de balansposten die nodig zijn voor de bedrijfsvoering, zoals debiteuren en crediteuren (en ook voorraden)
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [30, 31, 32, 33, 34, 35, 36, 37, 40]
-            # )
-            # negatives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [44]
-            # )
-
-            # result = sum([float(record[0]) for record in additives]) - sum(
-            #     [float(record[0]) for record in negatives]
-            # )
-            sql = f"""SELECT 
-                            SUM(CASE WHEN account_number SIMILAR TO '30%|31%|32%|33%|34%|35%|36%|37%|40' 
-                                    THEN value 
-                                    ELSE 0 
-                                END) 
-                            - SUM(CASE WHEN account_number LIKE '44%' 
-                                    THEN value 
-                                    ELSE 0 
-                                END) AS handelswerkkapitaal
-                        FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    period_id = {period_id};
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [30, 31, 32, 33, 34, 35, 36, 37, 40]
+    # )
+    # negatives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [44]
+    # )
+
+    # result = sum([float(record[0]) for record in additives]) - sum(
+    #     [float(record[0]) for record in negatives]
+    # )
+    sql = f"""SELECT 
+                    SUM(CASE WHEN {prefix_predicate([30, 31, 32, 33, 34, 35, 36, 37, 40])} 
+                            THEN value 
+                            ELSE 0 
+                        END) 
+                    - SUM(CASE WHEN {prefix_predicate([44])} 
+                            THEN value 
+                            ELSE 0 
+                        END) AS handelswerkkapitaal
+                FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            period_id = {period_id};
 
-                        """
-            return sql
+                """
+    return sql
 
 
-def bereken_financiele_schulden(company_id: int, date: str):
+@period_sql
+def bereken_financiele_schulden(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de financiele schulden van een bedrijf te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -234,28 +238,24 @@ def bereken_financiele_schulden(company_id: int, date: str):
     Details:
     De financiele schulden zijn een onderverdeling bij de schulden op meer dan één jaar.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [16, 17, 42, 43]
-            # )
-
-            # result = sum([float(record[0]) for record in additives])
-            sql = f"""
-                    SELECT sum(value)*-1 as Financiële_schulden
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '16%|17%|42%|43%' AND
-                    period_id = {period_id};
-            """
-            return sql
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [16, 17, 42, 43]
+    # )
 
+    # result = sum([float(record[0]) for record in additives])
+    sql = f"""
+            SELECT sum(value)*-1 as Financiële_schulden
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([16, 17, 42, 43])} AND
+            period_id = {period_id};
+    """
+    return sql
 
-def bereken_liquide_middelen(company_id: int, date: str):
+
+@period_sql
+def bereken_liquide_middelen(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de liquide middelen van een bedrijf te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -268,28 +268,24 @@ def bereken_liquide_middelen(company_id: int, date: str):
     Details:
     De financiele schulden zijn een onderverdeling bij de schulden op meer dan één jaar.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [50, 51, 52, 53, 54, 55, 56, 57, 58]
-            # )
-
-            # result = sum([float(record[0]) for record in additives])
-            sql = f"""
-                    SELECT sum(value)*-1 as liquide_middelen
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '50%|51%|52%|53%|54%|55%|56%|57%|58%' AND
-                    period_id = {period_id};
-            """
-            return sql
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [50, 51, 52, 53, 54, 55, 56, 57, 58]
+    # )
+
+    # result = sum([float(record[0]) for record in additives])
+    sql = f"""
+            SELECT sum(value)*-1 as liquide_middelen
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([50, 51, 52, 53, 54, 55, 56, 57, 58])} AND
+            period_id = {period_id};
+    """
+    return sql
 
 
-def bereken_bruto_marge(company_id: int, date: str):
+@period_sql
+def bereken_bruto_marge(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om het bruto marge van een bedrijf te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -303,40 +299,36 @@ def bereken_bruto_marge(company_id: int, date: str):
     Details:
     De bruto marge is een verhouding die meet hoe winstgevend uw bedrijf is
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [70, 71, 72, 74]
-            # )
-            # negatives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [60]
-            # )
-
-            # result = sum([float(record[0]) for record in additives]) - sum(
-            #     [float(record[0]) for record in negatives]
-            # )
-            sql = f"""SELECT 
-                            SUM(CASE WHEN account_number SIMILAR TO '70%|71%|72%|74%' 
-                                    THEN value 
-                                    ELSE 0 
-                                END) 
-                            - SUM(CASE WHEN account_number LIKE '60%' 
-                                    THEN value 
-                                    ELSE 0 
-                                END) AS Bruto_marge
-                        FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    period_id = {period_id};
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [70, 71, 72, 74]
+    # )
+    # negatives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [60]
+    # )
+
+    # result = sum([float(record[0]) for record in additives]) - sum(
+    #     [float(record[0]) for record in negatives]
+    # )
+    sql = f"""SELECT 
+                    SUM(CASE WHEN {prefix_predicate([70, 71, 72, 74])} 
+                            THEN value 
+                            ELSE 0 
+                        END) 
+                    - SUM(CASE WHEN {prefix_predicate([60])} 
+                            THEN value 
+                            ELSE 0 
+                        END) AS Bruto_marge
+                FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            period_id = {period_id};
 
-                        """
-            return sql
+                """
+    return sql
 
 
-def bereken_omzet(company_id: int, date: str):
+@period_sql
+def bereken_omzet(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de omzet te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -351,26 +343,22 @@ def bereken_omzet(company_id: int, date: str):
     De omzet van uw bedrijf is het totale bedrag aan inkomsten uit de verkoop van producten en diensten in een bepaalde periode. Dit wordt ook wel de bruto-omzet genoemd.
     """
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            sql = f"""SELECT sum(value)*-1 as Omzet
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '70%' AND
-                    period_id = {period_id};
-                """
-            # cursor.execute(sql)
-            # records = cursor.fetchall()
-            # gain = sum([float(record[10]) for record in records])
-            # result = gain * -1
-            return sql
+    sql = f"""SELECT sum(value)*-1 as Omzet
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([70])} AND
+            period_id = {period_id};
+        """
+    # cursor.execute(sql)
+    # records = cursor.fetchall()
+    # gain = sum([float(record[10]) for record in records])
+    # result = gain * -1
+    return sql
 
 
-def bereken_EBITDA_marge(company_id: int, date: str):
+@period_sql
+def bereken_EBITDA_marge(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de EBITDA marge te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -384,55 +372,53 @@ def bereken_EBITDA_marge(company_id: int, date: str):
     Details:
     De EBITDA marge geeft aan hoeveel cash een bedrijf genereert voor elke euro omzet.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            sql = f"""WITH 
-                    ebitda AS (
-                        SELECT 
-                            company_id,
-                            SUM(value) * -1 AS ebitda_value
-                        FROM account_details
-                        WHERE 
-                            company_id = {company_id} AND
-                            account_number SIMILAR TO '60%|61%|62%|64%|70%|71%|72%|73%|74%' AND
-                            period_id = {period_id}
-                        GROUP BY company_id
-                    ),
-                    marge AS (
-                        SELECT 
-                            company_id,
-                            SUM(value) * -1 AS marge_value
-                        FROM account_details
-                        WHERE 
-                            company_id = {company_id} AND
-                            account_number SIMILAR TO '70%' AND
-                            period_id = {period_id}
-                        GROUP BY company_id
-                    )
+    sql = f"""WITH 
+            ebitda AS (
                 SELECT 
-                    e.company_id,  
-                    m.marge_value, 
-                    CASE 
-                        WHEN m.marge_value <> 0 THEN e.ebitda_value / m.marge_value
-                        ELSE NULL 
-                    END AS ebitda_marge
-                FROM 
-                    ebitda e
-                JOIN 
-                    marge m 
-                ON 
-                    e.company_id = m.company_id;
-
-                            
-                            """
+                    company_id,
+                    SUM(value) * -1 AS ebitda_value
+                FROM account_details
+                WHERE 
+                    company_id = {company_id} AND
+                    {prefix_predicate([60, 61, 62, 64, 70, 71, 72, 73, 74])} AND
+                    period_id = {period_id}
+                GROUP BY company_id
+            ),
+            marge AS (
+                SELECT 
+                    company_id,
+                    SUM(value) * -1 AS marge_value
+                FROM account_details
+                WHERE 
+                    company_id = {company_id} AND
+                    {prefix_predicate([70])} AND
+                    period_id = {period_id}
+                GROUP BY company_id
+            )
+        SELECT 
+            e.company_id,  
+            m.marge_value, 
+            CASE 
+                WHEN m.marge_value <> 0 THEN e.ebitda_value / m.marge_value
+                ELSE NULL 
+            END AS ebitda_marge
+        FROM 
+            ebitda e
+        JOIN 
+            marge m 
+        ON 
+            e.company_id = m.company_id;
+
+                    
+                    """
     return sql
     # ebitda = bereken_EBITDA(company_id, date)
     # omzet = bereken_omzet(company_id, date)
     # return ebitda / omzet
 
 
-def bereken_afschrijvingen(company_id: int, date: str):
+@period_sql
+def bereken_afschrijvingen(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de afschrijvingen te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -446,27 +432,23 @@ def bereken_afschrijvingen(company_id: int, date: str):
     Details:
     De afschrijvingen
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [63]
-            # )
-
-            # result = sum([float(record[0]) for record in additives])
-            sql = f"""SELECT sum(value)*-1 as Afschrijving
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '63%' AND
-                    period_id = {period_id};
-                """
-            return sql
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [63]
+    # )
+
+    # result = sum([float(record[0]) for record in additives])
+    sql = f"""SELECT sum(value)*-1 as Afschrijving
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([63])} AND
+            period_id = {period_id};
+        """
+    return sql
 
 
-def bereken_EBIT(company_id: int, date: str):
+@period_sql
+def bereken_EBIT(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de EBIT te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -482,23 +464,19 @@ def bereken_EBIT(company_id: int, date: str):
     """
     # ebitda = bereken_EBITDA(company_id, date)
     # afschrijvingen = bereken_afschrijvingen(company_id, date)
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
     sql = f"""SELECT sum(value)*-1 as EBIT
                     FROM account_details
                     WHERE 
                         company_id = {company_id} AND
-                        account_number SIMILAR TO '60%|61%|62%|63%|64%|70%|71%|72%|73%|74%' AND
+                        {prefix_predicate([60, 61, 62, 63, 64, 70, 71, 72, 73, 74])} AND
                         period_id = {period_id};
                     """
     # return ebitda + afschrijvingen
     return sql
 
 
-def bereken_netto_financiele_schuld(company_id: int, date: str):
+@period_sql
+def bereken_netto_financiele_schuld(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de netto financiele schuld te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -515,15 +493,12 @@ def bereken_netto_financiele_schuld(company_id: int, date: str):
     # schulden = bereken_financiele_schulden(company_id, date)
     # liquide = bereken_liquide_middelen(company_id, date)
     # return schulden - liquide
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
     sql = f"""
                 WITH financiele_schuld as (SELECT company_id, sum(value)*-1 as schuld_value
                 FROM account_details
                 WHERE 
                     company_id = {company_id} AND
-                    account_number SIMILAR TO '16%|17%|42%|43%' AND
+                    {prefix_predicate([16, 17, 42, 43])} AND
                     period_id = {period_id}
                 GROUP BY company_id
 ),
@@ -531,7 +506,7 @@ def bereken_netto_financiele_schuld(company_id: int, date: str):
                 FROM account_details
                 WHERE 
                     company_id = {company_id} AND
-                    account_number SIMILAR TO '50%|51%|52%|53%|54%|55%|56%|57%|58%' AND
+                    {prefix_predicate([50, 51, 52, 53, 54, 55, 56, 57, 58])} AND
                     period_id = {period_id}
                 GROUP BY company_id
 )
@@ -542,7 +517,8 @@ def bereken_netto_financiele_schuld(company_id: int, date: str):
     return sql
 
 
-def bereken_handelsvorderingen(company_id: int, date: str):
+@period_sql
+def bereken_handelsvorderingen(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de handelvorderingen van een bedrijf te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
     Vereiste:
@@ -555,28 +531,24 @@ def bereken_handelsvorderingen(company_id: int, date: str):
     Details:
     Het handelsvorderingen zijn een boekhoudkundige rekening met alle uitstaande geldclaims die betrekking hebben op verkopen waarvan de betaling nog niet geïnd is
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            # additives = get_acount_details_by_account_number(
-            #     cursor, company_id, period_id, [40]
-            # )
-
-            # result = sum([float(record[0]) for record in additives])
-            # return result
-            sql = f"""SELECT sum(value)*-1 as handelsvordering
-                FROM account_details
-                WHERE 
-                    company_id = {company_id} AND
-                    account_number SIMILAR TO '40%' AND
-                    period_id = {period_id};
-                """
-            return sql
+    # additives = get_acount_details_by_account_number(
+    #     cursor, company_id, period_id, [40]
+    # )
+
+    # result = sum([float(record[0]) for record in additives])
+    # return result
+    sql = f"""SELECT sum(value)*-1 as handelsvordering
+        FROM account_details
+        WHERE 
+            company_id = {company_id} AND
+            {prefix_predicate([40])} AND
+            period_id = {period_id};
+        """
+    return sql
 
 
-def bereken_dso(company_id: int, date: str):
+@period_sql
+def bereken_dso(company_id: int, period_id: int):
     """
     Deze tool geeft de SQL-query terug om de Day Sales Outstanding (DSO) te berekenen. GEBRUIK DE LOAD_DATA TOOL OM DE TERUGGEGEVEN SQL UIT TE VOEREN!!!!
 
@@ -590,18 +562,13 @@ def bereken_dso(company_id: int, date: str):
     Details:
     De DSO geeft aan hoeveel dagen het gemiddeld duurt voordat een factuur betaald is nadat jouw bedrijf een product of dienst heeft geleverd
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            period_id = get_period_ids(cursor, company_id, date)
-            if isinstance(period_id, str):  # If the result is the error message
-                return period_id
-            
+    
     sql = f"""WITH 
     value_40 AS (
         SELECT c.company_id, c.name, COALESCE(SUM(ad.value), 0) AS total_value_40
         FROM companies c
         JOIN account_details ad ON c.company_id = ad.company_id
-        WHERE ad.account_number SIMILAR TO '40%' 
+        WHERE {prefix_predicate([40], "ad.account_number")} 
           AND ad.company_id = {company_id} 
           AND ad.period_id = {period_id}
         GROUP BY c.company_id, c.name
@@ -610,7 +577,7 @@ def bereken_dso(company_id: int, date: str):
         SELECT c.company_id, COALESCE(SUM(ad.value), 0) AS total_value_70
         FROM companies c
         JOIN account_details ad ON c.company_id = ad.company_id
-        WHERE ad.account_number SIMILAR TO '70%' 
+        WHERE {prefix_predicate([70], "ad.account_number")} 
           AND ad.company_id = {company_id} 
           AND ad.period_id = {period_id}
         GROUP BY c.company_id
@@ -16,9 +16,18 @@ from .calculations import (
     bereken_VERLIES,
     bereken_voorzieningen,
 )
-from utils import get_db_connection
-from django.utils import timezone
+from .kpi import abereken_kpis
+from .metrics import METRICS, compile_portfolio, compile_ranking, compile_series, get_metric
+from .rollup import use_rollup
+from db_async import run_sync
+from query_pages import PagedResult
+from query_results import QueryResult
+from utils import afetch, aresolve_periods, period_params, period_series_params
+import asyncio
+from contextvars import ContextVar
+import psycopg2
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 calculations = {
     "EBITDA": bereken_EBITDA,
@@ -49,14 +58,125 @@ def load_data(sql_query: str):
     Opmerking:
         Gebruik eerst de functies list_tables en describe_tables voor context.
     """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            result = cursor.fetchall()
-            full_df = pd.DataFrame(result)
-            st.session_state.data = full_df
-            st.session_state.data.columns =[ x[0] for x in cursor.description ]
-            return "Het volgende is een preview van data, de user krijgt de hele data te zien. Jij, de chatbot krijgt een deel omdat er anders het risico is om jou context window te overflowen. Vermeld in je antwoord dat jij een preview hebt van de data en de volledige data rechts van de chat te vinden is!" +  str(full_df.head(1))
+    return _show_data(*_open_result(sql_query))
+
+
+def _open_result(sql_query: str):
+    # Browsed page by page when the query can be wrapped; SHOW and friends stream as before.
+    try:
+        result, page = PagedResult.open(sql_query)
+        return page, result
+    except psycopg2.ProgrammingError:
+        result = QueryResult.open(sql_query, owner=_session_id())
+        return result.dataframe, result
+
+
+async def aload_data(sql_query: str):
+    """Async variant van load_data."""
+    # The result is paged later from the script thread (next page, sorting, export), so it
+    # stays on the psycopg2 pool; opening it runs off the event loop.
+    return _show_data(*await asyncio.to_thread(_open_result, sql_query))
+
+
+async def _arun_query(sql_query: str, params=None) -> pd.DataFrame:
+    description, rows = await afetch(sql_query, params)
+    return pd.DataFrame(rows, columns=[column.name for column in description])
+
+
+# Tools that run on the DB loop can not reach st.session_state (it belongs to the script
+# thread), so while a chat turn is running their data is parked here and published by
+# the script thread afterwards.
+_pending_data: ContextVar[dict | None] = ContextVar("pending_data", default=None)
+
+
+def _session_id() -> str | None:
+    # The Streamlit session the data is for; on the DB loop it was parked with the pending data.
+    pending = _pending_data.get()
+    if pending is not None:
+        return pending.get("session")
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def pending_data() -> dict:
+    """An empty `pending` for `capture_data`; call it from the script thread."""
+    ctx = get_script_run_ctx()
+    return {"session": ctx.session_id if ctx is not None else None}
+
+
+def capture_data(pending: dict):
+    """Parks the data of the tools running in the current async context in `pending`."""
+    _pending_data.set(pending)
+
+
+def publish_data(pending: dict):
+    if "data" in pending:
+        _publish(pending["data"], pending["result"], pending.get("chart"))
+
+
+def _publish(full_df: pd.DataFrame, result: QueryResult | PagedResult | None, chart: dict | None = None):
+    # The previous streamed result still pins a pooled connection until it is closed.
+    previous = st.session_state.get("result")
+    if isinstance(previous, QueryResult) and previous is not result:
+        previous.close()
+    st.session_state.result = result
+    st.session_state.data = full_df
+    st.session_state.chart = chart
+
+
+def _show_data(
+    full_df: pd.DataFrame, result: QueryResult | PagedResult | None = None, chart: dict | None = None
+):
+    # `chart`: keyword arguments for st.line_chart when the data should also be drawn.
+    pending = _pending_data.get()
+    if pending is not None:
+        if isinstance(pending.get("result"), QueryResult) and pending["result"] is not result:
+            pending["result"].close()
+        pending["data"], pending["result"], pending["chart"] = full_df, result, chart
+    else:
+        _publish(full_df, result, chart)
+    return "Het volgende is een preview van data, de user krijgt de hele data te zien. Jij, de chatbot krijgt een deel omdat er anders het risico is om jou context window te overflowen. Vermeld in je antwoord dat jij een preview hebt van de data en de volledige data rechts van de chat te vinden is!" +  str(full_df.head(1))
+
+
+def _run_in_script_thread(coro):
+    # Sync entry point for tools that show data: run on the DB loop, publish here.
+    pending = pending_data()
+
+    async def run():
+        capture_data(pending)
+        return await coro
+
+    message = run_sync(run())
+    publish_data(pending)
+    return message
+
+
+def _parse_metrics(what: str):
+    # Comma separated metric names -> specs, or the first name that is not a metric.
+    specs = []
+    for name in what.split(","):
+        spec = get_metric(name)
+        if spec is None:
+            return name.strip()
+        specs.append(spec)
+    return tuple(specs)
+
+
+async def abereken(what: str, company_id: int, date: str):
+    """Async variant van bereken."""
+
+    # TODO: Vergelijk mogelijke synoniemen/typefouten met sleutelwoorden in calculations (gebruik cosine similarity of LLM).
+
+    if what in calculations:
+        # All metrics come out of one shared aggregate query, so asking for several
+        # metrics of the same company and period only scans account_details once.
+        result = await abereken_kpis(company_id, date)
+        if isinstance(result, str):  # If the result is the error message
+            return result
+        return result[what]
+
+    return f"Kan de berekening voor '{what}' niet uitvoeren. Alleen de volgende berekeningen worden ondersteund: {list(calculations.keys())}"
+
 
 def bereken(what: str, company_id: int, date: str):
     """
@@ -70,13 +190,28 @@ def bereken(what: str, company_id: int, date: str):
     Foutafhandeling:
         Geeft een foutbericht als het gevraagde type berekening niet wordt ondersteund.
     """
+    return run_sync(abereken(what, company_id, date))
 
-    # TODO: Vergelijk mogelijke synoniemen/typefouten met sleutelwoorden in calculations (gebruik cosine similarity of LLM).
 
-    if what in calculations:
-        return calculations[what](company_id, date)
+async def avergelijk_op_basis_van(
+    what: str, date: str, limit: int = 10, order_by: str = "DESC"
+):
+    """Async variant van vergelijk_op_basis_van."""
+    if limit > 100:
+        return (
+            "Dit is een te groot aantal bedrijven. Kies aub een kleinere hoeveelheid."
+        )
+    if order_by.upper() not in ("ASC", "DESC"):
+        return "order_by moet 'ASC' of 'DESC' zijn."
 
-    return f"Kan de berekening voor '{what}' niet uitvoeren. Alleen de volgende berekeningen worden ondersteund: {list(calculations.keys())}"
+    specs = _parse_metrics(what)
+    if isinstance(specs, str):  # If the result is the error message
+        return f"Kan niet vergelijken op basis van '{specs}'. Alleen de volgende berekeningen worden ondersteund: {list(METRICS.keys())}"
+
+    sql = compile_ranking(
+        specs, order_by.upper(), "rollup" if use_rollup() else "account_details"
+    )
+    return _show_data(await _arun_query(sql, {**period_params(date), "limit": limit}))
 
 
 def vergelijk_op_basis_van(
@@ -86,500 +221,84 @@ def vergelijk_op_basis_van(
     Geeft de gevraagde hoeveelheid bedrijven terug gesorteerd op ASC or DESC voor een bepaalde periode
     Vereiste:
         - what (str): Het soort berekening dat gemaakt moet worden. Map indien mogelijk naar een van volgende woorden (EBITDA, verlies, balanstotaal, eigen vermogen, voorzieningen,
-            handelswerkkapitaal, financiele schulden, liquide middelen, bruto marge, omzet, EBITDA marge, afschrijvingen, netto financiele schuld, handelsvorderingen, dso)
+            handelswerkkapitaal, financiele schulden, liquide middelen, bruto marge, omzet, EBITDA marge, afschrijvingen, netto financiele schuld, handelsvorderingen, dso).
+            Meerdere berekeningen kunnen tegelijk gevraagd worden, gescheiden door een komma (bv. "EBITDA, omzet"); er wordt gesorteerd op de eerste.
     """
-    date = timezone.datetime.fromisoformat(date)
-    if limit > 100:
-        return (
-            "Dit is een te groot aantal bedrijven. Kies aub een kleinere hoeveelheid."
-        )
-    match what:
-        case "EBITDA":
-            sql = f"""WITH latest_period AS (
-                                SELECT period_id, company_id,
-                                    ROW_NUMBER() OVER (
-                                        PARTITION BY company_id
-                                        ORDER BY 
-                                            (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = EXTRACT(YEAR FROM DATE '{date}') THEN 1 ELSE 2 END),
-                                            ABS(end_date - DATE '{date}') ASC
-                                    ) AS rn
-                                FROM periods
-                                WHERE DATE_PART('year', end_date) = EXTRACT(YEAR FROM DATE '{date}')
-                            )
-
-                            SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                            FROM companies c
-                            JOIN account_details ad ON c.company_id = ad.company_id
-                            JOIN periods p ON ad.period_id = p.period_id
-                            JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id
-                            WHERE lp.rn = 1
-                            AND ad.account_number SIMILAR TO '60%|61%|62%|64%|70%|71%|72%|73%|74%'
-                            GROUP BY c.company_id, c.name
-                            ORDER BY total_value {order_by}
-                            LIMIT {limit};
-
-                                    """
-        case "verlies":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '60%|61%|62%|63%|64%|65%|66%|67%|68%|70%|71%|72%|73%|74%|75%|76%|77%|78%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "balanstotaal":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '60%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "eigen vermogen":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '10%|11%|12%|13%|14%|15%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "voorziening":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '16%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "handelswerkkapitaal":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT 
-                            c.company_id, 
-                            c.name, 
-                            SUM(CASE WHEN ad.account_number SIMILAR TO '30%|31%|32%|33%|34%|35%|36%|37%|40' 
-                                    THEN ad.value 
-                                    ELSE 0 
-                                END) 
-                            - SUM(CASE WHEN ad.account_number LIKE '44%' 
-                                    THEN ad.value 
-                                    ELSE 0 
-                                END) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "financiele schulden":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '16%|17%|42%|43%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "liquide middelen":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '50%|51%|52%|53%|54%|55%|56%|57%|58%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "bruto marge":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT 
-                            c.company_id, 
-                            c.name, 
-                            SUM(CASE WHEN ad.account_number SIMILAR TO '70%|71%|72%|74%' 
-                                    THEN ad.value 
-                                    ELSE 0 
-                                END) 
-                            - SUM(CASE WHEN ad.account_number LIKE '60%' 
-                                    THEN ad.value 
-                                    ELSE 0 
-                                END) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "omzet":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '70%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "EBITDA marge":
-            sql = f"""WITH latest_period AS (
-                    SELECT period_id, company_id,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY company_id 
-                            ORDER BY 
-                                (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                end_date DESC
-                        ) AS rn
-                    FROM periods
-                    WHERE DATE_PART('year', end_date) = {date.year}
-                ),
-
-                -- Bereken de EBITDA voor elk bedrijf
-                ebitda AS (
-                    SELECT c.company_id, c.name, SUM(ad.value) AS ebitda_value
-                    FROM companies c
-                    JOIN account_details ad ON c.company_id = ad.company_id
-                    JOIN periods p ON ad.period_id = p.period_id
-                    JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                    WHERE ad.account_number SIMILAR TO '60%|61%|62%|64%|70%|71%|72%|73%|74%'
-                    GROUP BY c.company_id, c.name
-                ),
-
-                -- Bereken de omzet voor elk bedrijf
-                marge AS (
-                    SELECT c.company_id, SUM(ad.value) AS marge_value
-                    FROM companies c
-                    JOIN account_details ad ON c.company_id = ad.company_id
-                    JOIN periods p ON ad.period_id = p.period_id
-                    JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                    WHERE ad.account_number SIMILAR TO '70%'
-                    GROUP BY c.company_id
-                )
-
-                -- Combineer EBITDA en marge om de EBITDA-marge te berekenen
-                SELECT e.company_id, 
-                    e.name, 
-                    e.ebitda_value, 
-                    m.marge_value, 
-                    CASE 
-                        WHEN m.marge_value <> 0 THEN e.ebitda_value / m.marge_value
-                        ELSE NULL 
-                    END AS ebitda_marge
-                FROM ebitda e
-                JOIN marge m ON e.company_id = m.company_id
-                ORDER BY ebitda_marge {order_by}
-                LIMIT {limit};
-                """
-        case "afschrijvingen":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        )
-
-                        SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                        FROM companies c
-                        JOIN account_details ad ON c.company_id = ad.company_id
-                        JOIN periods p ON ad.period_id = p.period_id
-                        JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                        WHERE ad.account_number SIMILAR TO '63%'
-                        GROUP BY c.company_id, c.name
-                        ORDER BY total_value {order_by}
-                        LIMIT {limit};
-                        """
-        case "EBIT":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        ),
-
-                        -- CTE to calculate the total_value for account numbers starting with '60%|61%|62%|64%|70%|71%|72%|73%|74%'
-                        value_main AS (
-                            SELECT c.company_id, c.name, SUM(ad.value) AS total_value_main
-                            FROM companies c
-                            JOIN account_details ad ON c.company_id = ad.company_id
-                            JOIN periods p ON ad.period_id = p.period_id
-                            JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                            WHERE ad.account_number SIMILAR TO '60%|61%|62%|64%|70%|71%|72%|73%|74%'
-                            GROUP BY c.company_id, c.name
-                        ),
-
-                        -- CTE to calculate the total_value for account numbers starting with '63%'
-                        value_63 AS (
-                            SELECT c.company_id, SUM(ad.value) AS total_value_63
-                            FROM companies c
-                            JOIN account_details ad ON c.company_id = ad.company_id
-                            JOIN periods p ON ad.period_id = p.period_id
-                            JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                            WHERE ad.account_number SIMILAR TO '63%'
-                            GROUP BY c.company_id
-                        )
-
-                        -- Main query to join the results and perform the subtraction
-                        SELECT v_main.company_id, 
-                            v_main.name, 
-                            v_main.total_value_main, 
-                            v_63.total_value_63,
-                            v_main.total_value_main - v_63.total_value_63 AS result_difference
-                        FROM value_main v_main
-                        JOIN value_63 v_63 ON v_main.company_id = v_63.company_id
-                        ORDER BY result_difference {order_by}
-                        LIMIT {limit};
-                        """
-        case "Netto financiele schuld":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                ROW_NUMBER() OVER (
-                                    PARTITION BY company_id 
-                                    ORDER BY 
-                                        (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                        end_date DESC
-                                ) AS rn
-                            FROM periods
-                            WHERE DATE_PART('year', end_date) = {date.year}
-                        ),
-
-                        -- CTE to calculate the total_value for account numbers starting with '16%|17%|42%|43%'
-                        value_1 AS (
-                            SELECT c.company_id, c.name, SUM(ad.value) AS total_value_1
-                            FROM companies c
-                            JOIN account_details ad ON c.company_id = ad.company_id
-                            JOIN periods p ON ad.period_id = p.period_id
-                            JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                            WHERE ad.account_number SIMILAR TO '16%|17%|42%|43%'
-                            GROUP BY c.company_id, c.name
-                        ),
-
-                        -- CTE to calculate the total_value for account numbers starting with '50%|51%|52%|53%|54%|55%|56%|57%|58%'
-                        value_2 AS (
-                            SELECT c.company_id, SUM(ad.value) AS total_value_2
-                            FROM companies c
-                            JOIN account_details ad ON c.company_id = ad.company_id
-                            JOIN periods p ON ad.period_id = p.period_id
-                            JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                            WHERE ad.account_number SIMILAR TO '50%|51%|52%|53%|54%|55%|56%|57%|58%'
-                            GROUP BY c.company_id
-                        )
-
-                        -- Main query to join the results and perform the subtraction
-                        SELECT v1.company_id, 
-                            v1.name, 
-                            v1.total_value_1, 
-                            v2.total_value_2,
-                            v1.total_value_1 - v2.total_value_2 AS result_difference
-                        FROM value_1 v1
-                        JOIN value_2 v2 ON v1.company_id = v2.company_id
-                        ORDER BY result_difference {order_by}
-                        LIMIT {limit};
-                        """
-        case "handelsvorderingen":
-            sql = f"""WITH latest_period AS (
-                            SELECT period_id, company_id,
-                                            ROW_NUMBER() OVER (
-                                                PARTITION BY company_id 
-                                                ORDER BY 
-                                                    (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                                    end_date DESC
-                                            ) AS rn
-                                        FROM periods
-                                        WHERE DATE_PART('year', end_date) = {date.year}
-                                    )
-
-                                    SELECT c.company_id, c.name, SUM(ad.value) AS total_value
-                                    FROM companies c
-                                    JOIN account_details ad ON c.company_id = ad.company_id
-                                    JOIN periods p ON ad.period_id = p.period_id
-                                    JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                                    WHERE ad.account_number SIMILAR TO '40%'
-                                    GROUP BY c.company_id, c.name
-                                    ORDER BY total_value {order_by}
-                                    LIMIT {limit};
-                                    """
-        case "dso":
-            sql = f"""WITH latest_period AS (
-                    SELECT period_id, company_id,
-                        ROW_NUMBER() OVER (
-                            PARTITION BY company_id 
-                            ORDER BY 
-                                (CASE WHEN end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year} THEN 1 ELSE 2 END),
-                                end_date DESC
-                        ) AS rn
-                    FROM periods
-                    WHERE DATE_PART('year', end_date) = {date.year}
-                ),
-
-                -- First CTE to calculate the total_value for account numbers starting with '40%'
-                value_40 AS (
-                    SELECT c.company_id, c.name, SUM(ad.value) AS total_value_40
-                    FROM companies c
-                    JOIN account_details ad ON c.company_id = ad.company_id
-                    JOIN periods p ON ad.period_id = p.period_id
-                    JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                    WHERE ad.account_number SIMILAR TO '40%'
-                    GROUP BY c.company_id, c.name
-                ),
-
-                -- Second CTE to calculate the total_value for account numbers starting with '70%'
-                value_70 AS (
-                    SELECT c.company_id, SUM(ad.value) AS total_value_70
-                    FROM companies c
-                    JOIN account_details ad ON c.company_id = ad.company_id
-                    JOIN periods p ON ad.period_id = p.period_id
-                    JOIN latest_period lp ON lp.company_id = c.company_id AND ad.period_id = lp.period_id AND lp.rn = 1
-                    WHERE ad.account_number SIMILAR TO '70%'
-                    GROUP BY c.company_id
-                )
-
-                -- Main query to join the results and perform the division
-                SELECT v40.name, 
-                    CASE 
-                        WHEN v70.total_value_70 <> 0 THEN abs(v40.total_value_40 / v70.total_value_70) * 365
-                        ELSE NULL 
-                    END AS result_ratio
-                FROM value_40 v40
-                JOIN value_70 v70 ON v40.company_id = v70.company_id
-                WHERE v70.total_value_70 <> 0
-                ORDER BY result_ratio {order_by}
-                LIMIT {limit};
-                """
-
-    return load_data(sql)
+    return _run_in_script_thread(avergelijk_op_basis_van(what, date, limit, order_by))
+
+
+async def abereken_many(what: str, company_ids: list[int], date: str):
+    """Async variant van bereken_many."""
+    specs = _parse_metrics(what)
+    if isinstance(specs, str):  # If the result is the error message
+        return f"Kan de berekening voor '{specs}' niet uitvoeren. Alleen de volgende berekeningen worden ondersteund: {list(METRICS.keys())}"
+
+    company_ids = list(dict.fromkeys(int(company_id) for company_id in company_ids))
+    periods = {
+        company_id: period_id
+        for company_id, period_id in (await aresolve_periods(company_ids, date)).items()
+        if period_id is not None
+    }
+    sql = compile_portfolio(specs, "rollup" if use_rollup() else "account_details")
+    frame = await _arun_query(
+        sql,
+        {"company_ids": list(periods), "period_ids": list(periods.values()), "requested_ids": company_ids},
+    )
+    names = [spec.name for spec in specs]
+    frame[names] = frame[names].astype(float)
+    return _show_data(frame)
+
+
+def bereken_many(what: str, company_ids: list[int], date: str):
+    """
+    Voert dezelfde berekening(en) uit voor een lijst bedrijven in de periode van een datum.
+    Gebruik deze tool in plaats van bereken zodra dezelfde berekening voor meerdere bedrijven gevraagd wordt.
+
+    De periodes van alle bedrijven worden in één query opgezocht en alle waarden komen uit
+    één gegroepeerde query, hoeveel bedrijven er ook gevraagd worden.
+    Args:
+        what (str): Eén of meer berekeningen gescheiden door een komma (bv. "omzet, EBITDA").
+        company_ids (list[int]): De ID's van de bedrijven.
+        date (str): Einddatum van de periode in "YYYY-MM-DD" formaat.
+    Returns:
+        Een preview; de volledige tabel (company_id, name en één kolom per berekening, leeg
+        voor bedrijven zonder periode) wordt naast de chat getoond. Een foutbericht (str)
+        als een berekening niet bestaat.
+    """
+    return _run_in_script_thread(abereken_many(what, company_ids, date))
 
 
+async def abereken_reeks(what: str, company_id: int, start_date: str, end_date: str):
+    """Async variant van bereken_reeks."""
+    specs = _parse_metrics(what)
+    if isinstance(specs, str):  # If the result is the error message
+        return f"Kan de berekening voor '{specs}' niet uitvoeren. Alleen de volgende berekeningen worden ondersteund: {list(METRICS.keys())}"
 
+    sql = compile_series(specs, "rollup" if use_rollup() else "account_details")
+    frame = await _arun_query(sql, {**period_series_params(start_date, end_date), "company_id": int(company_id)})
+    if frame.empty:
+        return "Dit bedrijf heeft geen periodes tussen deze datums"
+    names = [spec.name for spec in specs]
+    frame[names] = frame[names].astype(float)
+    series = frame.melt(id_vars="year", value_vars=names, var_name="metric", value_name="value")
+    return _show_data(series, chart={"x": "year", "y": "value", "color": "metric"})
+
+
+def bereken_reeks(what: str, company_id: int, start_date: str, end_date: str):
+    """
+    Berekent één of meer kengetallen van een bedrijf voor elk jaar tussen twee datums.
+    Gebruik deze tool wanneer de evolutie van een kengetal over meerdere jaren gevraagd wordt.
+
+    Per jaar wordt de periode gekozen zoals bij bereken, met de dag en maand van end_date;
+    alle periodes en waarden komen uit één query.
+    Args:
+        what (str): Eén of meer berekeningen gescheiden door een komma (bv. "EBITDA, omzet").
+        company_id (int): De ID van het bedrijf.
+        start_date (str): Een datum in het eerste jaar, in "YYYY-MM-DD" formaat.
+        end_date (str): Einddatum van de periode in het laatste jaar, in "YYYY-MM-DD" formaat.
+    Returns:
+        Een preview; de volledige reeks (year, metric, value) wordt naast de chat getoond,
+        als tabel en als lijngrafiek. Een foutbericht (str) als een berekening niet bestaat
+        of het bedrijf geen periodes heeft.
+    """
+    return _run_in_script_thread(abereken_reeks(what, company_id, start_date, end_date))
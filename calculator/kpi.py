@@ -0,0 +1,92 @@
+from dataclasses import dataclass, fields
+
+from db_async import run_sync
+from utils import afetch, aget_period_ids
+
+from .metrics import METRICS, aggregate_columns
+from .rollup import ROLLUP_TABLE, use_rollup
+
+# One conditional aggregate per prefix plus the asset total, so a single scan over the
+# rows of one company and period feeds every metric. The rollup variant reads at most one
+# row per prefix instead of every account of the period.
+KPI_SQL = f"""SELECT
+    {aggregate_columns("account_details")}
+FROM account_details r
+WHERE r.company_id = %(company_id)s AND r.period_id = %(period_id)s;
+"""
+ROLLUP_KPI_SQL = f"""SELECT
+    {aggregate_columns("rollup")}
+FROM {ROLLUP_TABLE} r
+WHERE r.company_id = %(company_id)s AND r.period_id = %(period_id)s;
+"""
+
+def totals_from_row(description, row) -> dict:
+    return {
+        column.name: float(value)
+        for column, value in zip(description, row)
+        if value is not None
+    }
+
+
+@dataclass(frozen=True)
+class KPIResult:
+    company_id: int
+    period_id: int
+    ebitda: float
+    verlies: float
+    balanstotaal: float
+    eigen_vermogen: float
+    voorzieningen: float
+    handelswerkkapitaal: float
+    financiele_schulden: float
+    liquide_middelen: float
+    bruto_marge: float
+    omzet: float
+    ebitda_marge: float | None
+    afschrijvingen: float
+    ebit: float
+    netto_financiele_schuld: float
+    handelsvorderingen: float
+    dso: float | None
+
+    @classmethod
+    def from_totals(cls, company_id: int, period_id: int, totals: dict) -> "KPIResult":
+        return cls(
+            company_id=company_id,
+            period_id=period_id,
+            **{spec.field: spec.evaluate(totals) for spec in METRICS.values()},
+        )
+
+    def __getitem__(self, what: str):
+        """Look up a metric by its name in `calculator.calculations`, e.g. `result["EBITDA marge"]`."""
+        return getattr(self, what.lower().replace(" ", "_"))
+
+    def as_dict(self) -> dict:
+        return {
+            field.name: getattr(self, field.name)
+            for field in fields(self)
+            if field.name not in ("company_id", "period_id")
+        }
+
+
+async def abereken_kpis(company_id: int, date: str):
+    """Async variant van bereken_kpis, op de gedeelde async pool."""
+    period_id = await aget_period_ids(company_id, date)
+    if isinstance(period_id, str):  # If the result is the error message
+        return period_id
+
+    sql = ROLLUP_KPI_SQL if use_rollup() else KPI_SQL
+    description, rows = await afetch(sql, {"company_id": company_id, "period_id": period_id})
+    totals = totals_from_row(description, rows[0])
+
+    return KPIResult.from_totals(int(company_id), period_id, totals)
+
+
+def bereken_kpis(company_id: int, date: str):
+    """
+    Berekent alle kengetallen van de calculator voor een bedrijf in een bepaalde periode met één query.
+
+    Returns:
+        KPIResult, of een foutbericht (str) als er geen periode gevonden wordt.
+    """
+    return run_sync(abereken_kpis(company_id, date))
@@ -0,0 +1,263 @@
+"""
+Declaratieve definities van de kengetallen van de calculator.
+
+Elk kengetal is een gewogen som van rekeningprefixen (twee cijfers van het Belgisch
+rekeningstelsel) of een verhouding van twee zulke sommen. Dezelfde specificatie wordt
+in Python geëvalueerd voor één bedrijf (kpi.KPIResult) en naar SQL gecompileerd voor
+rankings over alle bedrijven (compile_ranking).
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from enums.account_type import AccountType
+from utils import period_choice_sql, period_series_sql, prefix_predicate
+
+from .rollup import ROLLUP_TABLE
+
+# Pseudo-prefix for the sum of all asset accounts, used by balanstotaal.
+ACTIVA = "activa"
+
+
+def column_name(key: str) -> str:
+    return ACTIVA if key == ACTIVA else f"p{key}"
+
+
+@dataclass(frozen=True)
+class WeightedSum:
+    weights: tuple[tuple[str, float], ...]
+
+    def evaluate(self, totals: dict) -> float:
+        return sum(weight * totals.get(column_name(key), 0.0) for key, weight in self.weights)
+
+    def sql(self, table: str) -> str:
+        terms = " + ".join(f"({weight:g} * {table}.{column_name(key)})" for key, weight in self.weights)
+        return f"({terms})"
+
+    @property
+    def keys(self) -> set[str]:
+        return {key for key, _ in self.weights}
+
+
+@dataclass(frozen=True)
+class Ratio:
+    numerator: WeightedSum
+    denominator: WeightedSum
+    scale: float = 1.0
+    absolute: bool = False
+
+    def evaluate(self, totals: dict) -> float | None:
+        denominator = self.denominator.evaluate(totals)
+        if not denominator:
+            return None
+        value = self.numerator.evaluate(totals) / denominator
+        return (abs(value) if self.absolute else value) * self.scale
+
+    def sql(self, table: str) -> str:
+        numerator, denominator = self.numerator.sql(table), self.denominator.sql(table)
+        value = f"{numerator} / NULLIF({denominator}, 0)"
+        if self.absolute:
+            value = f"ABS({value})"
+        return f"({value} * {self.scale:g})"
+
+    @property
+    def keys(self) -> set[str]:
+        return self.numerator.keys | self.denominator.keys
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    name: str
+    formula: WeightedSum | Ratio
+
+    @property
+    def field(self) -> str:
+        """Attribute name of the metric on KPIResult."""
+        return self.name.lower().replace(" ", "_")
+
+    def evaluate(self, totals: dict) -> float | None:
+        return self.formula.evaluate(totals)
+
+
+def prefixes(*keys, weight: float = 1.0) -> WeightedSum:
+    return WeightedSum(tuple((str(key), weight) for key in keys))
+
+
+def combine(*sums: WeightedSum) -> WeightedSum:
+    return WeightedSum(tuple(term for weighted_sum in sums for term in weighted_sum.weights))
+
+
+# Credit balances are negative in account_details, hence the -1 weights on results.
+_ebitda = prefixes(60, 61, 62, 64, 70, 71, 72, 73, 74, weight=-1)
+_omzet = prefixes(70, weight=-1)
+_financiele_schulden = prefixes(16, 17, 42, 43, weight=-1)
+_liquide_middelen = prefixes(*range(50, 59), weight=-1)
+
+METRICS: dict[str, MetricSpec] = {
+    spec.name: spec
+    for spec in [
+        MetricSpec("EBITDA", _ebitda),
+        MetricSpec("verlies", prefixes(*range(60, 69), *range(70, 79), weight=-1)),
+        MetricSpec("balanstotaal", prefixes(ACTIVA, weight=-1)),
+        MetricSpec("eigen vermogen", prefixes(*range(10, 16), weight=-1)),
+        MetricSpec("voorzieningen", prefixes(16, weight=-1)),
+        MetricSpec("handelswerkkapitaal", combine(prefixes(*range(30, 38), 40), prefixes(44, weight=-1))),
+        MetricSpec("financiele schulden", _financiele_schulden),
+        MetricSpec("liquide middelen", _liquide_middelen),
+        MetricSpec("bruto marge", combine(prefixes(70, 71, 72, 74), prefixes(60, weight=-1))),
+        MetricSpec("omzet", _omzet),
+        MetricSpec("EBITDA marge", Ratio(_ebitda, _omzet)),
+        MetricSpec("afschrijvingen", prefixes(63, weight=-1)),
+        MetricSpec("EBIT", prefixes(*range(60, 65), *range(70, 75), weight=-1)),
+        MetricSpec(
+            "netto financiele schuld",
+            combine(_financiele_schulden, prefixes(*range(50, 59))),
+        ),
+        MetricSpec("handelsvorderingen", prefixes(40, weight=-1)),
+        MetricSpec("dso", Ratio(prefixes(40), prefixes(70), scale=365, absolute=True)),
+    ]
+}
+
+# Prefixes referenced by at least one metric; the aggregate queries compute exactly these.
+PREFIXES = sorted({key for spec in METRICS.values() for key in spec.formula.keys} - {ACTIVA})
+
+_ALIASES = {"voorziening": "voorzieningen"}
+
+
+def get_metric(name: str) -> MetricSpec | None:
+    name = name.strip()
+    lookup = {key.lower(): spec for key, spec in METRICS.items()}
+    return lookup.get(_ALIASES.get(name.lower(), name.lower()))
+
+
+def aggregate_columns(source: str, keys: set[str] | None = None) -> str:
+    """Conditional aggregates over the rows aliased `r`, one column per prefix in `keys`."""
+    keys = {ACTIVA, *PREFIXES} if keys is None else keys
+    columns = []
+    if ACTIVA in keys:
+        if source == "rollup":
+            columns.append("COALESCE(SUM(r.asset_value), 0) AS activa")
+        else:
+            columns.append(
+                f"COALESCE(SUM(r.value) FILTER (WHERE r.account_type = '{AccountType.ASSET}'), 0) AS activa"
+            )
+    for prefix in sorted(keys - {ACTIVA}):
+        if source == "rollup":
+            columns.append(f"COALESCE(SUM(r.value) FILTER (WHERE r.prefix2 = '{prefix}'), 0) AS p{prefix}")
+        else:
+            columns.append(
+                f"COALESCE(SUM(r.value) FILTER (WHERE {prefix_predicate([prefix], 'r.account_number')}), 0) AS p{prefix}"
+            )
+    return ",\n    ".join(columns)
+
+
+def _row_filter(keys: set[str], source: str) -> str:
+    if ACTIVA in keys:
+        return "TRUE"
+    if source == "rollup":
+        return "r.prefix2 IN (" + ", ".join(f"'{key}'" for key in sorted(keys)) + ")"
+    return prefix_predicate(keys, "r.account_number")
+
+
+@lru_cache(maxsize=256)
+def compile_ranking(specs: tuple[MetricSpec, ...], order_by: str = "DESC", source: str = "account_details") -> str:
+    """
+    Compileert één SQL-statement dat alle bedrijven rangschikt op de eerste metric en de
+    waarden van alle gevraagde metrics samen teruggeeft.
+
+    Parameters in de query: date, year_start, next_year_start en limit. Het resultaat wordt
+    gecachet op de specificaties zelf, dus dezelfde vraag compileert maar één keer.
+    """
+    order_by = order_by.upper()
+    if order_by not in ("ASC", "DESC"):
+        raise ValueError("order_by must be 'ASC' or 'DESC'.")
+    table = ROLLUP_TABLE if source == "rollup" else "account_details"
+    keys = set().union(*(spec.formula.keys for spec in specs))
+    metric_columns = ",\n                   ".join(
+        f'{spec.formula.sql("t")} AS "{spec.name}"' for spec in specs
+    )
+    return f"""WITH latest_period AS (
+                {period_choice_sql()}
+            ),
+            totals AS (
+                SELECT r.company_id,
+                       {aggregate_columns(source, keys)}
+                FROM latest_period lp
+                JOIN {table} r ON r.company_id = lp.company_id AND r.period_id = lp.period_id
+                WHERE {_row_filter(keys, source)}
+                GROUP BY r.company_id
+            )
+            SELECT c.company_id, c.name,
+                   {metric_columns}
+            FROM totals t
+            JOIN companies c ON c.company_id = t.company_id
+            ORDER BY "{specs[0].name}" {order_by} NULLS LAST
+            LIMIT %(limit)s;
+            """
+
+
+@lru_cache(maxsize=256)
+def compile_portfolio(specs: tuple[MetricSpec, ...], source: str = "account_details") -> str:
+    """
+    Compileert één SQL-statement dat de gevraagde metrics voor een lijst bedrijven
+    berekent, elk in zijn eigen periode.
+
+    Parameters in de query: company_ids en period_ids, twee even lange lijsten met per
+    bedrijf de periode (bv. uit resolve_periods). Bedrijven zonder periode komen terug
+    met NULL als waarde.
+    """
+    table = ROLLUP_TABLE if source == "rollup" else "account_details"
+    keys = set().union(*(spec.formula.keys for spec in specs))
+    metric_columns = ",\n                   ".join(
+        f'{spec.formula.sql("t")} AS "{spec.name}"' for spec in specs
+    )
+    return f"""WITH chosen AS (
+                SELECT * FROM unnest(%(company_ids)s::int[], %(period_ids)s::int[]) AS p(company_id, period_id)
+            ),
+            totals AS (
+                SELECT p.company_id,
+                       {aggregate_columns(source, keys)}
+                FROM chosen p
+                LEFT JOIN {table} r
+                    ON r.company_id = p.company_id AND r.period_id = p.period_id
+                    AND r.company_id = ANY(%(company_ids)s) AND {_row_filter(keys, source)}
+                GROUP BY p.company_id
+            )
+            SELECT c.company_id, c.name,
+                   {metric_columns}
+            FROM companies c
+            LEFT JOIN totals t ON t.company_id = c.company_id
+            WHERE c.company_id = ANY(%(requested_ids)s)
+            ORDER BY c.company_id;
+            """
+
+
+@lru_cache(maxsize=256)
+def compile_series(specs: tuple[MetricSpec, ...], source: str = "account_details") -> str:
+    """
+    Compileert één SQL-statement dat de gevraagde metrics voor één bedrijf over meerdere
+    jaren berekent: één rij per jaar met een periode, gesorteerd op jaar.
+
+    Parameters in de query: company_id en die van utils.period_series_params.
+    """
+    table = ROLLUP_TABLE if source == "rollup" else "account_details"
+    keys = set().union(*(spec.formula.keys for spec in specs))
+    metric_columns = ",\n                   ".join(
+        f'{spec.formula.sql("t")} AS "{spec.name}"' for spec in specs
+    )
+    return f"""WITH chosen AS (
+                {period_series_sql()}
+            ),
+            totals AS (
+                SELECT p.year,
+                       {aggregate_columns(source, keys)}
+                FROM chosen p
+                LEFT JOIN {table} r
+                    ON r.company_id = %(company_id)s AND r.period_id = p.period_id
+                    AND {_row_filter(keys, source)}
+                GROUP BY p.year
+            )
+            SELECT t.year,
+                   {metric_columns}
+            FROM totals t
+            ORDER BY t.year;
+            """
@@ -0,0 +1,90 @@
+"""
+Onderhoud van account_prefix_rollup, de samenvatting van account_details per
+(company_id, period_id, prefix van twee cijfers). Rekeningnummers van één teken krijgen
+een prefix van één teken, zodat de rollup dezelfde totalen geeft als de ruwe rijen. De
+tabel en de triggers die hem incrementeel bijwerken staan in migrations/0001 en 0005.
+
+    python -m calculator.rollup build                       # volledige herberekening
+    python -m calculator.rollup refresh --company 12 --period 3456
+"""
+import argparse
+
+import streamlit as st
+
+from utils import get_db_connection
+
+ROLLUP_TABLE = "account_prefix_rollup"
+
+_AGGREGATE_SELECT = """
+    SELECT
+        company_id,
+        period_id,
+        COALESCE(LEFT(account_number, 2), '') AS prefix2,
+        SUM(COALESCE(value, 0)) AS value,
+        COALESCE(SUM(value) FILTER (WHERE account_type = 'asset'), 0) AS asset_value,
+        COUNT(*) AS row_count
+    FROM account_details
+    {where}
+    GROUP BY 1, 2, 3
+"""
+
+
+def use_rollup() -> bool:
+    """True als de calculator uit de rollup moet lezen in plaats van uit account_details."""
+    return st.secrets.get("CALCULATOR_SOURCE", "account_details") == "rollup"
+
+
+def build_rollup() -> int:
+    """Herbouwt de volledige rollup uit account_details en geeft het aantal rollup-rijen terug."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # Block concurrent writers so the triggers cannot apply deltas on top of a
+            # rollup that is being rebuilt.
+            cursor.execute("LOCK TABLE account_details IN SHARE MODE")
+            cursor.execute(f"TRUNCATE {ROLLUP_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_TABLE} (company_id, period_id, prefix2, value, asset_value, row_count)"
+                + _AGGREGATE_SELECT.format(where="")
+            )
+            rows = cursor.rowcount
+            cursor.execute(f"ANALYZE {ROLLUP_TABLE}")
+    return rows
+
+
+def refresh_rollup(pairs: list[tuple[int, int]]) -> int:
+    """
+    Herberekent de rollup voor de gegeven (company_id, period_id) paren uit de ruwe rijen.
+
+    De triggers houden de rollup normaal zelf bij; dit is voor herstel, bv. na een bulk load
+    met uitgeschakelde triggers.
+    """
+    if not pairs:
+        return 0
+    company_ids = [int(company_id) for company_id, _ in pairs]
+    period_ids = [int(period_id) for _, period_id in pairs]
+    scope = "(company_id, period_id) IN (SELECT * FROM UNNEST(%(company_ids)s::int[], %(period_ids)s::int[]))"
+    params = {"company_ids": company_ids, "period_ids": period_ids}
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE {scope}", params)
+            cursor.execute(
+                f"INSERT INTO {ROLLUP_TABLE} (company_id, period_id, prefix2, value, asset_value, row_count)"
+                + _AGGREGATE_SELECT.format(where=f"WHERE {scope}"),
+                params,
+            )
+            return cursor.rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="herbouw de volledige rollup")
+    refresh = commands.add_parser("refresh", help="herbereken één bedrijf en periode")
+    refresh.add_argument("--company", type=int, required=True)
+    refresh.add_argument("--period", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"{build_rollup()} rollup-rijen opgebouwd")
+    else:
+        print(f"{refresh_rollup([(args.company, args.period)])} rollup-rijen herberekend")
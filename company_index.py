@@ -0,0 +1,138 @@
+"""
+In-memory fuzzy search over company names, used by tools.companies_ids_api_call.
+
+Names are normalized (accents, case and punctuation removed) and split into padded
+trigrams like pg_trgm does. Every trigram has a posting array of the companies whose name
+contains it, so a lookup only touches the postings of the query's trigrams and never the
+database. The score is the trigram similarity between keyword and name, raised for names
+that contain the keyword literally, so exact substrings (the old behaviour) still rank
+first and typos still find a match.
+
+The index is built on first use and rebuilt after the companies_changed trigger
+(migrations/0004_companies_notify.sql) reports a change.
+"""
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from utils import get_db_connection, get_notification_listener
+
+MIN_SCORE = 0.3
+TOP_K = 10
+# Rebuild anyway after this long when the LISTEN connection is down.
+REFRESH_AFTER = 300
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    grams = set()
+    for token in normalize(text).split():
+        padded = f"  {token} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CompanyIndex:
+    def __init__(self, companies: list[tuple[int, str]]):
+        self.company_ids = np.array([company_id for company_id, _ in companies], dtype=np.int64)
+        self.names = [name for _, name in companies]
+        self._normalized = [f" {normalize(name)} " for name in self.names]
+        postings: dict[str, list[int]] = {}
+        sizes = np.zeros(len(companies), dtype=np.float32)
+        for position, name in enumerate(self.names):
+            grams = trigrams(name)
+            sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self._postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+        self._sizes = sizes
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _containment_candidates(self, needle: str):
+        """Positions whose name can contain `needle`: those with all of its inner trigrams."""
+        if not needle:
+            return []
+        required = {token[i : i + 3] for token in needle.split() for i in range(len(token) - 2)}
+        if not required:
+            return range(len(self))
+        if any(gram not in self._postings for gram in required):
+            return []
+        counts = np.bincount(np.concatenate([self._postings[gram] for gram in required]), minlength=len(self))
+        return np.flatnonzero(counts == len(required))
+
+    def _scores(self, keyword: str) -> np.ndarray:
+        query = trigrams(keyword)
+        scores = np.zeros(len(self), dtype=np.float32)
+        if not query:
+            return scores
+        hits = [self._postings[gram] for gram in query if gram in self._postings]
+        if hits:
+            shared = np.bincount(np.concatenate(hits), minlength=len(self)).astype(np.float32)
+            scores = shared / (len(query) + self._sizes - shared)
+        needle = normalize(keyword)
+        contained = [i for i in self._containment_candidates(needle) if needle in self._normalized[i]]
+        if contained:
+            scores[contained] = 0.5 + 0.5 * scores[contained]
+        return scores
+
+    def search(self, keywords: list[str], top_k: int = TOP_K, min_score: float = MIN_SCORE):
+        """The best matches as (company_id, name, score), a company scoring on its best keyword."""
+        if not len(self) or not keywords:
+            return []
+        scores = np.max([self._scores(keyword) for keyword in keywords], axis=0)
+        candidates = np.flatnonzero(scores >= min_score)
+        best = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+        return [(int(self.company_ids[i]), self.names[i], round(float(scores[i]), 3)) for i in best]
+
+
+_index: CompanyIndex | None = None
+_stale = True
+_lock = threading.Lock()
+_subscribed = False
+
+
+def _on_companies_changed(payload: str | None):
+    global _stale
+    if payload is not None or _index is None or time.monotonic() - _index.built_at > REFRESH_AFTER:
+        _stale = True
+
+
+def _load_companies() -> list[tuple[int, str]]:
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT company_id, name FROM companies WHERE name IS NOT NULL ORDER BY company_id")
+            return cursor.fetchall()
+
+
+def get_company_index() -> CompanyIndex:
+    global _index, _stale, _subscribed
+    listener = get_notification_listener()
+    if not _subscribed:
+        listener.subscribe("companies_changed", _on_companies_changed)
+        _subscribed = True
+    listener.poll()
+    if _stale or _index is None:
+        with _lock:
+            if _stale or _index is None:
+                # Cleared before loading so a change during the load triggers another rebuild.
+                _stale = False
+                try:
+                    _index = CompanyIndex(_load_companies())
+                except Exception:
+                    # The old index is still out of date; try again on the next lookup.
+                    _stale = True
+                    raise
+    return _index
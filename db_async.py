@@ -0,0 +1,121 @@
+"""
+Async counterpart of db_pool: one background event loop per process that owns a
+psycopg 3 AsyncConnectionPool.
+
+Streamlit runs every script on its own thread without an event loop, and an asyncio pool
+is bound to the loop it was opened on, so all async database work happens on the "DB
+loop" thread started here. The agent runs its tool calls on that loop too, which lets
+independent calls (three companies, three `bereken` calls) wait on Postgres at the same
+time instead of one after the other. Sync code reaches the loop through `run_sync` and
+`iterate_sync`; coroutines running on another loop go through `on_db_loop`.
+"""
+import asyncio
+import atexit
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+from psycopg_pool import AsyncConnectionPool
+
+from query_metrics import current_tool, observe_statement, operation, registry, row_bytes
+
+T = TypeVar("T")
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide DB loop, started on a daemon thread on first use."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="db-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _on_loop_thread() -> bool:
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Runs `coro` on the DB loop and blocks the calling thread until it is done."""
+    if _on_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync would block the DB loop; await the coroutine instead.")
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+async def on_db_loop(coro: Awaitable[T]) -> T:
+    """Awaits `coro` on the DB loop, also when the caller runs on another event loop."""
+    if _on_loop_thread():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_loop()))
+
+
+def iterate_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """Drives an async generator living on the DB loop from a sync thread, e.g. for st.write_stream."""
+
+    async def next_item():
+        return await agen.__anext__()
+
+    while True:
+        try:
+            yield run_sync(next_item())
+        except StopAsyncIteration:
+            return
+
+
+_pool: AsyncConnectionPool | None = None
+_pool_lock: asyncio.Lock | None = None
+
+
+async def get_async_pool(factory: Callable[[], Awaitable[AsyncConnectionPool]]) -> AsyncConnectionPool:
+    """Return the process-wide async pool, opening it with `await factory()` on first use."""
+    global _pool, _pool_lock
+    if not _on_loop_thread():
+        return await on_db_loop(get_async_pool(factory))
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await factory()
+                atexit.register(close_async_pool)
+    return _pool
+
+
+def close_async_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None and _loop is not None and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(pool.close(), _loop).result(timeout=5)
+
+
+async def fetch(pool_factory, sql: str, params=None):
+    """Runs one statement on a pooled connection and returns (description, rows)."""
+    tool = current_tool.get()
+
+    async def run():
+        pool = await get_async_pool(pool_factory)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                started = time.perf_counter()
+                try:
+                    await cursor.execute(sql, params)
+                except Exception:
+                    observe_statement(sql, params, started, failed=True, tool=tool)
+                    raise
+                observe_statement(sql, params, started, tool=tool)
+                started = time.perf_counter()
+                rows = await cursor.fetchall() if cursor.description else []
+                registry.record_fetch(tool, operation(sql), time.perf_counter() - started, len(rows), row_bytes(rows))
+                return cursor.description, rows
+
+    return await on_db_loop(run())
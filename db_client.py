@@ -3,27 +3,37 @@ from openai import OpenAI
 #Create connection with vectorDB(Milvus)
 from pymilvus import MilvusClient
 from tqdm import tqdm
+import itertools
 import json
+import logging
 import streamlit as st
 
+from embeddings import MODEL, Embedder, EmbeddingCache
+from ingest import CHUNK_SIZE, ingest
+from local_vector_index import LocalVectorClient
+from query_embeddings import embed_query
+
+logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = st.secrets['OPENAI_API_KEY']
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 
+@st.cache_resource
+def get_embedder(dimensions: int | None = None) -> Embedder:
+    cache = EmbeddingCache(st.secrets.get("EMBEDDING_CACHE", ".cache/embeddings.sqlite"))
+    return Embedder(openai_client, dimensions=dimensions, cache=cache)
+
+
 def emb_text(text):
-    return (
-        openai_client.embeddings.create(input=text, model="text-embedding-3-small")
-        .data[0]
-        .embedding
-    )
+    return get_embedder().embed_one(text)
 
 def emb_text_d756(text):
-    return (
-        openai_client.embeddings.create(input=text, model="text-embedding-3-small", dimensions=756)
-        .data[0]
-        .embedding
-    )
+    return get_embedder(756).embed_one(text)
+
+def emb_texts(texts, dimensions=None):
+    """Embeds many texts with batched, concurrent requests; cached texts cost nothing."""
+    return get_embedder(dimensions).embed(list(texts))
 
 @st.cache_resource
 def get_cloud_client():
@@ -41,6 +51,14 @@ def get_db_client():
     milvus_client = MilvusClient(uri="http://localhost:19530")
     return milvus_client
 
+@st.cache_resource
+def get_local_client():
+    """In-process replacement for the Milvus clients, see local_vector_index."""
+    return LocalVectorClient(
+        st.secrets.get("LOCAL_VECTOR_PATH", ".cache/vectors"),
+        mode=st.secrets.get("LOCAL_VECTOR_MODE", "exact"),
+    )
+
 @st.cache_resource
 def create_new_db_client(collection_name):
     milvus_client = MilvusClient(uri="http://localhost:19530")
@@ -61,7 +79,7 @@ def get_query_embeddings(client,question, collection_name):
     search_res = client.search(
         collection_name=collection_name,
         data=[
-            emb_text_d756(question)
+            embed_query(question, MODEL, 756, emb_text_d756)
         ],  # Use the `emb_text` function to convert the question to an embedding vector
         limit=10,  # Return top 3 results
         search_params={"metric_type": "COSINE", "params": {}},  # Inner product distance
@@ -70,10 +88,23 @@ def get_query_embeddings(client,question, collection_name):
     retrieved_lines_with_distances = [(res["entity"]["text"]) for res in search_res[0]]
     return retrieved_lines_with_distances
 
-def insert_embeddings(client, embeddings, collection_name):
-    data = []
+def insert_embeddings(client, embeddings, collection_name, checkpoint_path=None):
+    """
+    Upserts (text, vector) pairs in chunks with ids derived from the text, see ingest.ingest.
+    `embeddings` may be any iterable, e.g. the generator of embed_stream.
+    """
+    stats = ingest(client, tqdm(embeddings, desc="Inserting embeddings"), collection_name, checkpoint_path=checkpoint_path)
+    logger.info("Inserted embeddings into %s: %s", collection_name, stats.as_dict())
+    return stats
+
+
+def embed_stream(lines, dimensions=756, chunk_size=CHUNK_SIZE):
+    """Yields (text, vector) pairs, embedding `lines` one chunk at a time."""
+    lines = iter(lines)
+    while chunk := list(itertools.islice(lines, chunk_size)):
+        yield from zip(chunk, emb_texts(chunk, dimensions))
 
-    for i,line in enumerate(tqdm(embeddings, desc="Creating embeddings")):
-        data.append({"id": i, "vector": line[1], "text": line[0]})
-    client.insert(collection_name=collection_name, data=data)
 
+def embed_and_insert(client, lines, collection_name, dimensions=756, checkpoint_path=None):
+    """Embeds and upserts `lines` in bounded chunks, see insert_embeddings."""
+    return insert_embeddings(client, embed_stream(lines, dimensions), collection_name, checkpoint_path)
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationListener:
+    """
+    Delivers Postgres NOTIFY messages to in-process caches.
+
+    Keeps one dedicated autocommit connection that LISTENs on the subscribed channels.
+    `poll()` only reads what already arrived on the socket, so caches can call it on every
+    lookup without a database round trip. When the connection is lost the listener cannot
+    know what it missed, so every subscriber is called with `None` ("assume everything
+    changed") once when the loss is noticed and once more after the reconnect; in between
+    the caches rely on their TTL. A reconnect, tried every `retry_after` seconds, blocks
+    the caller for at most `connect_timeout` seconds.
+    """
+
+    def __init__(
+        self, connect_kwargs: dict, connect=psycopg2.connect, retry_after: float = 30.0, connect_timeout: int = 5
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.retry_after = retry_after
+        self.connect_timeout = connect_timeout
+        self._connect = connect
+        self._conn = None
+        self._retry_at = 0.0
+        self._lost = False
+        self._callbacks: dict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[str | None], None]):
+        with self._lock:
+            self._callbacks[channel].append(callback)
+            if self._conn is not None:
+                self._listen(self._conn, [channel])
+
+    def _listen(self, conn, channels):
+        with conn.cursor() as cursor:
+            for channel in channels:
+                cursor.execute(f'LISTEN "{channel}"')
+
+    def _ensure_connection(self):
+        if self._conn is not None and not self._conn.closed:
+            return self._conn
+        conn = self._connect(**{"connect_timeout": self.connect_timeout, **self.connect_kwargs})
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        self._listen(conn, list(self._callbacks))
+        self._conn = conn
+        return conn
+
+    def _broadcast(self, payload_by_channel: dict[str, list[str | None]]):
+        for channel, payloads in payload_by_channel.items():
+            for callback in self._callbacks.get(channel, []):
+                for payload in payloads:
+                    try:
+                        callback(payload)
+                    except Exception:
+                        logger.exception("Notification callback for %s failed", channel)
+
+    def poll(self):
+        with self._lock:
+            if not self._callbacks:
+                return
+            received = defaultdict(list)
+            disconnected = {channel: [None] for channel in self._callbacks}
+            if self._conn is None and time.monotonic() < self._retry_at:
+                return
+            try:
+                reconnecting = self._conn is None and self._lost
+                conn = self._ensure_connection()
+                if reconnecting:
+                    # Whatever was sent while the connection was down is lost.
+                    self._lost = False
+                    received.update(disconnected)
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    received[notify.channel].append(notify.payload or None)
+            except psycopg2.Error:
+                if self._lost:
+                    # Failed reconnects do not invalidate again.
+                    logger.info("Could not reconnect the LISTEN connection, retrying in %.0fs", self.retry_after)
+                    received = {}
+                else:
+                    logger.warning("Lost the LISTEN connection, invalidating subscribers", exc_info=True)
+                    received = disconnected
+                    self._lost = True
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = None
+                self._retry_at = time.monotonic() + self.retry_after
+            self._broadcast(received)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
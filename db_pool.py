@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+@dataclass
+class PoolStats:
+    size: int = 0
+    idle: int = 0
+    in_use: int = 0
+    checkouts: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    created: int = 0
+    recycled: int = 0
+    failed_health_checks: int = 0
+
+    @property
+    def wait_seconds_mean(self) -> float:
+        return self.wait_seconds_total / self.checkouts if self.checkouts else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "wait_seconds_mean": self.wait_seconds_mean}
+
+
+class _Slot:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool shared by every Streamlit session in the process.
+
+    Idle connections are handed out LIFO so the hottest ones stay warm, are pinged when
+    they have been idle longer than `health_check_after` and are closed once they exceed
+    `max_idle` (down to `min_size`) or `max_lifetime`. Callers that find the pool at
+    `max_size` block for up to `timeout` seconds; the time spent waiting is recorded in
+    `stats()` so the pool can be sized for concurrent sessions.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: dict,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        health_check_after: float = 30.0,
+        connect=psycopg2.connect,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Expected 0 <= min_size <= max_size and max_size >= 1.")
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._idle: deque[_Slot] = deque()
+        self._in_use: dict[int, _Slot] = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = PoolStats()
+
+    def _open(self) -> _Slot:
+        conn = self._connect(**self.connect_kwargs)
+        with self._cond:
+            self._stats.created += 1
+        return _Slot(conn)
+
+    def _discard(self, slot: _Slot):
+        # Caller holds the lock; closing a socket is cheap enough to do inline.
+        self._size -= 1
+        try:
+            slot.conn.close()
+        except Exception:
+            pass
+        self._cond.notify()
+
+    def _recycle_idle(self, now: float):
+        keep = deque()
+        while self._idle:
+            slot = self._idle.popleft()
+            too_old = now - slot.created_at > self.max_lifetime
+            too_idle = (
+                now - slot.last_used > self.max_idle
+                and self._size > self.min_size
+            )
+            if too_old or too_idle:
+                self._stats.recycled += 1
+                self._discard(slot)
+            else:
+                keep.append(slot)
+        self._idle = keep
+
+    def _is_alive(self, slot: _Slot, now: float) -> bool:
+        if slot.conn.closed:
+            return False
+        if now - slot.last_used < self.health_check_after:
+            return True
+        try:
+            with slot.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            slot.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def fill(self):
+        """Open connections until the pool holds at least `min_size` of them."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                slot = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            slot = None
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError("De connection pool is gesloten.")
+                now = time.monotonic()
+                self._recycle_idle(now)
+                if self._idle:
+                    slot = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Geen vrije databaseverbinding binnen {self.timeout}s "
+                            f"(max_size={self.max_size})."
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            if slot is None:
+                try:
+                    slot = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_alive(slot, time.monotonic()):
+                with self._cond:
+                    self._stats.failed_health_checks += 1
+                    self._discard(slot)
+                continue
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self._in_use[id(slot.conn)] = slot
+                self._stats.checkouts += 1
+                self._stats.waits += waited
+                self._stats.wait_seconds_total += wait
+                self._stats.wait_seconds_max = max(self._stats.wait_seconds_max, wait)
+            if waited:
+                logger.info("Waited %.3fs for a pooled connection", wait)
+            return slot.conn
+
+    def putconn(self, conn: psycopg2.extensions.connection, discard: bool = False):
+        with self._cond:
+            slot = self._in_use.pop(id(conn), None)
+            if slot is None:
+                raise ValueError("Deze verbinding hoort niet bij de pool.")
+            if not discard and not conn.closed and not self._closed:
+                try:
+                    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or conn.closed or self._closed:
+                self._discard(slot)
+                return
+            slot.last_used = time.monotonic()
+            self._idle.append(slot)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a `with` block.
+
+        Mirrors `with psycopg2.connect(...) as conn`: the transaction is committed when the
+        block succeeds and rolled back when it raises, after which the connection goes back
+        to the pool instead of lingering open.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            with conn:
+                yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard or conn.closed)
+
+    def stats(self) -> PoolStats:
+        with self._cond:
+            stats = PoolStats(**asdict(self._stats))
+            stats.size = self._size
+            stats.idle = len(self._idle)
+            stats.in_use = len(self._in_use)
+            return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(factory) -> ConnectionPool:
+    """Return the process-wide pool, creating it with `factory()` on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = factory()
+    return _pool
+
+
+def configure_pool(pool: ConnectionPool | None):
+    """Swap the process-wide pool, e.g. to point scripts and benchmarks at another database."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+    if old is not None:
+        old.close()
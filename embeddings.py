@@ -0,0 +1,134 @@
+"""
+Batched, concurrent and cached text embeddings.
+
+`Embedder.embed` takes any number of texts and returns their vectors in input order. Texts
+already in the `EmbeddingCache` are not sent again; the rest is deduplicated, grouped into
+requests of at most `max_batch_size` inputs and roughly `max_batch_tokens` tokens (the
+OpenAI limits), and those requests run `max_workers` at a time. The client is anything
+with the `embeddings.create(input=..., model=..., dimensions=...)` method of the OpenAI
+SDK, so a local fake can stand in for it (see benchmarks/embeddings.py). Retries on rate
+limits and connection errors are left to the SDK client.
+"""
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+MODEL = "text-embedding-3-small"
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 250_000
+MAX_WORKERS = 4
+
+
+def _estimated_tokens(text: str) -> int:
+    # Dutch text averages about four characters per token; three keeps a safety margin.
+    return len(text) // 3 + 1
+
+
+class EmbeddingCache:
+    """Vectors on disk in SQLite, keyed by a hash of model, dimensions and text."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, dimensions: int | None, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{dimensions or ''}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            # SQLite allows at most 999 bound parameters in older builds.
+            for start in range(0, len(keys), 900):
+                chunk = keys[start : start + 900]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update((key, np.frombuffer(vector, dtype=np.float32).tolist()) for key, vector in rows)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class Embedder:
+    def __init__(
+        self,
+        client,
+        model: str = MODEL,
+        dimensions: int | None = None,
+        cache: EmbeddingCache | None = None,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_workers = max_workers
+        self.requests = 0
+
+    def batches(self, texts: list[str]) -> list[list[str]]:
+        batches, batch, tokens = [], [], 0
+        for text in texts:
+            estimate = _estimated_tokens(text)
+            if batch and (len(batch) >= self.max_batch_size or tokens + estimate > self.max_batch_tokens):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += estimate
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, batch: list[str]) -> list[list[float]]:
+        kwargs = {"input": batch, "model": self.model}
+        if self.dimensions is not None:
+            kwargs["dimensions"] = self.dimensions
+        response = self.client.embeddings.create(**kwargs)
+        self.requests += 1
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        unique = list(dict.fromkeys(texts))
+        keys = {text: EmbeddingCache.key(self.model, self.dimensions, text) for text in unique}
+        cached = self.cache.get_many(list(keys.values())) if self.cache is not None else {}
+        vectors = {text: cached[key] for text, key in keys.items() if key in cached}
+
+        missing = [text for text in unique if text not in vectors]
+        batches = self.batches(missing)
+        if len(batches) <= 1 or self.max_workers == 1:
+            results = map(self._request, batches)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                results = list(executor.map(self._request, batches))
+        for batch, batch_vectors in zip(batches, results):
+            fresh = dict(zip(batch, batch_vectors))
+            vectors.update(fresh)
+            if self.cache is not None:
+                self.cache.put_many({keys[text]: vector for text, vector in fresh.items()})
+        return [vectors[text] for text in texts]
+
+    def embed_one(self, text: str) -> list[float]:
+        return self.embed([text])[0]
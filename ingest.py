@@ -0,0 +1,129 @@
+"""
+Streaming ingest of (text, vector) pairs into a Milvus collection.
+
+`ingest` reads the pairs lazily and upserts them in chunks of `chunk_size`, so memory stays
+bounded by one chunk whatever the size of the corpus. Ids are derived from the text, so
+ingesting the same corpus again overwrites rows instead of duplicating them. After every
+chunk the position is written to a checkpoint file; a rerun with the same input and
+checkpoint skips the chunks that already made it. Skipped chunks are still read from the
+iterator (they are not embedded again when the embeddings come from the cached Embedder).
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+RETRIES = 3
+
+
+def content_id(text: str) -> int:
+    """Stable positive int64 id for a text, usable as Milvus primary key."""
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    duplicates: int = 0
+    chunks: int = 0
+    skipped_chunks: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic, repr=False)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        stats = asdict(self)
+        stats.pop("started_at")
+        stats["rows_per_second"] = round(self.rows_per_second, 1)
+        return stats
+
+
+class Checkpoint:
+    def __init__(self, path: str | Path, collection_name: str):
+        self.path = Path(path)
+        self.collection_name = collection_name
+
+    def load(self, chunk_size: int) -> int:
+        """Number of chunks already ingested into this collection with this chunk size."""
+        try:
+            state = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return 0
+        # Anything else can not be mapped onto the input; starting over is safe with upserts.
+        if state.get("collection") != self.collection_name or state.get("chunk_size") != chunk_size:
+            return 0
+        return int(state.get("chunks_done", 0))
+
+    def save(self, chunks_done: int, chunk_size: int):
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(
+            json.dumps({"collection": self.collection_name, "chunks_done": chunks_done, "chunk_size": chunk_size})
+        )
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def _chunks(items: Iterable, size: int):
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _upsert(client, collection_name: str, data: list[dict], stats: IngestStats):
+    for attempt in range(RETRIES):
+        try:
+            return client.upsert(collection_name=collection_name, data=data)
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            stats.retries += 1
+            logger.warning("Upsert into %s failed, retrying", collection_name, exc_info=True)
+            time.sleep(2**attempt)
+
+
+def ingest(
+    client,
+    items: Iterable[tuple[str, list[float]]],
+    collection_name: str,
+    chunk_size: int = CHUNK_SIZE,
+    checkpoint_path: str | Path | None = None,
+) -> IngestStats:
+    """Upserts (text, vector) pairs chunk by chunk and returns the throughput statistics."""
+    checkpoint = Checkpoint(checkpoint_path, collection_name) if checkpoint_path else None
+    done = checkpoint.load(chunk_size) if checkpoint else 0
+    stats = IngestStats()
+    for number, chunk in enumerate(_chunks(items, chunk_size)):
+        if number < done:
+            stats.skipped_chunks += 1
+            continue
+        # A text that occurs twice in one chunk would put its id twice into the same upsert.
+        rows = {content_id(text): {"id": content_id(text), "vector": vector, "text": text} for text, vector in chunk}
+        data = list(rows.values())
+        stats.duplicates += len(chunk) - len(data)
+        _upsert(client, collection_name, data, stats)
+        stats.rows += len(data)
+        stats.chunks += 1
+        stats.seconds = time.monotonic() - stats.started_at
+        if checkpoint:
+            checkpoint.save(number + 1, chunk_size)
+        logger.info(
+            "%s: %d rows in %d chunks, %.0f rows/s", collection_name, stats.rows, stats.chunks, stats.rows_per_second
+        )
+    if checkpoint:
+        checkpoint.clear()
+    stats.seconds = time.monotonic() - stats.started_at
+    return stats
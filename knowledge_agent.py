@@ -0,0 +1,331 @@
+"""
+The chatbot's agent stack: the RAG index, the LLM, the tools and the agent itself.
+
+streamlit_test.py imports this module only when the Chatbot section is rendered, so the
+login form and the other sections never pay for llama-index, the OpenAI clients or the
+vector store. Everything expensive is built on first use behind st.cache_resource and
+shared by all sessions: the HTTP connection pool to OpenAI, the LLMs, and the tools with
+their function specs. A session only holds an AgentShell with its conversation memory.
+"""
+import copy
+import dataclasses
+
+import httpx
+import streamlit as st
+from llama_index.agent.openai import OpenAIAgent
+from llama_index.core import VectorStoreIndex
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.memory.chat_memory_buffer import ChatMemoryBuffer
+from llama_index.core.tools import FunctionTool, QueryEngineTool, ToolMetadata
+from llama_index.embeddings.openai import (
+    OpenAIEmbeddingMode,
+    OpenAIEmbeddingModelType,
+)
+from llama_index.llms.openai import OpenAI
+from llama_index.vector_stores.postgres import PGVectorStore
+
+from answer_cache import AnswerCache
+from bot_queries.queries import voorafbetaling
+from calculator.calculator import (
+    abereken,
+    abereken_many,
+    abereken_reeks,
+    aload_data,
+    avergelijk_op_basis_van,
+    bereken,
+    bereken_many,
+    bereken_reeks,
+    capture_data,
+    load_data,
+    pending_data,
+    publish_data,
+    vergelijk_op_basis_van,
+)
+from db_async import iterate_sync, run_sync
+from query_embeddings import CachedOpenAIEmbedding
+from query_metrics import tagged
+from tools import (
+    add,
+    companies_ids_api_call,
+    company_api_call,
+    get_date,
+    has_tax_decreased_api_call,
+    multiply,
+    period_id_fetcher,
+    reconciliation_api_call,
+)
+from utils import get_db_connection
+
+# Bump after re-ingesting the RAG documents so cached answers from the old corpus are not served.
+RAG_DATA_VERSION = str(st.secrets.get("RAG_DATA_VERSION", "1"))
+
+system_prompt = """
+Je bent een vertrouwde financiële expert in België die mensen helpt met perfect advies. Het is jouw taak om een feitelijk en volledig antwoord te geven op de gestelde vraag op basis van de informatie die je verkrijgt via de beschikbare tools.
+
+**Belangrijke richtlijnen:**
+
+- **Gebruik altijd de tool 'Financiele_informatie' om informatie op te halen voor elke vraag.** Baseer je antwoorden uitsluitend op informatie uit deze tool.
+
+- ALS DE VRAAG BETREKKING HEEFT OP SPECIFIEKE CODES, VAKKEN OF FINANCIELE TOOLS, LEG DAN DE FOCUS OP HET UITLEGGEN VAN DIE CODES!!!
+
+- Geef voldoende informatie, maak je antwoord dus wat langer.
+
+- **Vermijd het gebruik van zinnen zoals "volgens de passage" of "volgens de context" in je antwoord.**
+
+- Maak je antwoord overzichtelijk, gebruik opsommingstekens indien nodig, en zorg voor een duidelijke structuur.
+
+- **Geef voldoende en nauwkeurige informatie** om de vraag volledig te beantwoorden.
+
+- Schrijf in helder en professioneel Nederlands, met de juiste terminologie.
+
+- Het is goed om te weten dat dossiers en bedrijven hetzelfde worden gezien in de database functies. Dus als iemand vraagt achter een dossier met een naam dan gaat het eigenlijk over een bedrijf. Een dossier is een company in de database
+
+- Voer een calculatie altijd uit als het gevraagd is. 
+
+- Zeg nooit, "Ik ga dit uitrekenen" zonder het ook echt te doen"""
+
+description = """
+'Financiele_informatie' is een uitgebreide RAG-database die diepgaande informatie bevat over:
+
+- **Belgische belastingen en financiële wetgevingen**
+- **Fiscale codes en relevante vakken**
+- **Software en programma's die in de financiële sector worden gebruikt (zoals Excel)**
+- **Best practices en tools voor financiële professionals**
+
+Gebruik deze tool altijd om:
+
+- **Algemene en specifieke financiële vragen** te beantwoorden.
+- **Informatie over belastingcodes, vakken en financiële software** te verstrekken.
+- **Actuele wetgevingen, regelgeving en technologische ontwikkelingen** te raadplegen binnen de financiële sector.
+
+**Belangrijk:** Baseer al je antwoorden uitsluitend op de informatie die je via deze tool verkrijgt. Voeg geen externe informatie toe, zelfs niet als je deze kent.
+"""
+
+
+@st.cache_resource
+def get_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    # One keep-alive pool to api.openai.com for every session instead of a client per LLM.
+    # The async client is only used on the DB loop (db_async), the one loop it may be bound to.
+    limits = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+    timeout = httpx.Timeout(120.0, connect=10.0)
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+@st.cache_resource
+def get_llm(system_prompt: str | None = None) -> OpenAI:
+    http_client, async_http_client = get_http_clients()
+    return OpenAI(
+        model="gpt-4o",
+        temperature=0,
+        system_prompt=system_prompt,
+        http_client=http_client,
+        async_http_client=async_http_client,
+    )
+
+
+@st.cache_resource
+def create_db_connection():
+    cloud_aws_vector_store = PGVectorStore.from_params(
+        database=st.secrets["db_name"],
+        host=st.secrets["db_host"],
+        password=st.secrets["db_pwd"],
+        port=st.secrets["db_port"],
+        user=st.secrets["db_user"],
+        table_name=st.secrets["db_table_name"],
+        embed_dim=756,  # openai embedding dimension
+    )
+    return cloud_aws_vector_store
+
+
+@st.cache_resource
+def get_embed_model():
+    http_client, async_http_client = get_http_clients()
+    return CachedOpenAIEmbedding(
+        mode=OpenAIEmbeddingMode.SIMILARITY_MODE,
+        model=OpenAIEmbeddingModelType.TEXT_EMBED_3_SMALL,
+        dimensions=756,
+        http_client=http_client,
+        async_http_client=async_http_client,
+    )
+
+
+@st.cache_resource
+def vector_store_index():
+    index = VectorStoreIndex.from_vector_store(
+        create_db_connection(),
+        embed_model=get_embed_model(),
+    )
+    return index
+
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(threshold=float(st.secrets.get("ANSWER_CACHE_THRESHOLD", 0.95)))
+
+
+@st.cache_resource
+def get_budget_tool():
+    query_engine = vector_store_index().as_query_engine(llm=get_llm(system_prompt), similarity_top_k=10)
+    return QueryEngineTool.from_defaults(
+        query_engine,
+        name="Financiele_informatie",
+        description=description,
+    )
+
+
+def list_tables():
+    """
+    Geeft een lijst van alle tabellen in het schema.
+    Returns:
+        list: Lijst van tabelnamen in het 'public' schema.
+    """
+    sql = "SELECT table_name FROM information_schema.tables WHERE table_schema='public'"
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            result = cursor.fetchall()
+    return result
+
+
+def describe_tables(table_name: str):
+    """
+    Geeft de kolomnamen en datatypes van de opgegeven tabel.
+    Args:
+        table_name (str): Naam van de tabel om te beschrijven.
+    Returns:
+        list: Lijst van kolomnamen en hun datatypes voor de opgegeven tabel.
+    """
+    sql = f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table_name}'"
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql)
+            result = cursor.fetchall()
+    return result
+
+
+class _PrecomputedMetadata(ToolMetadata):
+    """ToolMetadata that renders its OpenAI function spec once instead of on every LLM call."""
+
+    def to_openai_tool(self, skip_length_check: bool = False) -> dict:
+        spec = self.__dict__.get("_openai_tool")
+        if spec is None:
+            spec = self.__dict__["_openai_tool"] = super().to_openai_tool(skip_length_check=skip_length_check)
+        return copy.deepcopy(spec)
+
+
+def _precompute_metadata(tool):
+    metadata = tool.metadata
+    tool._metadata = _PrecomputedMetadata(**{field.name: getattr(metadata, field.name) for field in dataclasses.fields(metadata)})
+    tool.metadata.to_openai_tool()
+    return tool
+
+
+@st.cache_resource
+def load_tools():
+    """The tool registry: built once per process, schemas and specs included, shared by every session."""
+
+    def tool(fn, async_fn=None):
+        # Tagged so query_metrics records every statement under the tool that issued it.
+        return FunctionTool.from_defaults(fn=tagged(fn), async_fn=async_fn and tagged(async_fn, fn.__name__))
+
+    multiply_tool = tool(multiply)
+    add_tool = tool(add)
+    company_tool = tool(company_api_call)
+    companies_tool = tool(companies_ids_api_call)
+    tarief_tax_tool = tool(has_tax_decreased_api_call)
+    period_tool = tool(period_id_fetcher)
+    # account_tool = tool(account_details)
+    reconciliation_tool = tool(reconciliation_api_call)
+    list_tables_tool = tool(list_tables)
+    describe_tables_tool = tool(describe_tables)
+    # The async variants let the agent run independent database calls concurrently.
+    load_data_tool = tool(load_data, aload_data)
+    vergelijk_op_basis_van_tool = tool(vergelijk_op_basis_van, avergelijk_op_basis_van)
+    bereken_tool = tool(bereken, abereken)
+    bereken_many_tool = tool(bereken_many, abereken_many)
+    bereken_reeks_tool = tool(bereken_reeks, abereken_reeks)
+    get_datum_tool = tool(get_date)
+    voorafbetaling_tool = tool(voorafbetaling)
+    # chart_tool = tool(chart)
+
+    tools = [
+        get_budget_tool(),
+        tarief_tax_tool,
+        companies_tool,
+        period_tool,
+        company_tool,
+        # EBITDA_tool,
+        # list_tables_tool,
+        # describe_tables_tool,
+        load_data_tool,
+        # balanstotaal_tool, eigen_vermogen_tool, handelswerkkapitaal_tool, bruto_marge_tool, omzet_tool, handelsvorderingen_tool, DSO_tool,
+        # voorzieningen_tool, financiele_schuld_tool, liquide_middelen_tool, EBITDA_marge_tool, afschrijvingen_tool, EBIT_tool, netto_financiele_schuld_tool
+        bereken_tool,
+        bereken_many_tool,
+        bereken_reeks_tool,
+        vergelijk_op_basis_van_tool,
+        get_datum_tool,
+        voorafbetaling_tool
+    ]
+    return [_precompute_metadata(tool) for tool in tools]
+
+
+# def chart():
+#     """Creates a chart based on the data. Use this tool when a user requests a chart"""
+#     st.session_state.agent = True
+#     return "Succesfully created chart"
+
+
+class AgentShell:
+    """A session's agent: its conversation memory and nothing else.
+
+    The tools, the LLM and the HTTP clients are process-wide, so starting a session costs
+    one empty memory buffer; the runner around them is assembled per question.
+    """
+
+    def __init__(self):
+        self.memory = ChatMemoryBuffer.from_defaults(llm=get_llm())
+
+    def runner(self) -> OpenAIAgent:
+        return OpenAIAgent.from_tools(
+            load_tools(), verbose=True, llm=get_llm(), system_prompt=system_prompt, memory=self.memory
+        )
+
+    async def astream_chat(self, prompt: str):
+        return await self.runner().astream_chat(prompt)
+
+
+def get_agent() -> AgentShell:
+    if "agent" not in st.session_state:
+        st.session_state.agent = AgentShell()
+    return st.session_state.agent
+
+
+def answer(prompt: str) -> str:
+    """Streams the agent's answer to `prompt`, or a cached answer to a near-identical question."""
+    agent = get_agent()
+    answer_cache = get_answer_cache()
+    vector = get_embed_model().get_query_embedding(prompt)
+    cached = answer_cache.lookup(vector, RAG_DATA_VERSION)
+    if cached is not None:
+        st.markdown(cached.answer)
+        # Keep the agent's memory in step so follow-up questions still have context.
+        agent.memory.put(ChatMessage(role=MessageRole.USER, content=prompt))
+        agent.memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=cached.answer))
+        return cached.answer
+    # Follow-up questions lean on the conversation, so only opening questions are stored.
+    opening_question = sum(message["role"] == "user" for message in st.session_state.messages) <= 1
+    # The chat turn runs on the DB loop so the agent can await its tool calls side by side;
+    # data the tools want to show is published once the answer has been streamed.
+    pending = pending_data()
+
+    async def start_chat():
+        capture_data(pending)
+        return await agent.astream_chat(prompt)
+
+    mess = run_sync(start_chat())
+    response = st.write_stream(iterate_sync(mess.async_response_gen()))
+    publish_data(pending)
+    if opening_question:
+        answer_cache.store(prompt, vector, response, [source.tool_name for source in mess.sources], RAG_DATA_VERSION)
+    return response
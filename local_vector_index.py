@@ -0,0 +1,208 @@
+"""
+In-process vector index with the subset of the MilvusClient API that db_client uses.
+
+Each collection is a directory with the vectors in a memory-mapped float32 file
+(`vectors.f32`, normalized so cosine similarity is a dot product), the ids and texts in
+the append-only `rows.jsonl` (the last line for a position wins) and the sizes in
+`meta.json`, which is written last so an interrupted upsert is simply not visible.
+
+Search is exact by default: one matrix-vector product over the memmap, well under a
+millisecond for a few thousand chunks and tens of milliseconds at 50k. With `mode="hnsw"`
+an hnswlib graph is built in memory on first search and kept up to date on insert, for
+corpora where brute force gets slow; `ef` trades recall for latency. hnswlib is an
+optional dependency. benchmarks/vector_search.py compares both modes, and Milvus.
+
+    client = LocalVectorClient(".cache/vectors")
+    client.create_collection("openai_vectors", dimension=756)
+    ingest(client, pairs, "openai_vectors")
+    get_query_embeddings(client, "Wat is het verlaagd tarief?", "openai_vectors")
+"""
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+
+class LocalVectorIndex:
+    def __init__(self, path: str | Path, dimension: int | None = None, mode: str = "exact", ef: int = 64):
+        if mode not in ("exact", "hnsw"):
+            raise ValueError("mode must be 'exact' or 'hnsw'.")
+        self.path = Path(path)
+        self.mode = mode
+        self.ef = ef
+        self._lock = threading.RLock()
+        self._hnsw = None
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            self.dimension, self.count, self.capacity = meta["dimension"], meta["count"], meta["capacity"]
+            self.ids, self.texts = [None] * self.count, [None] * self.count
+            with open(self.path / "rows.jsonl") as file:
+                for line in file:
+                    row = json.loads(line)
+                    if row["position"] < self.count:
+                        self.ids[row["position"]], self.texts[row["position"]] = row["id"], row["text"]
+        else:
+            if dimension is None:
+                raise ValueError(f"{self.path} does not exist and no dimension was given.")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.dimension, self.count, self.capacity = dimension, 0, 0
+            self.ids, self.texts = [], []
+            (self.path / "rows.jsonl").touch()
+            self._resize(INITIAL_CAPACITY)
+            self._save_meta()
+        self._vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+        self._positions = {row_id: position for position, row_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _resize(self, capacity: int):
+        with open(self.path / "vectors.f32", "ab") as file:
+            file.truncate(capacity * self.dimension * 4)
+        self.capacity = capacity
+        self._vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _save_meta(self):
+        tmp_path = self.path / "meta.json.tmp"
+        tmp_path.write_text(json.dumps({"dimension": self.dimension, "count": self.count, "capacity": self.capacity}))
+        os.replace(tmp_path, self.path / "meta.json")
+
+    def upsert(self, data: list[dict]) -> int:
+        """Adds or replaces rows given as {"id", "vector", "text"}, like MilvusClient.upsert."""
+        if not data:
+            return 0
+        vectors = np.asarray([row["vector"] for row in data], dtype=np.float32)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got {vectors.shape[1]}.")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            positions = []
+            for row in data:
+                position = self._positions.get(row["id"])
+                if position is None:
+                    position = self.count
+                    self._positions[row["id"]] = position
+                    self.ids.append(row["id"])
+                    self.texts.append(row.get("text", ""))
+                    self.count += 1
+                else:
+                    self.texts[position] = row.get("text", "")
+                positions.append(position)
+            if self.count > self.capacity:
+                self._resize(max(self.count, self.capacity * 2))
+            self._vectors[positions] = vectors
+            self._vectors.flush()
+            with open(self.path / "rows.jsonl", "a") as file:
+                for position in dict.fromkeys(positions):
+                    file.write(json.dumps({"position": position, "id": self.ids[position], "text": self.texts[position]}) + "\n")
+            self._save_meta()
+            if self._hnsw is not None:
+                if self.count > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(self.capacity)
+                self._hnsw.add_items(vectors, positions)
+        return len(data)
+
+    def _hnsw_index(self):
+        if self._hnsw is None:
+            try:
+                import hnswlib
+            except ImportError as error:
+                raise ImportError("mode='hnsw' requires the hnswlib package.") from error
+            index = hnswlib.Index(space="ip", dim=self.dimension)
+            index.init_index(max_elements=max(self.capacity, 1), ef_construction=200, M=16)
+            if self.count:
+                index.add_items(self._vectors[: self.count], np.arange(self.count))
+            index.set_ef(self.ef)
+            self._hnsw = index
+        return self._hnsw
+
+    def search(self, queries, limit: int = 10) -> list[list[tuple[int, float]]]:
+        """Per query the `limit` nearest rows as (position, cosine similarity), best first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        with self._lock:
+            limit = min(limit, self.count)
+            if not limit:
+                return [[] for _ in queries]
+            if self.mode == "hnsw":
+                index = self._hnsw_index()
+                index.set_ef(max(self.ef, limit))
+                labels, distances = index.knn_query(queries, k=limit)
+                # hnswlib's "ip" space reports 1 - inner product.
+                return [
+                    [(int(label), float(1 - distance)) for label, distance in zip(row_labels, row_distances)]
+                    for row_labels, row_distances in zip(labels, distances)
+                ]
+            similarities = queries @ self._vectors[: self.count].T
+        results = []
+        for row in similarities:
+            top = np.argpartition(-row, limit - 1)[:limit]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(position), float(row[position])) for position in top])
+        return results
+
+
+class LocalVectorClient:
+    """Drop-in for the MilvusClient calls in db_client and ingest, backed by LocalVectorIndex."""
+
+    def __init__(self, root: str | Path, mode: str = "exact", ef: int = 64):
+        self.root = Path(root)
+        self.mode = mode
+        self.ef = ef
+        self._collections: dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, collection_name: str) -> LocalVectorIndex:
+        with self._lock:
+            if collection_name not in self._collections:
+                if not self.has_collection(collection_name):
+                    raise ValueError(f"Collection {collection_name} does not exist.")
+                self._collections[collection_name] = LocalVectorIndex(self.root / collection_name, mode=self.mode, ef=self.ef)
+            return self._collections[collection_name]
+
+    def has_collection(self, collection_name: str) -> bool:
+        return (self.root / collection_name / "meta.json").exists()
+
+    def create_collection(self, collection_name: str, dimension: int, metric_type: str = "COSINE", **kwargs):
+        if metric_type != "COSINE":
+            raise ValueError("LocalVectorClient only supports the COSINE metric.")
+        with self._lock:
+            self._collections[collection_name] = LocalVectorIndex(
+                self.root / collection_name, dimension=dimension, mode=self.mode, ef=self.ef
+            )
+
+    def drop_collection(self, collection_name: str):
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            shutil.rmtree(self.root / collection_name, ignore_errors=True)
+
+    def upsert(self, collection_name: str, data: list[dict]):
+        return {"upsert_count": self._collection(collection_name).upsert(data)}
+
+    def insert(self, collection_name: str, data: list[dict]):
+        return {"insert_count": self._collection(collection_name).upsert(data)}
+
+    def search(self, collection_name: str, data, limit: int = 10, output_fields=None, search_params=None, **kwargs):
+        index = self._collection(collection_name)
+        fields = output_fields or []
+        results = []
+        for hits in index.search(data, limit):
+            results.append(
+                [
+                    {
+                        "id": index.ids[position],
+                        "distance": similarity,
+                        "entity": {"text": index.texts[position]} if "text" in fields else {},
+                    }
+                    for position, similarity in hits
+                ]
+            )
+        return results
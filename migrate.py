@@ -0,0 +1,54 @@
+"""
+Applies the SQL files in migrations/ that have not run yet, in filename order.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --list     # show applied and pending migrations
+"""
+import argparse
+from pathlib import Path
+
+from utils import get_db_connection
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+
+def _applied(cursor) -> set[str]:
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+               name text PRIMARY KEY,
+               applied_at timestamptz NOT NULL DEFAULT now()
+           )"""
+    )
+    cursor.execute("SELECT name FROM schema_migrations")
+    return {name for (name,) in cursor.fetchall()}
+
+
+def pending_migrations() -> list[Path]:
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            applied = _applied(cursor)
+    return [path for path in sorted(MIGRATIONS_DIR.glob("*.sql")) if path.name not in applied]
+
+
+def migrate() -> list[str]:
+    done = []
+    for path in pending_migrations():
+        # Every migration runs in its own transaction so a failing file leaves no half state.
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(path.read_text())
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (path.name,))
+        done.append(path.name)
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--list", action="store_true", help="toon de migraties zonder ze uit te voeren")
+    args = parser.parse_args()
+    if args.list:
+        for path in pending_migrations():
+            print("pending", path.name)
+    else:
+        for name in migrate():
+            print("applied", name)
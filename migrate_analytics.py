@@ -0,0 +1,70 @@
+"""
+Rewrites the analytics documents in Firestore that still hold the old DataFrame shape.
+
+    python migrate_analytics.py                         # convert every document in new_users
+    python migrate_analytics.py --collection COLLECTION # ... in another collection
+    python migrate_analytics.py --dry-run               # only list the documents to convert
+
+The counters get their native shape (see analytics_writer.counts_from_legacy), counters
+that were only padding are deleted and the document is marked with COUNTS_FORMAT. Each
+document is converted in its own transaction, so a write of the app in between makes the
+conversion start over instead of being overwritten; the chat messages are not touched.
+Running it again skips the documents that are already converted.
+"""
+import argparse
+import json
+
+import streamlit as st
+
+from analytics_writer import COUNTS_FORMAT, counts_from_legacy
+
+
+def get_client():
+    from google.cloud import firestore
+
+    return firestore.Client.from_service_account_info(json.loads(st.secrets["FIRESTORE"]))
+
+
+def _converted(document: dict) -> dict:
+    from google.cloud import firestore
+
+    counts = counts_from_legacy(document)
+    dropped = {key: firestore.DELETE_FIELD for key in document if key not in counts and key != "chat"}
+    # update() replaces each named field as a whole, so no NaN padding survives in the dicts.
+    return {**dropped, **counts, "counts_format": COUNTS_FORMAT}
+
+
+def convert(client, reference, dry_run: bool = False) -> bool:
+    """Converts one document; returns whether it needed converting."""
+    from google.cloud import firestore
+
+    @firestore.transactional
+    def run(transaction) -> bool:
+        snapshot = reference.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        document = snapshot.to_dict()
+        if document.get("counts_format") == COUNTS_FORMAT:
+            return False
+        if not dry_run:
+            transaction.update(reference, _converted(document))
+        return True
+
+    return run(client.transaction())
+
+
+def migrate(client, collection: str = "new_users", dry_run: bool = False) -> list[str]:
+    return [
+        reference.id
+        for reference in client.collection(collection).list_documents()
+        if convert(client, reference, dry_run)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default="new_users", help="de Firestore-collectie met de analytics")
+    parser.add_argument("--dry-run", action="store_true", help="toon de documenten zonder ze te herschrijven")
+    args = parser.parse_args()
+    for user in migrate(get_client(), args.collection, args.dry_run):
+        print("would convert" if args.dry_run else "converted", user)
@@ -0,0 +1,85 @@
+-- Rollup of account_details per (company_id, period_id, two-digit account prefix).
+-- Every calculator metric is a sum over such prefixes, so reading this table instead of
+-- the raw rows turns portfolio-wide aggregations into scans of a much smaller table.
+CREATE TABLE IF NOT EXISTS account_prefix_rollup (
+    company_id integer NOT NULL,
+    period_id integer NOT NULL,
+    prefix2 char(2) NOT NULL,
+    value numeric NOT NULL DEFAULT 0,
+    asset_value numeric NOT NULL DEFAULT 0,
+    row_count integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, period_id, prefix2)
+);
+
+CREATE INDEX IF NOT EXISTS account_prefix_rollup_period_idx
+    ON account_prefix_rollup (period_id, prefix2);
+
+-- Keeps the cleanup of emptied keys in the trigger below from scanning the whole table.
+CREATE INDEX IF NOT EXISTS account_prefix_rollup_empty_idx
+    ON account_prefix_rollup (company_id) WHERE row_count <= 0;
+
+-- Incremental maintenance: statement-level triggers fold the changed rows of a whole
+-- INSERT/UPDATE/DELETE into one delta per rollup key, so bulk syncs stay cheap.
+CREATE OR REPLACE FUNCTION account_prefix_rollup_apply() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    -- A transition table only exists for the operations that declare it, so the source
+    -- of the changed rows is picked per operation and the statement runs dynamically.
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT company_id, period_id, account_number, account_type, value, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT company_id, period_id, account_number, account_type, value, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT company_id, period_id, account_number, account_type, value, 1 AS sign FROM new_rows
+             UNION ALL
+             SELECT company_id, period_id, account_number, account_type, value, -1 AS sign FROM old_rows'
+    END;
+
+    EXECUTE format($sql$
+        WITH changes AS (%s),
+        deltas AS (
+            SELECT
+                company_id,
+                period_id,
+                LEFT(account_number, 2) AS prefix2,
+                SUM(sign * COALESCE(value, 0)) AS value,
+                SUM(sign * COALESCE(value, 0)) FILTER (WHERE account_type = 'asset') AS asset_value,
+                SUM(sign) AS row_count
+            FROM changes
+            WHERE LENGTH(account_number) >= 2
+            GROUP BY 1, 2, 3
+        )
+        INSERT INTO account_prefix_rollup AS r (company_id, period_id, prefix2, value, asset_value, row_count)
+        SELECT company_id, period_id, prefix2, value, COALESCE(asset_value, 0), row_count
+        FROM deltas
+        ON CONFLICT (company_id, period_id, prefix2) DO UPDATE
+        SET value = r.value + EXCLUDED.value,
+            asset_value = r.asset_value + EXCLUDED.asset_value,
+            row_count = r.row_count + EXCLUDED.row_count
+    $sql$, changes);
+
+    DELETE FROM account_prefix_rollup WHERE row_count <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables cannot be shared between events, hence one trigger per operation.
+DROP TRIGGER IF EXISTS account_prefix_rollup_insert ON account_details;
+CREATE TRIGGER account_prefix_rollup_insert
+    AFTER INSERT ON account_details
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION account_prefix_rollup_apply();
+
+DROP TRIGGER IF EXISTS account_prefix_rollup_update ON account_details;
+CREATE TRIGGER account_prefix_rollup_update
+    AFTER UPDATE ON account_details
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION account_prefix_rollup_apply();
+
+DROP TRIGGER IF EXISTS account_prefix_rollup_delete ON account_details;
+CREATE TRIGGER account_prefix_rollup_delete
+    AFTER DELETE ON account_details
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION account_prefix_rollup_apply();
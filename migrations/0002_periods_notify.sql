@@ -0,0 +1,28 @@
+-- Tells the app which companies' periods changed so the period-resolution cache in
+-- utils.py can drop just those entries. Postgres folds identical payloads within one
+-- transaction, so a bulk sync sends one message per company.
+CREATE OR REPLACE FUNCTION periods_notify_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('periods_changed', '');
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('periods_changed', OLD.company_id::text);
+    ELSE
+        PERFORM pg_notify('periods_changed', NEW.company_id::text);
+        IF TG_OP = 'UPDATE' AND NEW.company_id IS DISTINCT FROM OLD.company_id THEN
+            PERFORM pg_notify('periods_changed', OLD.company_id::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS periods_notify_change ON periods;
+CREATE TRIGGER periods_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON periods
+    FOR EACH ROW EXECUTE FUNCTION periods_notify_change();
+
+DROP TRIGGER IF EXISTS periods_notify_truncate ON periods;
+CREATE TRIGGER periods_notify_truncate
+    AFTER TRUNCATE ON periods
+    FOR EACH STATEMENT EXECUTE FUNCTION periods_notify_change();
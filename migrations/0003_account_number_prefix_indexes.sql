@@ -0,0 +1,26 @@
+-- Btree indexes for the account-prefix range predicates built by utils.prefix_predicate
+-- (account_number COLLATE "C" >= '60' AND account_number COLLATE "C" < '65'). The
+-- expression must use the same "C" collation to be usable by those predicates; the
+-- INCLUDE columns let the calculator aggregates run as index-only scans.
+--
+-- On a busy production table run these statements by hand with CREATE INDEX
+-- CONCURRENTLY instead; that form cannot run inside the migration transaction.
+CREATE INDEX IF NOT EXISTS account_details_company_period_number_idx
+    ON account_details (company_id, period_id, (account_number COLLATE "C"))
+    INCLUDE (value, account_type);
+
+CREATE INDEX IF NOT EXISTS account_details_number_idx
+    ON account_details ((account_number COLLATE "C"))
+    INCLUDE (company_id, period_id, value);
+
+-- Period resolution filters on an end_date range per year.
+CREATE INDEX IF NOT EXISTS periods_end_date_idx
+    ON periods (end_date)
+    INCLUDE (company_id, period_id, fiscal_year_end);
+
+CREATE INDEX IF NOT EXISTS periods_company_end_date_idx
+    ON periods (company_id, end_date)
+    INCLUDE (period_id, fiscal_year_end);
+
+ANALYZE account_details;
+ANALYZE periods;
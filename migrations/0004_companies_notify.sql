@@ -0,0 +1,15 @@
+-- Tells the app that the companies table changed so the company-name index in
+-- company_index.py is rebuilt on its next lookup. One message per statement: the index is
+-- rebuilt as a whole anyway, so row-level payloads would only add noise. The payload is
+-- never empty: an empty payload means "listener lost its connection" to the app.
+CREATE OR REPLACE FUNCTION companies_notify_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('companies_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS companies_notify_change ON companies;
+CREATE TRIGGER companies_notify_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON companies
+    FOR EACH STATEMENT EXECUTE FUNCTION companies_notify_change();
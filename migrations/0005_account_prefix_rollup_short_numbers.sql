@@ -0,0 +1,61 @@
+-- The rollup skipped account numbers shorter than two characters, while the calculator
+-- on account_details counts them (in balanstotaal via the asset total). Such numbers now
+-- get a one-character (or, for NULL, an empty) prefix, so both sources give the same
+-- KPIResult. No two-digit metric prefix matches those keys.
+CREATE OR REPLACE FUNCTION account_prefix_rollup_apply() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    -- A transition table only exists for the operations that declare it, so the source
+    -- of the changed rows is picked per operation and the statement runs dynamically.
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT company_id, period_id, account_number, account_type, value, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT company_id, period_id, account_number, account_type, value, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT company_id, period_id, account_number, account_type, value, 1 AS sign FROM new_rows
+             UNION ALL
+             SELECT company_id, period_id, account_number, account_type, value, -1 AS sign FROM old_rows'
+    END;
+
+    EXECUTE format($sql$
+        WITH changes AS (%s),
+        deltas AS (
+            SELECT
+                company_id,
+                period_id,
+                COALESCE(LEFT(account_number, 2), '') AS prefix2,
+                SUM(sign * COALESCE(value, 0)) AS value,
+                SUM(sign * COALESCE(value, 0)) FILTER (WHERE account_type = 'asset') AS asset_value,
+                SUM(sign) AS row_count
+            FROM changes
+            GROUP BY 1, 2, 3
+        )
+        INSERT INTO account_prefix_rollup AS r (company_id, period_id, prefix2, value, asset_value, row_count)
+        SELECT company_id, period_id, prefix2, value, COALESCE(asset_value, 0), row_count
+        FROM deltas
+        ON CONFLICT (company_id, period_id, prefix2) DO UPDATE
+        SET value = r.value + EXCLUDED.value,
+            asset_value = r.asset_value + EXCLUDED.asset_value,
+            row_count = r.row_count + EXCLUDED.row_count
+    $sql$, changes);
+
+    DELETE FROM account_prefix_rollup WHERE row_count <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The keys the old function skipped; they can not exist in the rollup yet.
+INSERT INTO account_prefix_rollup (company_id, period_id, prefix2, value, asset_value, row_count)
+SELECT
+    company_id,
+    period_id,
+    COALESCE(LEFT(account_number, 2), '') AS prefix2,
+    SUM(COALESCE(value, 0)),
+    COALESCE(SUM(value) FILTER (WHERE account_type = 'asset'), 0),
+    COUNT(*)
+FROM account_details
+WHERE account_number IS NULL OR LENGTH(account_number) < 2
+GROUP BY 1, 2, 3
+ON CONFLICT (company_id, period_id, prefix2) DO NOTHING;
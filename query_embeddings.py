@@ -0,0 +1,118 @@
+"""
+Cache for the embeddings of user questions.
+
+Users ask the same tax questions over and over, so both retrievers look the question up
+here before calling OpenAI: first in an in-process LRU, then in the SQLite store of
+embeddings.EmbeddingCache. The key is the model, the dimensions (756 for the RAG indexes,
+1536 by default) and the question normalized for case, whitespace and trailing
+punctuation. `CachedOpenAIEmbedding` plugs the cache into the llama-index query engine,
+`embed_query` into the Milvus path of db_client.
+"""
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Callable, List
+
+from llama_index.embeddings.openai import OpenAIEmbedding
+
+from embeddings import EmbeddingCache
+from ttl_cache import TTLCache
+
+CACHE_PATH = Path(".cache/embeddings.sqlite")
+MEMORY_SIZE = 2048
+# Embeddings of a fixed model do not go stale; the TTL only bounds how long an unused
+# question occupies memory.
+MEMORY_TTL = 24 * 3600
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    question = unicodedata.normalize("NFC", question).casefold()
+    return _WHITESPACE.sub(" ", question).strip().rstrip("?!. ")
+
+
+class QueryEmbeddingCache:
+    def __init__(self, store: EmbeddingCache | None = None, maxsize: int = MEMORY_SIZE, ttl: float = MEMORY_TTL):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.store = store
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _store_key(model: str, dimensions: int | None, normalized: str) -> str:
+        # Namespaced so question vectors never mix with document vectors in the shared store.
+        return EmbeddingCache.key(f"query:{model}", dimensions, normalized)
+
+    def lookup(self, model: str, dimensions: int | None, question: str) -> List[float] | None:
+        normalized = normalize_question(question)
+        vector = self.memory.get((model, dimensions, normalized))
+        if vector is not None or self.store is None:
+            return vector
+        store_key = self._store_key(model, dimensions, normalized)
+        vector = self.store.get_many([store_key]).get(store_key)
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.set((model, dimensions, normalized), vector)
+        return vector
+
+    def put(self, model: str, dimensions: int | None, question: str, vector: List[float]):
+        normalized = normalize_question(question)
+        self.misses += 1
+        self.memory.set((model, dimensions, normalized), vector)
+        if self.store is not None:
+            self.store.put_many({self._store_key(model, dimensions, normalized): vector})
+
+    def get(self, model: str, dimensions: int | None, question: str, compute: Callable[[str], List[float]]):
+        vector = self.lookup(model, dimensions, question)
+        if vector is None:
+            vector = compute(question)
+            self.put(model, dimensions, question, vector)
+        return vector
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory.hits + self.disk_hits + self.misses
+        return (self.memory.hits + self.disk_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "size": len(self.memory),
+        }
+
+
+_cache: QueryEmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache(EmbeddingCache(CACHE_PATH))
+    return _cache
+
+
+def embed_query(question: str, model: str, dimensions: int | None, compute: Callable[[str], List[float]]):
+    return get_query_cache().get(model, dimensions, question, compute)
+
+
+class CachedOpenAIEmbedding(OpenAIEmbedding):
+    """OpenAIEmbedding whose query embeddings go through the shared query cache."""
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return embed_query(query, self.model_name, self.dimensions, super()._get_query_embedding)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        cache = get_query_cache()
+        vector = cache.lookup(self.model_name, self.dimensions, query)
+        if vector is None:
+            vector = await super()._aget_query_embedding(query)
+            cache.put(self.model_name, self.dimensions, query, vector)
+        return vector
@@ -0,0 +1,407 @@
+"""
+In-process metrics for the database hot path.
+
+Every statement that goes through the pooled psycopg2 connections (InstrumentedCursor)
+or the async pool (db_async.fetch) is recorded with the tool that issued it: latency
+histograms for execute and fetch, rows returned, bytes transferred and errors. The tool
+name comes from a context variable that `tagged` sets around each agent tool, so a slow
+`bereken` shows up as such and not as an anonymous SELECT.
+
+Statements slower than the threshold are explained on a separate connection by a
+background thread, so the caller never waits for it. ANALYZE runs the statement again, so
+only plain reads of the tools whose SQL the app writes itself (ANALYZED_TOOLS) get
+EXPLAIN (ANALYZE, BUFFERS); LLM-written load_data SQL and everything else get a plain
+EXPLAIN, and COPY is not explained at all. The last plans are kept in
+`registry.slow_statements`.
+
+`start_exporter(directory)` writes the registry every few seconds to metrics.json and
+metrics.prom (Prometheus text format) for a node_exporter textfile collector or a quick look.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import psycopg2
+import psycopg2.extensions
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_STATEMENT_SECONDS = 0.5
+# The same statement is explained at most once per cooldown; a slow ranking asked by every
+# user should not double the load on the database.
+EXPLAIN_COOLDOWN = 600
+# LLM-written SQL is rarely the same twice; only this many cooldowns are remembered.
+MAX_COOLDOWNS = 1024
+EXPLAIN_TIMEOUT_MS = 30_000
+MAX_PENDING_EXPLAINS = 4
+# Tools whose SQL is written by the app, not by the LLM; only their slow reads are re-run.
+ANALYZED_TOOLS = frozenset({"bereken", "bereken_many", "bereken_reeks", "vergelijk_op_basis_van", "voorafbetaling"})
+# Statements EXPLAIN accepts.
+_EXPLAINABLE = {"SELECT", "WITH", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE"}
+EXPORT_INTERVAL = 15
+
+_HELP = {
+    "db_execute_seconds": ("histogram", "Time spent in cursor.execute, per tool and operation."),
+    "db_fetch_seconds": ("histogram", "Time spent fetching result rows, per tool and operation."),
+    "db_statements_total": ("counter", "Statements executed."),
+    "db_errors_total": ("counter", "Statements that raised."),
+    "db_rows_total": ("counter", "Rows returned to the application."),
+    "db_bytes_total": ("counter", "Approximate bytes returned to the application."),
+    "db_slow_statements_total": ("counter", "Statements slower than the slow statement threshold."),
+}
+
+current_tool: ContextVar[str] = ContextVar("current_tool", default="")
+
+
+@contextmanager
+def tool_scope(name: str):
+    token = current_tool.set(name)
+    try:
+        yield
+    finally:
+        current_tool.reset(token)
+
+
+def tagged(fn, name: str | None = None):
+    """Wraps a tool so the statements it issues are recorded under its name."""
+    name = name or fn.__name__
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with tool_scope(name):
+                return await fn(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with tool_scope(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+_OPERATION = re.compile(r"^\s*(?:--[^\n]*\n\s*|/\*.*?\*/\s*)*(\w+)", re.S)
+_WRITES = re.compile(r"\b(insert|update|delete|merge|truncate|create|drop|alter|copy|call|do)\b", re.I)
+_LOCKS = re.compile(r"\bfor\s+(update|no\s+key\s+update|share|key\s+share)\b", re.I)
+
+
+def operation(sql) -> str:
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    match = _OPERATION.match(str(sql))
+    return match.group(1).upper() if match else "UNKNOWN"
+
+
+def row_bytes(rows, sample: int = 64) -> int:
+    # Sized from a sample spread over the rows: sizing every value of a large load_data
+    # fetch would cost a noticeable share of the fetch itself.
+    if len(rows) <= sample:
+        return sum(sys.getsizeof(value) for row in rows for value in row)
+    step = len(rows) // sample
+    sampled = sum(sys.getsizeof(value) for row in rows[::step][:sample] for value in row)
+    return sampled * len(rows) // sample
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            index = len(BUCKETS)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile, like histogram_quantile without interpolation."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip((*BUCKETS, float("inf")), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    def __init__(self, slow_statements: int = 50):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self.slow_statements: deque[dict] = deque(maxlen=slow_statements)
+
+    def inc(self, name: str, labels: dict, amount: float = 1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def record_statement(self, tool: str, op: str, execute_seconds: float, failed: bool = False):
+        labels = {"tool": tool or "app", "operation": op}
+        self.observe("db_execute_seconds", labels, execute_seconds)
+        self.inc("db_statements_total", labels)
+        if failed:
+            self.inc("db_errors_total", labels)
+
+    def record_fetch(self, tool: str, op: str, fetch_seconds: float, rows: int, size: int):
+        labels = {"tool": tool or "app", "operation": op}
+        self.observe("db_fetch_seconds", labels, fetch_seconds)
+        self.inc("db_rows_total", labels, rows)
+        self.inc("db_bytes_total", labels, size)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], histogram.counts)),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            slow = list(self.slow_statements)
+        return {"generated_at": time.time(), "counters": counters, "histograms": histograms, "slow_statements": slow}
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in sorted(self._histograms.items())]
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                kind, text = _HELP.get(name, ("untyped", name))
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+                described.add(name)
+
+        def render(labels) -> str:
+            return ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{{{render(labels)}}} {value:g}")
+        for (name, labels), counts, total, count in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket in zip((*map(str, BUCKETS), "+Inf"), counts):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{render(labels + (("le", bound),))}}} {cumulative}')
+            lines.append(f"{name}_sum{{{render(labels)}}} {total:.6f}")
+            lines.append(f"{name}_count{{{render(labels)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory: str | Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, content in (
+            ("metrics.json", json.dumps(self.snapshot(), indent=2, default=str)),
+            ("metrics.prom", self.to_prometheus()),
+        ):
+            tmp_path = directory / f"{name}.tmp"
+            tmp_path.write_text(content)
+            os.replace(tmp_path, directory / name)
+
+
+registry = MetricsRegistry()
+
+
+class SlowStatementExplainer:
+    """Explains slow statements on its own connection, one at a time, off the request path."""
+
+    def __init__(self, connect_kwargs: dict, threshold: float = SLOW_STATEMENT_SECONDS, cooldown: float = EXPLAIN_COOLDOWN):
+        self.connect_kwargs = connect_kwargs
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Statements explained within the last cooldown.
+        self._recently_explained = TTLCache(maxsize=MAX_COOLDOWNS, ttl=cooldown)
+
+    def maybe_explain(self, tool: str, sql, params, seconds: float):
+        if seconds < self.threshold:
+            return
+        registry.inc("db_slow_statements_total", {"tool": tool or "app", "operation": operation(sql)})
+        if operation(sql) not in _EXPLAINABLE:
+            return
+        sql = sql.decode() if isinstance(sql, bytes) else str(sql)
+        with self._lock:
+            if self._pending >= MAX_PENDING_EXPLAINS or self._recently_explained.get(sql) is not None:
+                return
+            self._pending += 1
+            self._recently_explained.set(sql, True)
+        self._executor.submit(self._explain, tool, sql, params, seconds)
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            # A plain connection: its statements must not be instrumented themselves.
+            self._conn = psycopg2.connect(**self.connect_kwargs)
+        return self._conn
+
+    def _explain(self, tool: str, sql: str, params, seconds: float):
+        analyze = (
+            tool in ANALYZED_TOOLS
+            and operation(sql) in ("SELECT", "WITH", "VALUES", "TABLE")
+            and not _WRITES.search(sql)
+            and not _LOCKS.search(sql)
+        )
+        options = "ANALYZE, BUFFERS" if analyze else "VERBOSE"
+        try:
+            conn = self._connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}")
+                    cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+            finally:
+                conn.rollback()
+            registry.slow_statements.append(
+                {"tool": tool or "app", "seconds": round(seconds, 4), "sql": sql, "analyzed": analyze, "plan": plan, "at": time.time()}
+            )
+            logger.info("Slow statement from %s (%.3fs):\n%s\n%s", tool or "app", seconds, sql, plan)
+        except Exception:
+            logger.warning("Could not explain a slow statement", exc_info=True)
+            if self._conn is not None:
+                self._conn.close()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_explainer: SlowStatementExplainer | None = None
+
+
+def configure_explainer(explainer: SlowStatementExplainer | None):
+    global _explainer
+    _explainer = explainer
+
+
+def observe_statement(sql, params, started: float, failed: bool = False, tool: str | None = None) -> float:
+    """Records one execute that began at `started` (perf_counter); returns its duration."""
+    elapsed = time.perf_counter() - started
+    tool = current_tool.get() if tool is None else tool
+    registry.record_statement(tool, operation(sql), elapsed, failed)
+    if _explainer is not None and not failed:
+        _explainer.maybe_explain(tool, sql, params, elapsed)
+    return elapsed
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that records every execute and fetch in the registry; pass as cursor_factory."""
+
+    _tool = ""
+    _operation = "UNKNOWN"
+
+    def execute(self, query, vars=None):
+        self._tool, self._operation = current_tool.get(), operation(query)
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            observe_statement(query, vars, started, failed=True, tool=self._tool)
+            raise
+        observe_statement(query, vars, started, tool=self._tool)
+        return result
+
+    def _fetched(self, started: float, rows: list):
+        registry.record_fetch(self._tool, self._operation, time.perf_counter() - started, len(rows), row_bytes(rows))
+        return rows
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, [row] if row is not None else [])
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        return self._fetched(started, super().fetchmany(size) if size is not None else super().fetchmany())
+
+    def fetchall(self):
+        started = time.perf_counter()
+        return self._fetched(started, super().fetchall())
+
+    def copy_expert(self, sql, file, size=8192):
+        self._tool, self._operation = current_tool.get(), "COPY"
+        position = file.tell() if file.seekable() else 0
+        started = time.perf_counter()
+        try:
+            result = super().copy_expert(sql, file, size)
+        except Exception:
+            observe_statement(sql, None, started, failed=True, tool=self._tool)
+            raise
+        elapsed = observe_statement(sql, None, started, tool=self._tool)
+        size = file.tell() - position if file.seekable() else 0
+        registry.record_fetch(self._tool, "COPY", elapsed, max(self.rowcount, 0), size)
+        return result
+
+
+_exporter: threading.Thread | None = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(directory: str | Path, interval: float = EXPORT_INTERVAL):
+    """Writes the registry to `directory` every `interval` seconds from a daemon thread."""
+    global _exporter
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.export(directory)
+            except Exception:
+                logger.warning("Could not export query metrics", exc_info=True)
+
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+            _exporter.start()
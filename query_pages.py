@@ -0,0 +1,215 @@
+import pandas as pd
+
+from query_results import MAX_ROWS, copy_frame
+from utils import get_db_connection
+
+PAGE_SIZE = 100
+# json, xml and the geometric types have no btree ordering, so they can not be part of a sort key.
+_UNORDERED_TYPES = {114, 142, 600, 601, 602, 603, 604, 628, 718}
+
+
+class PagedResult:
+    """
+    Result of a load_data query that is browsed one page at a time.
+
+    Only the query is kept, never its rows: every page is a fresh
+    `SELECT ... ORDER BY ... LIMIT` around it, with the sort and the text filter pushed into
+    the SQL, so Postgres sorts with a top-N heap and only the visible page crosses the wire.
+    Pages follow each other by keyset: the next page starts after the key of the last row
+    shown. The key is the sort column followed by every other orderable column, or until a
+    sort is chosen all orderable columns in order; rows that are identical in all those
+    columns are stepped over with an OFFSET, so a page boundary never skips or repeats a row.
+    Only a result without any orderable column (json only) is keyed by its row number in the
+    query's own order (`row_number() OVER ()`), with synchronized and parallel scans switched
+    off so that numbering is the same on every page. The cursors of the pages visited so far
+    are kept to go back. Between pages no connection is held.
+
+    The columns are renamed positionally (c0, c1, ...) inside the SQL, so duplicate or odd
+    column names in LLM-written queries do not matter; the row number is the column after
+    the last one.
+    """
+
+    def __init__(self, sql_query: str, params=None, page_size: int = PAGE_SIZE):
+        self.sql_query = sql_query
+        self.params = params
+        self.page_size = page_size
+        self.columns: list[str] = []
+        self.sort: int | None = None
+        self.descending = False
+        self.filter_column: int | None = None
+        self.filter_text = ""
+        self.has_next = False
+        # Columns with a btree ordering, the ones that can be sorted on.
+        self.sortable: list[int] = []
+        # Keyset cursor (key values, rows to skip) of every page up to the current one.
+        self._starts: list[tuple | None] = [None]
+        self._next: tuple | None = None
+        self._total: int | None = None
+
+    @classmethod
+    def open(cls, sql_query: str, params=None, page_size: int = PAGE_SIZE) -> tuple["PagedResult", pd.DataFrame]:
+        """The result and its first page; raises psycopg2.ProgrammingError if the query can not be wrapped."""
+        result = cls(sql_query, params, page_size)
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM ({result._body}) AS load_data LIMIT 0", params)
+                result.columns = [column.name for column in cursor.description]
+                result.sortable = [
+                    i for i, column in enumerate(cursor.description) if column.type_code not in _UNORDERED_TYPES
+                ]
+                return result, result._page(cursor, None)
+
+    @property
+    def _body(self) -> str:
+        return self.sql_query.strip().rstrip(";")
+
+    @property
+    def page_number(self) -> int:
+        return len(self._starts)
+
+    @property
+    def first_row(self) -> int:
+        return (self.page_number - 1) * self.page_size + 1
+
+    @property
+    def _row_number(self) -> int:
+        return len(self.columns)
+
+    @property
+    def _numbered(self) -> bool:
+        # Without an orderable column the row number is the only key there is.
+        return not self.sortable
+
+    def _source(self, numbered: bool = False) -> str:
+        aliases = ", ".join(f"c{i}" for i in range(len(self.columns) + numbered))
+        if numbered:
+            return f"(SELECT *, row_number() OVER () FROM ({self._body}) AS load_data) AS load_data({aliases})"
+        return f"({self._body}) AS load_data({aliases})"
+
+    def _select(self) -> str:
+        return ", ".join(f"c{i}" for i in range(len(self.columns)))
+
+    def _key(self) -> list[tuple[int, bool]]:
+        if self._numbered:
+            return [(self._row_number, False)]
+        if self.sort is None:
+            return [(i, False) for i in self.sortable]
+        return [(self.sort, self.descending)] + [(i, False) for i in self.sortable if i != self.sort]
+
+    @staticmethod
+    def _stable_order(cursor):
+        # Both make the row order of an unsorted scan differ between two runs of the query.
+        cursor.execute("SET LOCAL synchronize_seqscans = off")
+        cursor.execute("SET LOCAL max_parallel_workers_per_gather = 0")
+
+    def _literal(self, cursor, value) -> str:
+        literal = cursor.mogrify("%s", (value,)).decode()
+        # The query itself is interpolated with `params`; our literals must survive that.
+        return literal.replace("%", "%%") if self.params is not None else literal
+
+    def _where(self, cursor) -> list[str]:
+        if self.filter_column is None or not self.filter_text:
+            return []
+        escaped = self.filter_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return [f"CAST(c{self.filter_column} AS text) ILIKE {self._literal(cursor, f'%{escaped}%')}"]
+
+    def _after(self, cursor, values: tuple) -> str:
+        # (k1, k2, ...) after (v1, v2, ...) in ORDER BY k1, k2, ... NULLS LAST, spelled out
+        # because a row comparison is never true once a NULL is involved. The last term,
+        # all equal, lets the OFFSET step over rows that were already shown.
+        terms, equal = [], []
+        for (column, descending), value in zip(self._key(), values):
+            if value is not None:
+                operator = "<" if descending else ">"
+                after = f"(c{column} {operator} {self._literal(cursor, value)} OR c{column} IS NULL)"
+                terms.append(" AND ".join(equal + [after]))
+            equal.append(f"c{column} IS NOT DISTINCT FROM {self._literal(cursor, value)}")
+        terms.append(" AND ".join(equal))
+        return "(" + " OR ".join(f"({term})" for term in terms) + ")"
+
+    def _order_by(self) -> str:
+        return ", ".join(f"c{column} {'DESC' if descending else 'ASC'} NULLS LAST" for column, descending in self._key())
+
+    def _page(self, cursor, start: tuple | None) -> pd.DataFrame:
+        where = self._where(cursor)
+        skip = 0
+        if start is not None:
+            values, skip = start
+            where.append(self._after(cursor, values))
+        sql = f"SELECT * FROM {self._source(self._numbered)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {self._order_by()}"
+        if self._numbered:
+            self._stable_order(cursor)
+        cursor.execute(f"{sql} LIMIT {self.page_size + 1} OFFSET {int(skip)}", self.params)
+        rows = cursor.fetchall()
+        self.has_next = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        self._next = None
+        if self.has_next:
+            positions = [column for column, _ in self._key()]
+            last = tuple(rows[-1][i] for i in positions)
+            repeated = sum(1 for _ in _trailing(rows, positions, last))
+            # A run of identical rows can span several pages; the OFFSET covers all of it.
+            if start is not None and start[0] == last:
+                repeated += skip
+            self._next = (last, repeated)
+        return pd.DataFrame([row[: self._row_number] for row in rows], columns=self.columns)
+
+    def _reload(self) -> pd.DataFrame:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                return self._page(cursor, self._starts[-1])
+
+    def next_page(self) -> pd.DataFrame:
+        if self._next is not None:
+            self._starts.append(self._next)
+        return self._reload()
+
+    def previous_page(self) -> pd.DataFrame:
+        if len(self._starts) > 1:
+            self._starts.pop()
+        return self._reload()
+
+    def set_view(self, sort: int | None, descending: bool, filter_column: int | None, filter_text: str) -> pd.DataFrame:
+        """Sorts and filters in SQL and goes back to the first page."""
+        if (self.filter_column, self.filter_text) != (filter_column, filter_text):
+            self._total = None
+        self.sort, self.descending = sort, descending
+        self.filter_column, self.filter_text = filter_column, filter_text
+        self._starts = [None]
+        return self._reload()
+
+    def total(self) -> int:
+        """Rows matching the filter; counted once per filter."""
+        if self._total is None:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    where = self._where(cursor)
+                    sql = f"SELECT count(*) FROM {self._source()}"
+                    cursor.execute(sql + (" WHERE " + " AND ".join(where) if where else ""), self.params)
+                    self._total = cursor.fetchone()[0]
+        return self._total
+
+    def fetch_all(self, max_rows: int = MAX_ROWS) -> pd.DataFrame:
+        """The whole sorted and filtered result for an export, through the COPY path of query_results."""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                where = self._where(cursor)
+                sql = f"SELECT {self._select()} FROM {self._source()}"
+                if where:
+                    sql += " WHERE " + " AND ".join(where)
+                # Without an orderable column the query's own order is the only one.
+                if not self._numbered:
+                    sql += f" ORDER BY {self._order_by()}"
+                frame = copy_frame(cursor, sql, self.params, max_rows)
+        frame.columns = self.columns
+        return frame
+
+
+def _trailing(rows: list[tuple], positions: list[int], key: tuple):
+    for row in reversed(rows):
+        if tuple(row[i] for i in positions) != key:
+            return
+        yield row
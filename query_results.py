@@ -0,0 +1,325 @@
+import io
+import logging
+import sys
+import threading
+import time
+import uuid
+
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from utils import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1_000
+MAX_ROWS = 200_000
+MAX_BYTES = 100 * 1024 * 1024
+# Results that nobody scrolled or exported for this long give their connection back.
+MAX_IDLE_SECONDS = 5 * 60
+SWEEP_INTERVAL = 60
+# At most this many results of one session pin a pooled connection; opening one more
+# closes that session's least recently used, so one session can not hold on to the pool.
+MAX_OPEN_RESULTS = 3
+
+_open_results: set["QueryResult"] = set()
+_open_results_lock = threading.Lock()
+_sweeper: threading.Thread | None = None
+
+
+class ResultExpired(Exception):
+    pass
+
+
+def _row_bytes(row) -> int:
+    return sum(sys.getsizeof(value) for value in row)
+
+
+# Postgres type oids that map onto a native Arrow type; everything else is read as text.
+# numeric becomes float64, like it would after any calculation on the Decimal objects.
+_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    26: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+}
+
+
+def _limited(body: str, limit: int | None) -> str:
+    sql = f"SELECT * FROM ({body}) AS load_data"
+    return sql if limit is None else f"{sql} LIMIT {int(limit)}"
+
+
+def copy_frame(cursor, sql_query: str, params=None, limit: int | None = None) -> pd.DataFrame:
+    """
+    Runs `sql_query` through COPY ... TO STDOUT and decodes the CSV stream with Arrow.
+
+    The values never become Python objects: Postgres writes text, Arrow parses it straight
+    into typed column buffers and pandas takes those over. Column types come from the
+    result description, so text columns that look like numbers (account_number) stay text.
+    """
+    body = sql_query.strip().rstrip(";")
+    cursor.execute(_limited(body, 0), params)
+    names = [column.name for column in cursor.description]
+    types = [_ARROW_TYPES.get(column.type_code, pa.string()) for column in cursor.description]
+    # Duplicate column names are legal in SQL results, so Arrow gets positional ones.
+    positional = [f"c{i}" for i in range(len(names))]
+
+    buffer = io.BytesIO()
+    cursor.execute("SET LOCAL DateStyle TO ISO, YMD")
+    select = cursor.mogrify(_limited(body, limit), params).decode()
+    cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    table = pa_csv.read_csv(
+        buffer,
+        read_options=pa_csv.ReadOptions(column_names=positional),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=dict(zip(positional, types)),
+            # COPY writes NULL as an empty field and an empty string as "".
+            null_values=[""],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        ),
+    ) if buffer.getbuffer().nbytes else pa.table([pa.array([], type) for type in types], names=positional)
+    frame = table.to_pandas(date_as_object=False)
+    frame.columns = names
+    return frame
+
+
+def close_idle_results(max_idle: float = MAX_IDLE_SECONDS):
+    now = time.monotonic()
+    with _open_results_lock:
+        idle = [result for result in _open_results if now - result.last_used > max_idle]
+    for result in idle:
+        result.close()
+
+
+def _close_least_recently_used(owner, keep: int):
+    with _open_results_lock:
+        results = sorted(
+            (result for result in _open_results if result.owner == owner), key=lambda result: result.last_used
+        )
+    for result in results[: max(0, len(results) - keep)]:
+        result.close()
+
+
+def start_sweeper(interval: float = SWEEP_INTERVAL):
+    """Closes idle results every `interval` seconds from a daemon thread."""
+    global _sweeper
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                close_idle_results()
+            except Exception:
+                logger.warning("Could not close idle load_data results", exc_info=True)
+
+    with _open_results_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=run, name="load-data-sweeper", daemon=True)
+            _sweeper.start()
+
+
+class QueryResult:
+    """
+    Result of a load_data query that is pulled from Postgres in batches.
+
+    The query runs in a named cursor inside a transaction that stays open, so Postgres
+    produces the rows as they are fetched and only the first batch is computed and
+    transferred up front; `fetch_more` and `fetch_all` pull the rest when the UI scrolls or
+    exports. The row budget is pushed into the query as a LIMIT and the byte budget is
+    checked per batch, so a careless `SELECT * FROM account_details` can not pull the whole
+    table into the Streamlit process. The connection stays pinned to the result until it is
+    exhausted, closed, idle for `MAX_IDLE_SECONDS` or pushed out by `MAX_OPEN_RESULTS`
+    newer results of the same `owner` (the Streamlit session). A result closed before it
+    was exhausted is `expired`: the rows fetched so far stay, fetching more raises
+    `ResultExpired`.
+
+    With `columnar` (the default) `fetch_all` does not page through the cursor but reruns
+    the query once through `copy_frame`, which is several times faster for large results.
+    """
+
+    def __init__(
+        self,
+        sql_query: str,
+        params=None,
+        batch_size: int = BATCH_SIZE,
+        max_rows: int = MAX_ROWS,
+        max_bytes: int = MAX_BYTES,
+        columnar: bool = True,
+        owner=None,
+    ):
+        self.sql_query = sql_query
+        self.params = params
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.columnar = columnar
+        self.owner = owner
+        self.columns: list[str] = []
+        self.rows: list[tuple] | None = []
+        self.bytes = 0
+        self.exhausted = False
+        self.truncated = False
+        self.expired = False
+        self.last_used = time.monotonic()
+        self._pool = None
+        self._conn = None
+        self._cursor = None
+        self._frame = None
+        self._streaming = False
+        # The sweeper and other sessions may close the result while this one fetches.
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, sql_query: str, params=None, owner=None, **budget) -> "QueryResult":
+        start_sweeper()
+        close_idle_results()
+        _close_least_recently_used(owner, MAX_OPEN_RESULTS - 1)
+        result = cls(sql_query, params, owner=owner, **budget)
+        try:
+            result._execute()
+            result.fetch_more()
+        except Exception:
+            result.close()
+            raise
+        return result
+
+    def _execute(self):
+        self._pool = get_db_pool()
+        self._conn = self._pool.getconn()
+        with _open_results_lock:
+            _open_results.add(self)
+        body = self.sql_query.strip().rstrip(";")
+        try:
+            try:
+                # Not WITH HOLD: a holdable cursor is materialized in full at commit.
+                self._cursor = self._conn.cursor(name=f"load_data_{uuid.uuid4().hex}")
+                # One row over the budget tells us whether the result was cut off. The limit is
+                # inlined because LLM-written SQL often contains a bare % (LIKE '60%').
+                self._cursor.execute(_limited(body, self.max_rows + 1), self.params)
+                self._streaming = True
+            except psycopg2.ProgrammingError:
+                # Not wrappable as a subquery (e.g. SHOW or a statement with several parts):
+                # run it as written and enforce the budget on the client side.
+                self._conn.rollback()
+                self._cursor = self._conn.cursor()
+                self._cursor.execute(self.sql_query, self.params)
+        except Exception:
+            self._conn.rollback()
+            self._cursor = None
+            self.close()
+            raise
+
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        """The rows fetched so far."""
+        if self._frame is None or (self.rows is not None and len(self._frame) != len(self.rows)):
+            self._frame = pd.DataFrame(self.rows, columns=self.columns)
+        return self._frame
+
+    @property
+    def row_count(self) -> int:
+        return len(self.dataframe)
+
+    def fetch_more(self, batches: int = 1) -> pd.DataFrame:
+        with self._lock:
+            return self._fetch_more(batches)
+
+    def _check_expired(self):
+        if self.expired:
+            raise ResultExpired("The result was closed before all rows were fetched; run the query again")
+
+    def _fetch_more(self, batches: int) -> pd.DataFrame:
+        self._check_expired()
+        self.last_used = time.monotonic()
+        for _ in range(batches):
+            if self.exhausted or self._cursor is None:
+                break
+            batch = self._cursor.fetchmany(self.batch_size)
+            if not self.columns:
+                # A named cursor only has a description after its first fetch.
+                self.columns = [column[0] for column in self._cursor.description or []]
+            for row in batch:
+                if len(self.rows) >= self.max_rows or self.bytes >= self.max_bytes:
+                    self.truncated = True
+                    break
+                self.rows.append(row)
+                self.bytes += _row_bytes(row)
+            if self.truncated or len(batch) < self.batch_size:
+                self.exhausted = True
+                self.close()
+        return self.dataframe
+
+    def fetch_all(self) -> pd.DataFrame:
+        with self._lock:
+            self._check_expired()
+            if self.columnar and self._streaming and not self.exhausted:
+                self._fetch_columnar()
+            while not self.exhausted and self._cursor is not None:
+                self._fetch_more(1)
+            # The COPY fallback can lose the cursor; an export of part of the rows would look complete.
+            self._check_expired()
+            return self.dataframe
+
+    def _fetch_columnar(self):
+        self.last_used = time.monotonic()
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute("SAVEPOINT load_data_copy")
+                frame = copy_frame(cursor, self.sql_query, self.params, self.max_rows + 1)
+        except (psycopg2.Error, pa.ArrowInvalid):
+            # Rolling back to the savepoint keeps the cursor, so the batches are still there.
+            logger.warning("COPY fast path failed, paging through the cursor", exc_info=True)
+            try:
+                with self._conn.cursor() as cursor:
+                    cursor.execute("ROLLBACK TO SAVEPOINT load_data_copy")
+            except psycopg2.Error:
+                self.close()
+            return
+        self.truncated = len(frame) > self.max_rows
+        frame = frame.iloc[: self.max_rows]
+        frame_bytes = int(frame.memory_usage(deep=True).sum())
+        if frame_bytes > self.max_bytes:
+            self.truncated = True
+            frame = frame.iloc[: int(len(frame) * self.max_bytes / frame_bytes)]
+        # From here on the frame is the result; the tuples are no longer needed.
+        self._frame, self.rows = frame, None
+        self.bytes = min(frame_bytes, self.max_bytes)
+        self.exhausted = True
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        with _open_results_lock:
+            _open_results.discard(self)
+        if self._conn is None:
+            return
+        if not self.exhausted:
+            # The rows not fetched yet are gone with the cursor.
+            self.expired = True
+        conn, self._conn = self._conn, None
+        discard = False
+        try:
+            if self._cursor is not None and not self._cursor.closed:
+                self._cursor.close()
+            conn.commit()
+        except Exception:
+            logger.warning("Could not close load_data cursor cleanly", exc_info=True)
+            discard = True
+        self._cursor = None
+        self._pool.putconn(conn, discard=discard)
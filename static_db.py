@@ -0,0 +1,116 @@
+"""
+Read-only access to the JSON exports in silverfin_api_static_db/.
+
+Each file maps a company id to its records. A file is parsed once per process and kept as
+a dict keyed by the company id as a string, so a tool call is a dict lookup plus a list
+slice. The file's mtime and size are checked at most once per `CHECK_INTERVAL` seconds and
+a changed file is reloaded. Parsed files are also written to a pickle sidecar in
+`.cache/` next to the JSON, so a cold start unpickles instead of parsing JSON again.
+
+The records are shared between callers and must not be mutated.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STATIC_DB_DIR = Path("silverfin_api_static_db")
+CHECK_INTERVAL = 1.0
+_SIDECAR_VERSION = 1
+
+
+class StaticTable:
+    def __init__(self, path: Path, sidecar: bool = True, check_interval: float = CHECK_INTERVAL):
+        self.path = Path(path)
+        self.sidecar = sidecar
+        self.check_interval = check_interval
+        self.loads = 0
+        self._index: dict | None = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def sidecar_path(self) -> Path:
+        return self.path.parent / ".cache" / (self.path.stem + ".pickle")
+
+    def _stat(self) -> tuple[int, int]:
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_sidecar(self, signature):
+        try:
+            with open(self.sidecar_path, "rb") as file:
+                version, stored_signature, index = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable sidecar %s", self.sidecar_path, exc_info=True)
+            return None
+        if version != _SIDECAR_VERSION or stored_signature != signature:
+            return None
+        return index
+
+    def _write_sidecar(self, signature, index):
+        try:
+            self.sidecar_path.parent.mkdir(exist_ok=True)
+            tmp_path = self.sidecar_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as file:
+                pickle.dump((_SIDECAR_VERSION, signature, index), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.sidecar_path)
+        except OSError:
+            # A read-only deployment just parses the JSON on every cold start.
+            logger.warning("Could not write sidecar %s", self.sidecar_path, exc_info=True)
+
+    def _load(self, signature) -> dict:
+        index = self._read_sidecar(signature) if self.sidecar else None
+        if index is None:
+            with open(self.path, "r") as file:
+                index = {str(key): value for key, value in json.load(file).items()}
+            if self.sidecar:
+                self._write_sidecar(signature, index)
+        self.loads += 1
+        return index
+
+    def index(self) -> dict:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_interval:
+            return self._index
+        with self._lock:
+            signature = self._stat()
+            if self._index is None or signature != self._signature:
+                self._index = self._load(signature)
+                self._signature = signature
+            self._checked_at = now
+            return self._index
+
+    def get(self, company_id, default=None):
+        return self.index().get(str(company_id), default)
+
+    def __getitem__(self, company_id):
+        return self.index()[str(company_id)]
+
+    def page(self, company_id, page: int = 1, page_size: int = 100) -> list | None:
+        """The records of one company on the given page, or None if the company is unknown."""
+        records = self.get(company_id)
+        if records is None:
+            return None
+        start_index = (page - 1) * page_size
+        return records[start_index : start_index + page_size]
+
+
+_tables: dict[str, StaticTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_table(name: str) -> StaticTable:
+    """The table for silverfin_api_static_db/<name>.json, shared by all callers in the process."""
+    with _tables_lock:
+        if name not in _tables:
+            _tables[name] = StaticTable(STATIC_DB_DIR / f"{name}.json")
+        return _tables[name]
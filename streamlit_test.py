@@ -1,40 +1,16 @@
 import json
-import os
 import time
 from uuid import uuid4
 import re
-import pandas as pd
 import streamlit as st
 import streamlit_analytics2
-import streamlit_authenticator as stauth
-from google.cloud import firestore
-from llama_index.agent.openai import OpenAIAgent
-from llama_index.core import VectorStoreIndex
-from llama_index.core.tools import FunctionTool, QueryEngineTool
-from llama_index.core.memory.chat_memory_buffer import ChatMemoryBuffer
-from bot_queries.queries import voorafbetaling
-import pandas as pd
-from llama_index.embeddings.openai import (
-    OpenAIEmbedding,
-    OpenAIEmbeddingMode,
-    OpenAIEmbeddingModelType,
-)
-from llama_index.llms.openai import OpenAI
-from llama_index.vector_stores.postgres import PGVectorStore
-
-from calculator.calculator import bereken, vergelijk_op_basis_van
-from tools import (
-    account_details,
-    add,
-    companies_ids_api_call,
-    company_api_call,
-    has_tax_decreased_api_call,
-    multiply,
-    period_api_call,
-    period_id_fetcher,
-    reconciliation_api_call,
-    get_date,
-)
+
+from analytics_log import AnalyticsLog
+from analytics_writer import AnalyticsWriter, FirestoreBackend, start_user_tracking, stop_user_tracking
+
+# Only what the login form needs is imported here. The agent stack (knowledge_agent:
+# llama-index, OpenAI, the vector store, the calculator) is imported when the Chatbot
+# section is first rendered, Firestore when the analytics writer starts.
 
 st.set_page_config(
     layout="wide",
@@ -42,14 +18,11 @@ st.set_page_config(
     page_icon="images/FINTRAX_EMBLEM_POS@2x_TRANSPARENT.png",
 )
 
-
-# Set up OpenAI client
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
 COLLECTION_NAME = "openai_vectors"  # Milvus collection name
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # Authentication
 # import yaml
+# import streamlit_authenticator as stauth
 # from yaml.loader import SafeLoader
 
 # with open("credentials.yaml") as file:
@@ -61,222 +34,27 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 #     config["cookie"]["expiry_days"],
 # )
 
-# Vector DB Setup
-cloud_host = st.secrets["db_host"]
-cloud_port = st.secrets["db_port"]
-cloud_db_name = st.secrets["db_name"]
-cloud_db_pwd = st.secrets["db_pwd"]
-cloud_db_user = st.secrets["db_user"]
-cloud_db_table_name = st.secrets["db_table_name"]
-
 
 @st.cache_resource
-def create_db_connection():
-    cloud_aws_vector_store = PGVectorStore.from_params(
-        database=cloud_db_name,
-        host=cloud_host,
-        password=cloud_db_pwd,
-        port=cloud_port,
-        user=cloud_db_user,
-        table_name=cloud_db_table_name,
-        embed_dim=756,  # openai embedding dimension
-    )
-    return cloud_aws_vector_store
+def get_firestore():
+    from google.cloud import firestore
 
-
-cloud_aws_vector_store = create_db_connection()
-email_regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
+    firestore_cred = json.loads(st.secrets["FIRESTORE"])
+    return firestore.Client.from_service_account_info(firestore_cred)
 
 
 @st.cache_resource
-def vector_store_index(_cloud_aws_vector_store):
-    index = VectorStoreIndex.from_vector_store(
-        cloud_aws_vector_store,
-        embed_model=OpenAIEmbedding(
-            mode=OpenAIEmbeddingMode.SIMILARITY_MODE,
-            model=OpenAIEmbeddingModelType.TEXT_EMBED_3_SMALL,
-            dimensions=756,
-        ),
-    )
-    return index
-
-
-index = vector_store_index(cloud_aws_vector_store)
-
-system_prompt = """
-Je bent een vertrouwde financiële expert in België die mensen helpt met perfect advies. Het is jouw taak om een feitelijk en volledig antwoord te geven op de gestelde vraag op basis van de informatie die je verkrijgt via de beschikbare tools.
-
-**Belangrijke richtlijnen:**
-
-- **Gebruik altijd de tool 'Financiele_informatie' om informatie op te halen voor elke vraag.** Baseer je antwoorden uitsluitend op informatie uit deze tool.
-
-- ALS DE VRAAG BETREKKING HEEFT OP SPECIFIEKE CODES, VAKKEN OF FINANCIELE TOOLS, LEG DAN DE FOCUS OP HET UITLEGGEN VAN DIE CODES!!!
-
-- Geef voldoende informatie, maak je antwoord dus wat langer.
-
-- **Vermijd het gebruik van zinnen zoals "volgens de passage" of "volgens de context" in je antwoord.**
-
-- Maak je antwoord overzichtelijk, gebruik opsommingstekens indien nodig, en zorg voor een duidelijke structuur.
-
-- **Geef voldoende en nauwkeurige informatie** om de vraag volledig te beantwoorden.
-
-- Schrijf in helder en professioneel Nederlands, met de juiste terminologie.
-
-- Het is goed om te weten dat dossiers en bedrijven hetzelfde worden gezien in de database functies. Dus als iemand vraagt achter een dossier met een naam dan gaat het eigenlijk over een bedrijf. Een dossier is een company in de database
-
-- Voer een calculatie altijd uit als het gevraagd is. 
-
-- Zeg nooit, "Ik ga dit uitrekenen" zonder het ook echt te doen"""
-
-
-llm = OpenAI(model="gpt-4o", temperature=0, system_prompt=system_prompt)
-
-description = """
-'Financiele_informatie' is een uitgebreide RAG-database die diepgaande informatie bevat over:
-
-- **Belgische belastingen en financiële wetgevingen**
-- **Fiscale codes en relevante vakken**
-- **Software en programma's die in de financiële sector worden gebruikt (zoals Excel)**
-- **Best practices en tools voor financiële professionals**
-
-Gebruik deze tool altijd om:
-
-- **Algemene en specifieke financiële vragen** te beantwoorden.
-- **Informatie over belastingcodes, vakken en financiële software** te verstrekken.
-- **Actuele wetgevingen, regelgeving en technologische ontwikkelingen** te raadplegen binnen de financiële sector.
-
-**Belangrijk:** Baseer al je antwoorden uitsluitend op de informatie die je via deze tool verkrijgt. Voeg geen externe informatie toe, zelfs niet als je deze kent.
-"""
-
-
-query_engine = index.as_query_engine(llm=llm, similarity_top_k=10)
-budget_tool = QueryEngineTool.from_defaults(
-    query_engine,
-    name="Financiele_informatie",
-    description=description,
-)
-
-from utils import (
-    get_db_connection,
-)
-def list_tables():
-    """
-    Geeft een lijst van alle tabellen in het schema.
-    Returns:
-        list: Lijst van tabelnamen in het 'public' schema.
-    """
-    sql = "SELECT table_name FROM information_schema.tables WHERE table_schema='public'"
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql)
-            result = cursor.fetchall()
-    return result
-
-
-def describe_tables(table_name: str):
-    """
-    Geeft de kolomnamen en datatypes van de opgegeven tabel.
-    Args:
-        table_name (str): Naam van de tabel om te beschrijven.
-    Returns:
-        list: Lijst van kolomnamen en hun datatypes voor de opgegeven tabel.
-    """
-    sql = f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table_name}'"
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql)
-            result = cursor.fetchall()
-    return result
+def get_analytics_writer():
+    if st.secrets.get("ANALYTICS_BACKEND", "firestore") == "local":
+        backend = AnalyticsLog("analytics")
+    else:
+        backend = FirestoreBackend(get_firestore(), collection="new_users")
+    return AnalyticsWriter(backend, interval=float(st.secrets.get("ANALYTICS_FLUSH_INTERVAL", 10)))
 
 
 if "data" not in st.session_state:
     st.session_state.data = None
 
-def load_data(sql_query: str):
-    """
-    Voert een SQL-query uit en retourneert het resultaat. Het resultaat kan groter zijn dan jouw context window dus krijg jij een preview van de data terwijl de volledige data naast jouw antwoord wordt getoond in een pandas dataframe. Je hoeft je resultaat niet te tonen, enkel herkennen dat de functie succesvol. Jij krijgt een preview zodat als er vragen zijn jij die veranderen kan doorvoeren.
-    Args:
-        sql_query (str): De SQL-query om uit te voeren.
-    Returns:
-        
-    Opmerking:
-        Gebruik eerst de functies list_tables en describe_tables voor context.
-    """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(sql_query)
-            result = cursor.fetchall()
-            full_df = pd.DataFrame(result)
-            st.session_state.data = full_df
-            st.session_state.data.columns =[ x[0] for x in cursor.description ]
-            return "Het volgende is een preview van data, de user krijgt de hele data te zien. Jij, de chatbot krijgt een deel omdat er anders het risico is om jou context window te overflowen. Vermeld in je antwoord dat jij een preview hebt van de data en de volledige data rechts van de chat te vinden is!" +  str(full_df.head(1))
-
-@st.cache_resource
-def load_tools():
-    multiply_tool = FunctionTool.from_defaults(fn=multiply)
-    add_tool = FunctionTool.from_defaults(fn=add)
-    company_tool = FunctionTool.from_defaults(fn=company_api_call)
-    companies_tool = FunctionTool.from_defaults(fn=companies_ids_api_call)
-    tarief_tax_tool = FunctionTool.from_defaults(fn=has_tax_decreased_api_call)
-    period_tool = FunctionTool.from_defaults(fn=period_id_fetcher)
-    # account_tool = FunctionTool.from_defaults(fn=account_details)
-    reconciliation_tool = FunctionTool.from_defaults(fn=reconciliation_api_call)
-    list_tables_tool = FunctionTool.from_defaults(fn=list_tables)
-    describe_tables_tool = FunctionTool.from_defaults(fn=describe_tables)
-    load_data_tool = FunctionTool.from_defaults(fn=load_data)
-    vergelijk_op_basis_van_tool = FunctionTool.from_defaults(vergelijk_op_basis_van)
-    bereken_tool = FunctionTool.from_defaults(bereken)
-    get_datum_tool = FunctionTool.from_defaults(get_date)
-    voorafbetaling_tool = FunctionTool.from_defaults(fn=voorafbetaling)
-
-
-    return [
-        budget_tool,
-        tarief_tax_tool,
-        companies_tool,
-        period_tool,
-        company_tool,
-        # EBITDA_tool,
-        # list_tables_tool,
-        # describe_tables_tool,
-        load_data_tool,
-        # balanstotaal_tool, eigen_vermogen_tool, handelswerkkapitaal_tool, bruto_marge_tool, omzet_tool, handelsvorderingen_tool, DSO_tool,
-        # voorzieningen_tool, financiele_schuld_tool, liquide_middelen_tool, EBITDA_marge_tool, afschrijvingen_tool, EBIT_tool, netto_financiele_schuld_tool
-        bereken_tool,
-        vergelijk_op_basis_van_tool,
-        get_datum_tool,
-        voorafbetaling_tool
-    ]
-
-
-
-
-# def chart():
-#     """Creates a chart based on the data. Use this tool when a user requests a chart"""
-#     st.session_state.agent = True
-#     return "Succesfully created chart"
-
-
-# tools = load_tools()
-list_tables_tool = FunctionTool.from_defaults(fn=list_tables)
-describe_tables_tool = FunctionTool.from_defaults(fn=describe_tables)
-load_data_tool = FunctionTool.from_defaults(fn=load_data)
-voorafbetaling_tool = FunctionTool.from_defaults(fn=voorafbetaling)
-# chart_tool = FunctionTool.from_defaults(fn=chart)
-
-def create_agent():
-    llm = OpenAI(model="gpt-4o", temperature=0)
-    buffer = ChatMemoryBuffer(token_limit=300)
-    agent = OpenAIAgent.from_tools(
-        load_tools(), verbose=True, llm=llm, system_prompt=system_prompt, memory_cls=buffer
-    )
-    return agent
-
-
-if "agent" not in st.session_state:
-    st.session_state.agent = create_agent()
-agent = st.session_state.agent
-
 
 # CSS injection that makes the user input right-aligned
 st.markdown(
@@ -348,11 +126,6 @@ if "username" not in st.session_state or "active_session" in st.session_state an
 col1, col2, col3 = st.sidebar.columns([1, 6, 1])
 col2.image("images/blauw_logo_and_text_zonder_padding.png")
 
-firestore_string = st.secrets["FIRESTORE"]
-firestore_cred = json.loads(firestore_string)
-db = firestore.Client.from_service_account_info(firestore_cred)
-
-
 def popup():
     if "username" not in st.session_state or st.session_state["username"] is None:
         st.toast("U moet inloggen voor deze functionaliteit.")
@@ -375,13 +148,11 @@ with st.sidebar.container():
 
 
 if st.secrets["PROD"] == "False" and "username" in st.session_state:
-    if os.path.exists(f"analytics/{st.session_state.username}.json"):
-        streamlit_analytics2.start_tracking(
-            load_from_json=f"analytics/{st.session_state.username}.json"
-        )
-    else:
-        streamlit_analytics2.main.reset_counts()
-        streamlit_analytics2.start_tracking()
+    start_user_tracking(
+        get_analytics_writer(),
+        st.session_state.username,
+        load_from_json=f"analytics/{st.session_state.username}.json",
+    )
 
 else:
     streamlit_analytics2.start_tracking()
@@ -435,10 +206,75 @@ if (
 if st.session_state["active_section"] == "Chatbot":
     st.title("Knowledge Center")
     col1, col2 = st.columns([1,1])
+    from query_pages import PagedResult
+
+    result = st.session_state.get("result")
+    if isinstance(result, PagedResult):
+        # Sorting and filtering run in SQL; only the visible page is kept in session state.
+        def column_name(i):
+            return "—" if i is None else result.columns[i]
+
+        options = [None, *range(len(result.columns))]
+        sortable = [None, *result.sortable]
+        sortcol, ordercol, filtercol, textcol = col2.columns([3, 2, 3, 3])
+        sort = sortcol.selectbox(
+            "Sorteer op", sortable, index=sortable.index(result.sort), format_func=column_name, key=f"sort_{id(result)}"
+        )
+        descending = ordercol.selectbox(
+            "Volgorde", [False, True], index=int(result.descending),
+            format_func=lambda d: "aflopend" if d else "oplopend", key=f"order_{id(result)}",
+        )
+        filter_column = filtercol.selectbox(
+            "Filter op", options, index=options.index(result.filter_column), format_func=column_name,
+            key=f"filter_{id(result)}",
+        )
+        filter_text = textcol.text_input("Bevat", value=result.filter_text, key=f"text_{id(result)}")
+        if (sort, descending, filter_column, filter_text) != (
+            result.sort, result.descending, result.filter_column, result.filter_text
+        ):
+            st.session_state.data = result.set_view(sort, descending, filter_column, filter_text)
     col2.dataframe(st.session_state.data, use_container_width=True, height=500)
-    # if "chart"  in st.session_state:
-    #     col2.line_chart(st.session_state.data)
-    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+    if isinstance(result, PagedResult):
+        shown = len(st.session_state.data)
+        last_row = result.first_row + shown - 1
+        col2.caption(f"Rijen {min(result.first_row, last_row):,}–{last_row:,} van {result.total():,}")
+        previous, following, export = col2.columns(3)
+        previous.button(
+            "Vorige", disabled=result.page_number == 1, use_container_width=True,
+            on_click=lambda: st.session_state.update(data=result.previous_page()),
+        )
+        following.button(
+            "Volgende", disabled=not result.has_next, use_container_width=True,
+            on_click=lambda: st.session_state.update(data=result.next_page()),
+        )
+        if export.button("Exporteer als CSV", use_container_width=True):
+            col2.download_button(
+                "Download CSV",
+                result.fetch_all().to_csv(index=False).encode("utf-8"),
+                file_name="resultaat.csv",
+                mime="text/csv",
+            )
+    elif result is not None and result.expired:
+        col2.caption(f"Resultaat verlopen na {result.row_count:,} rijen, stel de vraag opnieuw voor de rest.")
+    elif result is not None:
+        if result.truncated:
+            col2.caption(f"Resultaat afgekapt op {result.row_count:,} rijen.")
+        elif not result.exhausted:
+            col2.caption(f"{result.row_count:,} rijen geladen, er zijn er meer.")
+            if col2.button("Meer rijen laden"):
+                st.session_state.data = result.fetch_more()
+                st.rerun()
+        if col2.button("Exporteer als CSV"):
+            st.session_state.data = result.fetch_all()
+            col2.download_button(
+                "Download CSV",
+                st.session_state.data.to_csv(index=False).encode("utf-8"),
+                file_name="resultaat.csv",
+                mime="text/csv",
+            )
+    if st.session_state.get("chart") and st.session_state.data is not None:
+        col2.line_chart(st.session_state.data, **st.session_state.chart)
+    from knowledge_agent import answer
 
     if "openai_model" not in st.session_state:
         st.session_state["openai_model"] = "gpt-4o"
@@ -470,12 +306,11 @@ if st.session_state["active_section"] == "Chatbot":
                 with colcon1.chat_message("assistant", avatar="images/FINTRAX_EMBLEM_POS@2x_TRANSPARENT.png"):
                     with st.spinner("Thinking..."):
                         try:
-                            mess = agent.stream_chat(prompt)
+                            response = answer(prompt)
 
                         except Exception as e:
                             response = "Sorry, there was an error processing your request. Please try again."
                             st.error("Error in agent response: " + str(e))
-                    response = st.write_stream(mess.response_gen)
                     st.session_state.messages.append(
                         {"role": "assistant", "content": response}
                     )
@@ -485,13 +320,10 @@ if st.session_state["active_section"] == "Chatbot":
                 with colcon1.chat_message("assistant", avatar="images/FINTRAX_EMBLEM_POS@2x_TRANSPARENT.png"):
                     with colcon1.spinner("Thinking..."):
                         try:
-                            mess = agent.stream_chat(
-                                st.session_state.messages[-1]["content"]
-                            )
+                            response = answer(st.session_state.messages[-1]["content"])
                         except Exception as e:
                             response = "Sorry, there was an error processing your request. Please try again."
                             st.error("Error in agent response: " + str(e))
-                        response = st.write_stream(mess.response_gen)
                         st.session_state.messages.append(
                             {"role": "assistant", "content": response}
                         )
@@ -635,16 +467,13 @@ if (
     and "username" in st.session_state
     and "UUID" in st.session_state
 ):
-    streamlit_analytics2.stop_tracking(
-        save_to_json=f"analytics/{st.session_state.username}.json",
+    # Only what changed since the last rerun is queued; the writer flushes in the background.
+    stop_user_tracking(
+        get_analytics_writer(),
+        str(st.session_state.username),
+        st.session_state.get("UUID"),
+        st.session_state.get("messages"),
         unsafe_password=st.secrets["ANALYTICS_PWD"],
     )
-    doc_ref = db.collection("new_users").document(str(st.session_state.username))
-
-    analytics_data = pd.read_json(f"analytics/{st.session_state.username}.json").to_dict()
-    analytics_data["chat"] = {
-        st.session_state.get("UUID"): st.session_state.get("messages")
-    }
-    doc_ref.set(analytics_data, merge=True)
 else:
     streamlit_analytics2.stop_tracking()
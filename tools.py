@@ -1,9 +1,9 @@
-import json
-
 from django.utils import timezone
 from llama_index.core.tools import FunctionTool
 import datetime
+from company_index import get_company_index
 from enums.account_type import AccountType
+from static_db import get_table
 from utils import (
     get_acount_details_by_account_number,
     get_db_connection,
@@ -35,23 +35,9 @@ def account_api_call(company_id: str, page: int = 1, page_size: int = 100):
     Retourneert:
     - Een lijst met accountdossiers voor de opgegeven pagina, of een foutmelding als het bedrijf niet bestaat of geen accounts heeft.
     """
-    with open("silverfin_api_static_db/accounts.json", "r") as file:
-        accounts = json.load(file)
-
-    # Get the accounts for the specified company
-    company_accounts = accounts.get(
-        str(company_id), "Geen accounts gevonden voor het opgegeven bedrijf."
-    )
-
-    if isinstance(company_accounts, str):  # If the result is the error message
-        return company_accounts
-
-    # Calculate the start and end indices for pagination
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-
-    # Return the paginated results
-    paginated_accounts = company_accounts[start_index:end_index]
+    paginated_accounts = get_table("accounts").page(company_id, page, page_size)
+    if paginated_accounts is None:
+        return "Geen accounts gevonden voor het opgegeven bedrijf."
 
     return (
         paginated_accounts
@@ -69,42 +55,28 @@ def company_api_call(company_id: str):
     Retourneert:
     - Een dictionary met bedrijfsinformatie als het bedrijf wordt gevonden, of een foutmelding als het bedrijf niet bestaat.
     """
-    with open("silverfin_api_static_db/companies.json", "r") as file:
-        companies = json.load(file)
-
-    if companies[company_id]:
-        return companies[company_id]
+    company = get_table("companies").get(company_id)
+    if company:
+        return company
     return "Geen bedrijf gevonden met de opgegeven company_id."
 
 
 def companies_ids_api_call(keywords: list = None):
     """
     Geeft de bedrijfs-ids met de overeenkomstige naam terug. Gebruik deze tool wanneer je de company_id niet weet.
+    Het zoeken is tolerant voor tikfouten, hoofdletters en accenten.
     Vereist:
     - keywords: Een lijst met zoekwoorden om te filteren op bedrijfsnamen
     Retourneert:
-    - Een lijst met de ids van alle bedrijven voor de opgegeven pagina, gefilterd op zoekwoorden.
+    - Een lijst van (company_id, naam, score) met de best passende bedrijven eerst. Een score dicht bij 1 is een
+      zekere match; bij meerdere kandidaten met een gelijkaardige score vraag je de gebruiker welk bedrijf bedoeld wordt.
     """
-    companies = """
-        SELECT company_id, name
-        FROM companies
-    """
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(companies)
-            result = cursor.fetchall()
-
-    # Filter results based on keywords
-    if keywords:
-        filtered_result = [
-            (company_id, name)
-            for company_id, name in result
-            if any(keyword.lower() in name.lower() for keyword in keywords)
-        ]
-    else:
-        filtered_result = result
-
-    return filtered_result
+    index = get_company_index()
+    if not keywords:
+        return list(zip(index.company_ids.tolist(), index.names))
+    if isinstance(keywords, str):
+        keywords = [keywords]
+    return index.search(keywords) or "Geen bedrijf gevonden dat overeenkomt met de opgegeven zoekwoorden."
 
 
 def period_api_call(company_id: int, page: int = 1, page_size: int = 100):
@@ -119,23 +91,9 @@ def period_api_call(company_id: int, page: int = 1, page_size: int = 100):
     Retourneert:
     - Een lijst met periodes die horen bij het opgegeven bedrijf voor de opgegeven pagina.
     """
-    with open("silverfin_api_static_db/periods.json", "r") as file:
-        periods = json.load(file)
-
-    # Get the periods for the specified company
-    company_periods = periods.get(
-        str(company_id), "Geen periodes gevonden voor het opgegeven bedrijf."
-    )
-
-    if isinstance(company_periods, str):  # If the result is an error message
-        return company_periods
-
-    # Calculate the start and end indices for pagination
-    start_index = (page - 1) * page_size
-    end_index = start_index + page_size
-
-    # Return the paginated results
-    paginated_periods = company_periods[start_index:end_index]
+    paginated_periods = get_table("periods").page(company_id, page, page_size)
+    if paginated_periods is None:
+        return "Geen periodes gevonden voor het opgegeven bedrijf."
 
     return (
         paginated_periods
@@ -145,9 +103,7 @@ def period_api_call(company_id: int, page: int = 1, page_size: int = 100):
 
 
 def company_id_to_name_converter(company_id: int):
-    with open("silverfin_api_static_db/company_ids.json", "r") as file:
-        companies = json.load(file)
-        return companies[str(company_id)]
+    return get_table("company_ids")[company_id]
 
 
 def has_tax_decreased_api_call(company_id: int, date: str):
@@ -1,12 +1,20 @@
-import psycopg2
-import psycopg2._psycopg
+import asyncio
+import threading
+
 import streamlit as st
 from django.utils import timezone
 from psycopg2._psycopg import cursor
+from psycopg_pool import AsyncConnectionPool
+
+from db_async import fetch, get_async_pool
+from db_notifications import NotificationListener
+from db_pool import ConnectionPool, PoolStats, get_pool
+from query_metrics import InstrumentedCursor, SlowStatementExplainer, configure_explainer, start_exporter
+from ttl_cache import TTLCache
 
 
-def get_db_connection() -> psycopg2._psycopg.connection:
-    return psycopg2.connect(
+def _connect_kwargs() -> dict:
+    return dict(
         database=st.secrets["RDS_NAME"],
         host=st.secrets["RDS_HOST"],
         password=st.secrets["RDS_PWD"],
@@ -15,52 +23,306 @@ def get_db_connection() -> psycopg2._psycopg.connection:
     )
 
 
-def get_period_ids(cursor: cursor, company_id: int, date: str):
-    try:
-        date = timezone.datetime.fromisoformat(date)
-        period_ids_query = f"""
-            SELECT period_id
-            FROM periods
-            WHERE company_id = {company_id}
-            AND (
-                end_date = fiscal_year_end AND DATE_PART('year', fiscal_year_end) = {date.year}
-                OR
-                end_date = (
-                    SELECT p2.end_date
-                    FROM periods AS p2
-                    WHERE p2.company_id = periods.company_id
-                    AND DATE_PART('year', p2.end_date) = {date.year}
-                    ORDER BY ABS(p2.end_date - DATE '{date}') ASC
-                    LIMIT 1
+def _create_pool() -> ConnectionPool:
+    # Every statement on the pool is timed per tool (query_metrics); the slow ones get explained.
+    configure_explainer(
+        SlowStatementExplainer(_connect_kwargs(), threshold=float(st.secrets.get("SLOW_QUERY_MS", 500)) / 1000)
+    )
+    start_exporter(st.secrets.get("METRICS_DIR", ".cache/metrics"))
+    pool = ConnectionPool(
+        {**_connect_kwargs(), "cursor_factory": InstrumentedCursor},
+        min_size=int(st.secrets.get("RDS_POOL_MIN", 1)),
+        max_size=int(st.secrets.get("RDS_POOL_MAX", 10)),
+        timeout=float(st.secrets.get("RDS_POOL_TIMEOUT", 10)),
+        max_idle=float(st.secrets.get("RDS_POOL_MAX_IDLE", 300)),
+    )
+    pool.fill()
+    return pool
+
+
+def get_db_connection():
+    # Borrowed from the process-wide pool; `with get_db_connection() as conn` commits or
+    # rolls back like a plain psycopg2 connection and then hands the connection back.
+    return get_db_pool().connection()
+
+
+def get_db_pool() -> ConnectionPool:
+    return get_pool(_create_pool)
+
+
+def get_db_pool_stats() -> PoolStats:
+    return get_db_pool().stats()
+
+
+async def _create_async_pool() -> AsyncConnectionPool:
+    kwargs = _connect_kwargs()
+    kwargs["dbname"] = kwargs.pop("database")  # psycopg 3 only knows the libpq name
+    pool = AsyncConnectionPool(
+        kwargs=kwargs,
+        min_size=int(st.secrets.get("RDS_POOL_MIN", 1)),
+        max_size=int(st.secrets.get("RDS_POOL_MAX", 10)),
+        timeout=float(st.secrets.get("RDS_POOL_TIMEOUT", 10)),
+        max_idle=float(st.secrets.get("RDS_POOL_MAX_IDLE", 300)),
+        open=False,
+    )
+    await pool.open()
+    return pool
+
+
+async def get_async_db_pool() -> AsyncConnectionPool:
+    return await get_async_pool(_create_async_pool)
+
+
+async def afetch(sql: str, params=None):
+    """Async `cursor.execute` + `fetchall` on the shared async pool; returns (description, rows)."""
+    return await fetch(_create_async_pool, sql, params)
+
+
+_listener: NotificationListener | None = None
+_listener_lock = threading.Lock()
+
+
+def get_notification_listener() -> NotificationListener:
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(_connect_kwargs())
+    return _listener
+
+
+# (company_id, date) -> period_id, or None when the company has no period that year.
+# Entries expire after a TTL and are dropped as soon as the periods_changed trigger
+# (migrations/0002_periods_notify.sql) reports a change for the company. Built on first
+# use, so the helpers in this module import without a secrets file.
+_period_cache: TTLCache | None = None
+_period_cache_lock = threading.Lock()
+_period_cache_subscribed = False
+
+
+def get_period_cache() -> TTLCache:
+    global _period_cache
+    if _period_cache is None:
+        with _period_cache_lock:
+            if _period_cache is None:
+                _period_cache = TTLCache(
+                    maxsize=int(st.secrets.get("PERIOD_CACHE_SIZE", 10_000)),
+                    ttl=float(st.secrets.get("PERIOD_CACHE_TTL", 600)),
                 )
-            );
-        """
-        cursor.execute(period_ids_query)
-        period_ids = cursor.fetchall()
+    return _period_cache
+
+
+def _on_periods_changed(payload: str | None):
+    if payload is None:
+        get_period_cache().invalidate()
+    else:
+        company_id = int(payload)
+        get_period_cache().invalidate(lambda key: key[0] == company_id)
+
+
+def _sync_period_cache():
+    global _period_cache_subscribed
+    # Built before taking the lock, so the callback never needs it.
+    get_period_cache()
+    listener = get_notification_listener()
+    if not _period_cache_subscribed:
+        with _period_cache_lock:
+            if not _period_cache_subscribed:
+                listener.subscribe("periods_changed", _on_periods_changed)
+                _period_cache_subscribed = True
+    listener.poll()
 
-        # Logical check if no period is found
-        if len(period_ids) == 0:
-            return "Dit bedrijf heeft geen periode tijdens deze datum"
 
-        return period_ids[0][0]
+def period_choice_sql(company_filter: str = "") -> str:
+    """
+    Per company the period ending in the requested year: the fiscal year end when there is
+    one, otherwise the period whose end date lies closest to the requested date.
+
+    Expects the parameters date, year_start and next_year_start (see period_params).
+    """
+    return f"""SELECT DISTINCT ON (company_id) company_id, period_id
+    FROM periods
+    WHERE end_date >= %(year_start)s AND end_date < %(next_year_start)s {company_filter}
+    ORDER BY
+        company_id,
+        COALESCE(end_date = fiscal_year_end, false) DESC,
+        ABS(end_date - %(date)s::date),
+        period_id"""
+
+
+def period_params(date) -> dict:
+    if isinstance(date, str):
+        date = timezone.datetime.fromisoformat(date)
+    if isinstance(date, timezone.datetime):
+        date = date.date()
+    return {
+        "date": date,
+        "year_start": date.replace(month=1, day=1),
+        "next_year_start": date.replace(year=date.year + 1, month=1, day=1),
+    }
+
+
+def period_series_sql() -> str:
+    """
+    Per year between start_date and end_date the period of company_id ending in that year,
+    chosen like period_choice_sql with the requested date moved to that year.
+
+    Expects the parameters of period_series_params and company_id. Returns year and
+    period_id, one row per year that has a period.
+    """
+    return """SELECT year, period_id
+    FROM (
+        SELECT
+            EXTRACT(YEAR FROM end_date)::int AS year,
+            period_id,
+            ROW_NUMBER() OVER (
+                PARTITION BY EXTRACT(YEAR FROM end_date)
+                ORDER BY
+                    COALESCE(end_date = fiscal_year_end, false) DESC,
+                    ABS(end_date - (%(date)s::date + make_interval(years => EXTRACT(YEAR FROM end_date)::int - %(year)s))::date),
+                    period_id
+            ) AS choice
+        FROM periods
+        WHERE company_id = %(company_id)s AND end_date >= %(year_start)s AND end_date < %(next_year_start)s
+    ) ranked
+    WHERE choice = 1"""
+
+
+def period_series_params(start_date, end_date) -> dict:
+    start, end = period_params(start_date), period_params(end_date)
+    return {
+        "date": end["date"],
+        "year": end["date"].year,
+        "year_start": start["year_start"],
+        "next_year_start": end["next_year_start"],
+    }
+
+
+_RESOLVE_PERIODS_SQL = period_choice_sql("AND company_id = ANY(%(company_ids)s)")
+
+
+def _cached_periods(company_ids, params: dict):
+    # Splits company_ids into the periods the cache knows and the ids still to look up.
+    # The caller syncs the cache with the notifications first.
+    resolved = {}
+    missing = []
+    for company_id in dict.fromkeys(int(company_id) for company_id in company_ids):
+        period_id = get_period_cache().get((company_id, params["date"]), default=-1)
+        if period_id == -1:
+            missing.append(company_id)
+        else:
+            resolved[company_id] = period_id
+    return resolved, missing
+
+
+def _store_periods(resolved: dict, missing: list[int], found: dict, params: dict):
+    for company_id in missing:
+        resolved[company_id] = found.get(company_id)
+        get_period_cache().set((company_id, params["date"]), resolved[company_id])
+    return resolved
+
+
+def resolve_periods(company_ids: list[int], date: str, cursor: cursor = None) -> dict[int, int | None]:
+    """
+    Resolves the period of many companies for one date in a single round trip.
+
+    Returns a dict company_id -> period_id, with None for companies without a period in
+    that year. Answers are served from and stored in the shared period cache.
+    """
+    params = period_params(date)
+    _sync_period_cache()
+    resolved, missing = _cached_periods(company_ids, params)
+    if not missing:
+        return resolved
+
+    params["company_ids"] = missing
+    if cursor is None:
+        with get_db_connection() as conn:
+            with conn.cursor() as own_cursor:
+                own_cursor.execute(_RESOLVE_PERIODS_SQL, params)
+                found = dict(own_cursor.fetchall())
+    else:
+        cursor.execute(_RESOLVE_PERIODS_SQL, params)
+        found = dict(cursor.fetchall())
+    return _store_periods(resolved, missing, found, params)
+
+
+async def aresolve_periods(company_ids: list[int], date: str) -> dict[int, int | None]:
+    """resolve_periods on the async pool, sharing the same cache."""
+    params = period_params(date)
+    # Polling may reconnect the LISTEN connection, which blocks; the DB loop serves every session.
+    await asyncio.to_thread(_sync_period_cache)
+    resolved, missing = _cached_periods(company_ids, params)
+    if not missing:
+        return resolved
+
+    params["company_ids"] = missing
+    _, rows = await afetch(_RESOLVE_PERIODS_SQL, params)
+    return _store_periods(resolved, missing, dict(rows), params)
+
+
+def _period_or_message(period_id):
+    # Logical check if no period is found
+    if period_id is None:
+        return "Dit bedrijf heeft geen periode tijdens deze datum"
+    return period_id
+
+
+def get_period_ids(cursor: cursor, company_id: int, date: str):
+    try:
+        return _period_or_message(resolve_periods([company_id], date, cursor)[int(company_id)])
 
     except Exception as e:
         # Handle exceptions like database connectivity issues, SQL errors, etc.
         return f"Er is een fout opgetreden: {str(e)}"
 
 
+async def aget_period_ids(company_id: int, date: str):
+    try:
+        return _period_or_message((await aresolve_periods([company_id], date))[int(company_id)])
+
+    except Exception as e:
+        return f"Er is een fout opgetreden: {str(e)}"
+
+
+def _next_prefix(prefix: str) -> str:
+    # Smallest string above every string that starts with `prefix` in byte order.
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_predicate(prefixes, column: str = "account_number") -> str:
+    """
+    Sargable replacement for `column SIMILAR TO '60%|61%|...'`.
+
+    Every prefix becomes a half-open range in the "C" collation, adjacent ranges are
+    merged (60..64 becomes one range) and the result can use the account_number indexes
+    from migrations/0003_account_number_prefix_indexes.sql.
+    """
+    ranges = []
+    for prefix in sorted({str(prefix).replace("'", "''") for prefix in prefixes}):
+        upper = _next_prefix(prefix)
+        if ranges and prefix <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], upper)
+        else:
+            ranges.append([prefix, upper])
+    if not ranges:
+        return "FALSE"
+    clauses = [
+        f"({column} COLLATE \"C\" >= '{lower}' AND {column} COLLATE \"C\" < '{upper}')"
+        for lower, upper in ranges
+    ]
+    return clauses[0] if len(clauses) == 1 else "(" + " OR ".join(clauses) + ")"
+
+
 def get_acount_details_by_account_number(
     cursor: cursor, company_id: int, period_id: int, number_filter: list[int]
 ):
 
-    number_filter_str = "%|".join([str(i) for i in number_filter])
-    number_filter_str += "%"
-    print(number_filter_str)
     sql = f"""SELECT value
                 FROM account_details
                 WHERE 
                     company_id = {company_id} AND
-                    account_number SIMILAR TO '{number_filter_str}' AND
+                    {prefix_predicate(number_filter)} AND
                     period_id = {period_id};
                 """
     cursor.execute(sql)